@@ -0,0 +1,268 @@
+"""
+Control de admisión de búsquedas para /buscar y /buscar/lote.
+
+Cada búsqueda encola un crawl por tienda. Ante un pico de tráfico, encolar sin
+límite sólo alarga la cola: los crawls empiezan cuando la extensión ya dejó de
+sondear y los workers gastan su capacidad en resultados que nadie va a leer.
+Antes de encolar, la API estima cuánto esperaría la búsqueda:
+
+    espera de una clase = tareas en su cola × costo medio de sus spiders
+                          / concurrencia de los workers vivos que la consumen
+
+La profundidad de cada cola se lee del broker (LLEN) y la capacidad de los
+workers de un hash en Redis que cada worker actualiza periódicamente
+(WorkerHeartbeat, iniciado desde worker/queues.py). Las entradas sin
+actualizar en 3 intervalos se consideran de workers caídos. Si no hay ningún
+worker registrado para una cola se usa la concurrencia configurada en
+SPIDER_QUEUES, así la estimación sigue funcionando con workers lanzados a mano.
+
+Además, cada cliente (API key conocida o IP) tiene su propio token bucket en
+Redis (ratelimit.RedisTokenBucket.try_acquire), que rechaza sin consumir.
+
+La admisión nunca debe tumbar la API: si Redis no responde, las búsquedas se
+admiten.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+
+import metrics
+from config import (
+    ADMISSION_API_KEYS, ADMISSION_CLIENT_LIMIT, ADMISSION_ENABLED, ADMISSION_HEARTBEAT_SECONDS,
+    ADMISSION_MAX_RETRY_AFTER, ADMISSION_MAX_WAIT, SPIDER_PROFILES, SPIDER_QUEUES,
+)
+from ratelimit import RedisTokenBucket
+
+logger = logging.getLogger("cheapy.admission")
+
+WORKERS_KEY = "admission:workers"
+CLIENT_PREFIX = "admission:client"
+# Segundos que se reutiliza una lectura de la carga entre búsquedas
+LOAD_CACHE_SECONDS = 1.0
+
+
+def register_worker(client, hostname: str, queues: list, concurrency: int, now: float = None):
+    """
+    Publica (o renueva) la capacidad de un worker en cada una de sus colas.
+
+    Args:
+        client: Cliente Redis síncrono
+        hostname: Nombre del worker (ej: 'http@maquina')
+        queues: Colas que consume
+        concurrency: Tareas simultáneas que ejecuta
+    """
+    now = now or time.time()
+    client.hset(WORKERS_KEY, mapping={f"{queue}|{hostname}": f"{concurrency}|{now}" for queue in queues})
+
+
+def unregister_worker(client, hostname: str, queues: list):
+    """Quita la capacidad de un worker que se apaga."""
+    client.hdel(WORKERS_KEY, *[f"{queue}|{hostname}" for queue in queues])
+
+
+class WorkerHeartbeat(threading.Thread):
+    """
+    Hilo que renueva cada ADMISSION_HEARTBEAT_SECONDS la capacidad publicada de un worker.
+
+    Args:
+        client: Cliente Redis síncrono
+        hostname: Nombre del worker
+        queues: Colas que consume
+        concurrency: Tareas simultáneas que ejecuta
+    """
+
+    def __init__(self, client, hostname: str, queues: list, concurrency: int,
+                 interval: float = ADMISSION_HEARTBEAT_SECONDS):
+        super().__init__(name="admission-heartbeat", daemon=True)
+        self.client = client
+        self.hostname = hostname
+        self.queues = list(queues)
+        self.concurrency = concurrency
+        self.interval = interval
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.is_set():
+            try:
+                register_worker(self.client, self.hostname, self.queues, self.concurrency)
+            except Exception as e:
+                logger.debug("No se pudo publicar la capacidad del worker: %s", e)
+            self._stopped.wait(self.interval)
+
+    def stop(self):
+        """Detiene el hilo y quita la capacidad publicada."""
+        self._stopped.set()
+        try:
+            unregister_worker(self.client, self.hostname, self.queues)
+        except Exception as e:
+            logger.debug("No se pudo quitar la capacidad del worker: %s", e)
+
+
+def class_costs() -> dict:
+    """Costo medio de un crawl por clase de spider ('http' / 'rendered'), según SPIDER_PROFILES."""
+    costs = {}
+    for profile in SPIDER_PROFILES.values():
+        costs.setdefault(profile['rendering'], []).append(profile['cost'])
+    return {rendering: sum(values) / len(values) for rendering, values in costs.items()}
+
+
+def parse_load(depths: list, workers: dict, now: float = None,
+               heartbeat: float = ADMISSION_HEARTBEAT_SECONDS) -> dict:
+    """
+    Arma la carga de cada clase de spider a partir de lo leído en Redis.
+
+    Args:
+        depths: LLEN de la cola de cada clase, en el orden de SPIDER_QUEUES
+        workers: Contenido del hash WORKERS_KEY
+        now: Instante de referencia para descartar workers caídos
+
+    Returns:
+        dict: Clase -> {'queue', 'depth', 'capacity', 'wait'}, con `wait` la
+            espera estimada en segundos de una tarea nueva de esa clase
+    """
+    now = now or time.time()
+    capacity = {}
+    for field, value in workers.items():
+        field = field.decode() if isinstance(field, bytes) else field
+        value = value.decode() if isinstance(value, bytes) else value
+        try:
+            queue, _ = field.split('|', 1)
+            concurrency, seen = value.split('|', 1)
+            if now - float(seen) <= 3 * heartbeat:
+                capacity[queue] = capacity.get(queue, 0) + int(concurrency)
+        except ValueError:
+            continue
+
+    costs = class_costs()
+    load = {}
+    for (rendering, profile), depth in zip(SPIDER_QUEUES.items(), depths):
+        slots = capacity.get(profile['queue']) or profile['concurrency']
+        depth = int(depth or 0)
+        load[rendering] = {
+            'queue': profile['queue'], 'depth': depth, 'capacity': slots,
+            'wait': depth * costs.get(rendering, 0) / slots,
+        }
+    return load
+
+
+def read_load(client) -> dict:
+    """Carga actual de cada clase de spider con un cliente Redis síncrono (un único viaje)."""
+    pipe = client.pipeline(transaction=False)
+    for profile in SPIDER_QUEUES.values():
+        pipe.llen(profile['queue'])
+    pipe.hgetall(WORKERS_KEY)
+    *depths, workers = pipe.execute()
+    return parse_load(depths, workers)
+
+
+async def aread_load(client) -> dict:
+    """Versión asíncrona de `read_load` para clientes `redis.asyncio`."""
+    pipe = client.pipeline(transaction=False)
+    for profile in SPIDER_QUEUES.values():
+        pipe.llen(profile['queue'])
+    pipe.hgetall(WORKERS_KEY)
+    *depths, workers = await pipe.execute()
+    return parse_load(depths, workers)
+
+
+def client_limit(api_key: str = None) -> tuple:
+    """
+    Identificador y límite de un cliente.
+
+    Args:
+        api_key: Valor del header X-API-Key, si vino
+
+    Returns:
+        tuple: (clave del bucket o None si se usa la IP, {'rate', 'burst'})
+    """
+    if api_key and api_key in ADMISSION_API_KEYS:
+        return f"key:{api_key}", {**ADMISSION_CLIENT_LIMIT, **ADMISSION_API_KEYS[api_key]}
+    return None, ADMISSION_CLIENT_LIMIT
+
+
+class AdmissionController:
+    """
+    Decide si una búsqueda se encola, según el límite de su cliente y la espera estimada.
+
+    Args:
+        client: Cliente redis.asyncio (por defecto, el de metrics)
+        max_wait: Espera estimada máxima, en segundos, para encolar
+        enabled: Con False todas las búsquedas se admiten
+    """
+
+    def __init__(self, client=None, max_wait: float = ADMISSION_MAX_WAIT, enabled: bool = ADMISSION_ENABLED):
+        self._client = client
+        self._bucket = None
+        self.max_wait = max_wait
+        self.enabled = enabled
+        self._load = None
+        self._load_at = 0.0
+        self._load_lock = asyncio.Lock()
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = metrics.get_async_client()
+        return self._client
+
+    @property
+    def bucket(self):
+        if self._bucket is None:
+            self._bucket = RedisTokenBucket(self.client, prefix=CLIENT_PREFIX)
+        return self._bucket
+
+    async def load(self) -> dict:
+        """Carga de cada clase, releída de Redis a lo sumo cada LOAD_CACHE_SECONDS."""
+        if self._load is None or time.monotonic() - self._load_at > LOAD_CACHE_SECONDS:
+            async with self._load_lock:
+                if self._load is None or time.monotonic() - self._load_at > LOAD_CACHE_SECONDS:
+                    self._load = await aread_load(self.client)
+                    self._load_at = time.monotonic()
+        return self._load
+
+    async def check(self, client_key: str, limit: dict, spiders: list, cost: float = 1) -> tuple:
+        """
+        Evalúa una búsqueda antes de encolarla.
+
+        Args:
+            client_key: Identificador del cliente (API key o IP)
+            limit: {'rate', 'burst'} del cliente
+            spiders: Spiders que correría la búsqueda
+            cost: Tokens que consume (crawls por tienda en una búsqueda por lote)
+
+        Returns:
+            tuple: (motivo, retry_after). Motivo None si se admite, 'overload' si
+                la espera estimada supera `max_wait`, 'client_limit' si el cliente
+                superó su límite o 'batch_too_large' si `cost` supera la ráfaga
+                del cliente (nunca se admitiría); retry_after en segundos enteros
+        """
+        if not self.enabled:
+            return None, 0
+        if cost > limit['burst']:
+            return 'batch_too_large', 0
+        # La carga se evalúa antes de cobrarle al cliente: una búsqueda que no se
+        # encola por saturación (o que se responde sólo con el índice) no consume tokens
+        try:
+            load = await self.load()
+        except Exception as e:
+            logger.warning("Control de admisión sin Redis, se admite la búsqueda: %s", e)
+            return None, 0
+        renderings = {SPIDER_PROFILES.get(name, {'rendering': 'rendered'})['rendering'] for name in spiders}
+        wait = max((load[r]['wait'] for r in renderings if r in load), default=0)
+        if wait > self.max_wait:
+            return 'overload', self._retry_after(wait - self.max_wait)
+
+        try:
+            wait = await self.bucket.atry_acquire(client_key, limit['rate'], limit['burst'], cost)
+        except Exception as e:
+            logger.warning("Control de admisión sin Redis, se admite la búsqueda: %s", e)
+            return None, 0
+        if wait > 0:
+            return 'client_limit', self._retry_after(wait)
+        return None, 0
+
+    @staticmethod
+    def _retry_after(seconds: float) -> int:
+        return max(1, min(ADMISSION_MAX_RETRY_AFTER, int(seconds + 0.999)))
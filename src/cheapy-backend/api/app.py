@@ -1,14 +1,28 @@
 import httpx
+import json
 import time
 import sqlite3
 import logging
 from pathlib import Path
 from fastapi import FastAPI, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from celery import group
-from celery.result import GroupResult
+from fastapi.responses import JSONResponse, PlainTextResponse, Response
+from pydantic import BaseModel
+from celery import group, uuid
+from api import hedging, results, thumbnails
 from worker.celery_app import celery as celery_app
-from config import COUNTRY_TO_SPIDERS
+from worker.queues import DEFAULT_QUEUE
+from config import (
+    ADMISSION_TASK_EXPIRES, BATCH_MAX_QUERIES, BATCH_QUERIES_PER_CRAWL, COUNTRY_TO_SPIDERS, SPIDER_QUEUES,
+    THUMBNAIL_MAX_AGE,
+)
+import admission
+import blocking
+import metrics
+import productindex
+import tracing
+import watchlists
 
 def calculate_similarity_score(title: str, query: str) -> int:
     """
@@ -52,6 +66,10 @@ logging.basicConfig(level=logging.INFO, format="[%(asctime)s] %(levelname)s %(na
 BASE_DIR = Path(__file__).resolve().parent.parent
 CACHE_DB_FILE = BASE_DIR / "cache.db"
 CACHE_DURATION_SECONDS = 86400
+result_store = results.ResultStore(celery_app)
+admission_controller = admission.AdmissionController()
+hedger = hedging.Hedger(celery_app, result_store, admission_controller)
+thumbnailer = thumbnails.Thumbnailer()
 
 def setup_cache_database():
     """
@@ -66,6 +84,23 @@ def setup_cache_database():
 
 setup_cache_database()
 
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    """
+    Registra la latencia de /buscar, /buscar/lote y /resultados en el histograma de la API.
+    Se etiqueta con la plantilla de la ruta para no crear una serie por task_id.
+    """
+    started = time.perf_counter()
+    response = await call_next(request)
+    route = request.scope.get("route")
+    path = getattr(route, "path", None)
+    if path in ("/buscar", "/buscar/lote", "/resultados/{task_id}"):
+        await metrics.observe_async(
+            "cheapy_http_request_duration_seconds", time.perf_counter() - started,
+            endpoint=path, status=response.status_code,
+        )
+    return response
+
 app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_credentials=True, allow_methods=["*"], allow_headers=["*"])
 
 async def get_country_from_ip(ip: str) -> str:
@@ -98,24 +133,102 @@ async def get_country_from_ip(ip: str) -> str:
     finally:
         conn.close()
 
+async def resolve_country(country: str, request: Request) -> str:
+    """
+    Determina el país de la búsqueda: el enviado por el cliente o, si falta,
+    el de la geolocalización de su IP.
+    """
+    if country:
+        country_code = country.upper()
+        logger.info(f"País recibido del frontend: %s", country_code)
+        return country_code
+    logger.info("No se recibió país; usando geolocalización por IP")
+    return await get_country_from_ip(request.client.host)
+
+async def admit_search(request: Request, endpoint: str, spiders: list, cost: int = 1) -> tuple:
+    """
+    Aplica el control de admisión (admission.py) a una búsqueda y cuenta la decisión.
+
+    Returns:
+        tuple: (motivo, retry_after); motivo None si la búsqueda se encola
+    """
+    client_key, limit = admission.client_limit(request.headers.get("x-api-key"))
+    client_key = client_key or f"ip:{request.client.host}"
+    reason, retry_after = await admission_controller.check(client_key, limit, spiders, cost)
+    if reason:
+        logger.info("Búsqueda no admitida en %s: %s (reintentar en %d s)", endpoint, reason, retry_after)
+    return reason, retry_after
+
+async def open_circuits(spiders: list) -> dict:
+    """
+    Tiendas de la búsqueda con el circuito abierto por bloqueos (blocking.py).
+    Si Redis no responde se consideran todas disponibles.
+
+    Returns:
+        dict: Spider -> segundos hasta que se vuelva a intentar
+    """
+    try:
+        return await blocking.CircuitBreaker(metrics.get_async_client()).aopen_stores(spiders)
+    except Exception as e:
+        logger.warning("No se pudo leer el estado de los circuitos: %s", e)
+        return {}
+
+def cached_results(blocked: str, queries: list) -> list:
+    """
+    Productos del índice local de las tiendas que estaban bloqueadas al encolar la búsqueda.
+
+    Args:
+        blocked: Clave auxiliar `blocked` del grupo ({'country', 'spiders'} en JSON)
+        queries: Consultas de la búsqueda (una, o las del lote)
+
+    Returns:
+        list: Items del índice (con 'local': True) etiquetados con su consulta
+    """
+    blocked = json.loads(blocked)
+    spiders = set(blocked["spiders"])
+    return [
+        {**item, "query": query}
+        for query in queries
+        for item in productindex.search(query, blocked["country"])
+        if item.get("source") in spiders
+    ]
+
+def blocked_extra(blocked: dict, country: str) -> dict:
+    """Clave auxiliar del grupo con las tiendas bloqueadas, para completarlas con el índice local."""
+    if not blocked:
+        return {}
+    return {"blocked": json.dumps({"country": country, "spiders": sorted(blocked)})}
+
+def with_thumbnails(items: list) -> list:
+    """Agrega a cada item la ruta de /img de su imagen (`thumbnail_url`, None si no hay)."""
+    for item in items:
+        item["thumbnail_url"] = thumbnails.thumbnail_url(item.get("image_url"))
+    return items
+
+def rejected(reason: str, retry_after: int) -> JSONResponse:
+    """Respuesta 429 con Retry-After para una búsqueda no admitida."""
+    detail = ("Demasiadas búsquedas de este cliente." if reason == "client_limit"
+              else "El servidor está saturado; reintentá en unos segundos.")
+    return JSONResponse(status_code=429, content={"detail": detail, "reason": reason, "retry_after": retry_after},
+                        headers={"Retry-After": str(retry_after)})
+
 @app.get("/buscar")
 async def buscar_producto(q: str, request: Request, country: str = None):
     """
     Inicia la búsqueda asíncrona de productos en múltiples spiders de comercio electrónico.
     Prioriza el país proporcionado por el cliente, retrocede a geolocalización por IP.
-    Devuelve el ID de tarea para consultar resultados.
+    Devuelve el ID de tarea para consultar resultados y, mientras tanto, los productos
+    del índice local que coinciden con la búsqueda (`local_results`, con su antigüedad).
+    Si el control de admisión no la admite, no se encola ningún crawl: con la cola
+    saturada se responden sólo los resultados locales (`cache_only`) si los hay, y si
+    no (o si el cliente superó su límite) 429 con Retry-After.
+    Las tiendas con el circuito abierto por bloqueos (`blocked_stores`) no se
+    consultan en vivo: sus productos salen del índice local al terminar la búsqueda.
     """
     if not q:
         raise HTTPException(status_code=400, detail="El parámetro 'q' es requerido.")
 
-    country_code = ""
-    if country:
-        country_code = country.upper()
-        logger.info(f"País recibido del frontend: %s", country_code)
-    else:
-        logger.info("No se recibió país; usando geolocalización por IP")
-        client_ip = request.client.host
-        country_code = await get_country_from_ip(client_ip)
+    country_code = await resolve_country(country, request)
 
     # --- MODO DE PRUEBA (OPCIONAL) ---
     # Para forzar un país durante el desarrollo, puedes sobreescribir la variable aquí.
@@ -125,143 +238,389 @@ async def buscar_producto(q: str, request: Request, country: str = None):
     if not spiders_to_run:
         return {"task_id": None, "error": f"No hay tiendas para tu región ({country_code})."}
 
+    blocked = await open_circuits(spiders_to_run)
+    spiders_to_run = [name for name in spiders_to_run if name not in blocked]
+    if not spiders_to_run:
+        local_results = with_thumbnails(await run_in_threadpool(productindex.search, q, country_code))
+        return {"task_id": None, "query": q, "cache_only": True, "blocked_stores": blocked,
+                "local_results": local_results}
+
+    reason, retry_after = await admit_search(request, "/buscar", spiders_to_run)
+    if reason == "overload":
+        local_results = with_thumbnails(await run_in_threadpool(productindex.search, q, country_code))
+        if local_results:
+            await metrics.inc_async("cheapy_admission_total", decision="cache_only", reason=reason, endpoint="/buscar")
+            return {"task_id": None, "query": q, "cache_only": True, "retry_after": retry_after,
+                    "local_results": local_results}
+    if reason:
+        await metrics.inc_async("cheapy_admission_total", decision="rejected", reason=reason, endpoint="/buscar")
+        return rejected(reason, retry_after)
+    await metrics.inc_async("cheapy_admission_total", decision="admitted", reason="", endpoint="/buscar")
+
     logger.info("Tarea recibida q=%r country=%s spiders=%s", q, country_code, spiders_to_run)
 
-    task_signatures = [
-        celery_app.signature('run_scrapy_spider_task', kwargs={'spider_name': name, 'query': q, 'country': country_code})
-        for name in spiders_to_run
-    ]
-    result_group = group(task_signatures).apply_async()
-    result_group.save()
-    celery_app.backend.set(f"query:{result_group.id}", q)
-    return {"task_id": result_group.id, "query": q}
+    # El task_id del grupo es también el identificador de la traza de la búsqueda
+    task_id = uuid()
+    with tracing.span(task_id, "buscar", query=q, country=country_code) as root_span_id:
+        trace = {"trace_id": task_id, "parent_id": root_span_id}
+        task_signatures = [
+            celery_app.signature('run_scrapy_spider_task', kwargs={'spider_name': name, 'query': q, 'country': country_code, 'trace': trace})
+            for name in spiders_to_run
+        ]
+        # La publicación en el broker es bloqueante (kombu): se hace en el threadpool.
+        # Los crawls que no empiezan a tiempo se descartan: la extensión ya dejó de esperarlos
+        result_group = await run_in_threadpool(group(task_signatures).apply_async, task_id=task_id,
+                                               expires=ADMISSION_TASK_EXPIRES)
+        await result_store.save_group(result_group, query=q, **blocked_extra(blocked, country_code),
+                                      **hedger.saved_tasks(task_signatures))
+        with tracing.span(task_id, "local_results", parent_id=root_span_id):
+            local_results = with_thumbnails(await run_in_threadpool(productindex.search, q, country_code))
+    response = {"task_id": result_group.id, "query": q, "local_results": local_results}
+    if blocked:
+        response["blocked_stores"] = blocked
+    return response
+
+class BatchSearch(BaseModel):
+    """Cuerpo de POST /buscar/lote."""
+    queries: list[str]
+    country: str | None = None
+
+@app.post("/buscar/lote")
+async def buscar_lote(body: BatchSearch, request: Request):
+    """
+    Inicia varias búsquedas del mismo país en un único grupo de tareas.
+    Cada spider resuelve las consultas en tandas de BATCH_QUERIES_PER_CRAWL por
+    crawl, compartiendo proceso, navegador y conexiones. El resultado en
+    /resultados/{task_id} trae los items agrupados por consulta. Cada crawl por
+    tienda cuenta como una búsqueda para el límite del cliente; si el lote no se
+    admite se responde 429 con Retry-After, y 400 si pide más crawls que la
+    ráfaga del cliente (no entraría nunca). Las tiendas con el circuito abierto
+    se completan con el índice local, como en /buscar.
+    """
+    queries = list(dict.fromkeys(q.strip() for q in body.queries if q and q.strip()))
+    if not queries:
+        raise HTTPException(status_code=400, detail="Se requiere al menos una consulta.")
+    if len(queries) > BATCH_MAX_QUERIES:
+        raise HTTPException(status_code=400, detail=f"Máximo {BATCH_MAX_QUERIES} consultas por lote.")
+
+    country_code = await resolve_country(body.country, request)
+    spiders_to_run = COUNTRY_TO_SPIDERS.get(country_code, [])
+    if not spiders_to_run:
+        return {"task_id": None, "error": f"No hay tiendas para tu región ({country_code})."}
+
+    blocked = await open_circuits(spiders_to_run)
+    spiders_to_run = [name for name in spiders_to_run if name not in blocked]
+    if not spiders_to_run:
+        return JSONResponse(status_code=503, content={
+            "detail": "Todas las tiendas de tu región están bloqueadas temporalmente.", "blocked_stores": blocked,
+        }, headers={"Retry-After": str(min(blocked.values()))})
+
+    chunks = [queries[i:i + BATCH_QUERIES_PER_CRAWL] for i in range(0, len(queries), BATCH_QUERIES_PER_CRAWL)]
+    reason, retry_after = await admit_search(request, "/buscar/lote", spiders_to_run, cost=len(chunks))
+    await metrics.inc_async("cheapy_admission_total", decision="rejected" if reason else "admitted",
+                            reason=reason or "", endpoint="/buscar/lote")
+    if reason == "batch_too_large":
+        raise HTTPException(status_code=400, detail="El lote supera el límite de búsquedas de este cliente; "
+                                                    "dividilo en lotes más chicos.")
+    if reason:
+        return rejected(reason, retry_after)
+
+    logger.info("Lote recibido: %d consultas, country=%s, spiders=%s, crawls=%d",
+                len(queries), country_code, spiders_to_run, len(chunks) * len(spiders_to_run))
+
+    task_id = uuid()
+    with tracing.span(task_id, "buscar_lote", queries=len(queries), country=country_code) as root_span_id:
+        trace = {"trace_id": task_id, "parent_id": root_span_id}
+        task_signatures = [
+            celery_app.signature('run_scrapy_spider_task', kwargs={
+                'spider_name': name, 'query': '', 'country': country_code, 'trace': trace, 'queries': chunk,
+            })
+            for name in spiders_to_run for chunk in chunks
+        ]
+        result_group = await run_in_threadpool(group(task_signatures).apply_async, task_id=task_id,
+                                               expires=ADMISSION_TASK_EXPIRES)
+        await result_store.save_group(result_group, batch=json.dumps(queries), **blocked_extra(blocked, country_code),
+                                      **hedger.saved_tasks(task_signatures))
+    response = {"task_id": result_group.id, "queries": queries, "crawls": len(task_signatures)}
+    if blocked:
+        response["blocked_stores"] = blocked
+    return response
+
+class WatchRequest(BaseModel):
+    """Cuerpo de POST /seguimientos."""
+    subscriber: str
+    query: str
+    country: str | None = None
+    product_url: str | None = None
+    target_price: float | None = None
+    interval_minutes: int | None = None
+
+@app.post("/seguimientos")
+async def crear_seguimiento(body: WatchRequest, request: Request):
+    """
+    Suscribe a un usuario a una búsqueda (o a un producto de sus resultados).
+    Los seguimientos de la misma búsqueda y país comparten un único scrapeo
+    programado por Celery beat; las bajas de precio se consultan en /alertas.
+    """
+    if not body.subscriber or not body.query or not body.query.strip():
+        raise HTTPException(status_code=400, detail="Se requieren 'subscriber' y 'query'.")
+
+    country_code = await resolve_country(body.country, request)
+    if not COUNTRY_TO_SPIDERS.get(country_code):
+        raise HTTPException(status_code=400, detail=f"No hay tiendas para tu región ({country_code}).")
+
+    if body.product_url and not watchlists.is_watchable_url(body.product_url, country_code):
+        raise HTTPException(status_code=400, detail="'product_url' debe ser la URL de un producto de una "
+                                                    f"tienda de tu región ({country_code}).")
+
+    interval = body.interval_minutes * 60 if body.interval_minutes else None
+    watch = watchlists.add_watch(body.subscriber, country_code, body.query, body.product_url,
+                                 body.target_price, interval)
+    logger.info("Seguimiento %d creado q=%r country=%s", watch["id"], watch["query"], country_code)
+    return watch
+
+@app.get("/seguimientos")
+def listar_seguimientos(subscriber: str):
+    """Seguimientos de un suscriptor, con la próxima actualización programada."""
+    return {"watches": watchlists.list_watches(subscriber)}
+
+@app.delete("/seguimientos/{watch_id}")
+def eliminar_seguimiento(watch_id: int, subscriber: str):
+    """Elimina un seguimiento; si era el último de su búsqueda, deja de programarse."""
+    if not watchlists.remove_watch(subscriber, watch_id):
+        raise HTTPException(status_code=404, detail="Seguimiento no encontrado.")
+    return {"deleted": watch_id}
+
+@app.get("/alertas")
+def listar_alertas(subscriber: str, include_delivered: bool = False):
+    """Alertas de baja de precio pendientes del suscriptor (quedan marcadas como entregadas)."""
+    return {"alerts": watchlists.list_alerts(subscriber, include_delivered=include_delivered)}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    """
+    Expone las métricas acumuladas en Redis por la API, los workers y los spiders
+    en formato de texto de Prometheus.
+    """
+    # La profundidad de cada cola y la espera estimada se leen del broker en el momento de la consulta
+    client = metrics.get_client()
+    for queue in [DEFAULT_QUEUE] + [profile["queue"] for profile in SPIDER_QUEUES.values()]:
+        metrics.set_gauge("cheapy_celery_queue_depth", client.llen(queue), queue=queue)
+    for spider_class, load in admission.read_load(client).items():
+        metrics.set_gauge("cheapy_admission_wait_seconds", round(load["wait"], 2), spider_class=spider_class)
+    spiders = sorted({name for names in COUNTRY_TO_SPIDERS.values() for name in names})
+    open_stores = blocking.CircuitBreaker(client).open_stores(spiders)
+    for spider in spiders:
+        metrics.set_gauge("cheapy_circuit_open_seconds", open_stores.get(spider, 0), spider=spider)
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/img")
+async def get_thumbnail(url: str, request: Request):
+    """
+    Miniatura WebP de la imagen de un resultado (api/thumbnails.py).
+    Cada imagen se descarga y reduce una sola vez; las siguientes se sirven de
+    la caché en disco. El contenido de una miniatura no cambia, así que se
+    responde con caché de larga duración y su hash como ETag.
+    """
+    try:
+        digest, data = await thumbnailer.get(url)
+    except thumbnails.ThumbnailError as e:
+        raise HTTPException(status_code=e.status, detail=str(e))
+    headers = {"Cache-Control": f"public, max-age={THUMBNAIL_MAX_AGE}, immutable", "ETag": f'"{digest}"'}
+    if request.headers.get("if-none-match") == headers["ETag"]:
+        return Response(status_code=304, headers=headers)
+    return Response(content=data, media_type=thumbnails.MEDIA_TYPE, headers=headers)
+
+@app.get("/trazas/{task_id}")
+def get_trace(task_id: str):
+    """
+    Devuelve los spans registrados para una búsqueda: encolado, cola de Celery,
+    arranque del crawl, descargas, parseo, pipelines y agregación.
+    """
+    spans = tracing.get_trace(task_id)
+    if not spans:
+        raise HTTPException(status_code=404, detail="No hay trazas para ese ID de tarea.")
+    return {"task_id": task_id, "spans": spans}
 
 @app.get("/resultados/{task_id}")
-def get_status(task_id: str):
+async def get_status(task_id: str):
     """
     Consulta los resultados de búsqueda desde el grupo de tareas de Celery.
+    Los estados de todas las tareas se leen en un único viaje a Redis (api/results.py).
+    Con HEDGE_ENABLED, los crawls rezagados se duplican (api/hedging.py).
+    Las tiendas que estaban bloqueadas al encolar se completan con el índice local.
     Procesa y filtra resultados: deduplica por URL, normaliza precios,
     calcula descuentos y ordena por similitud, reseñas y precio.
     """
-    result_group = GroupResult.restore(task_id, app=celery_app)
-    if not result_group:
+    group_state = await result_store.fetch_group(task_id)
+    if group_state is None:
         return {"status": "FAILURE", "error": "ID de tarea no encontrado."}
-    if result_group.failed():
+    await hedger.check(task_id, group_state)
+    if results.failed(group_state):
         return {"status": "FAILURE", "error": "Al menos una tarea falló."}
 
-    if result_group.ready():
-        results_from_worker_group = result_group.get(propagate=False)
-        logger.info("Resultados recuperados de Redis: %d tareas respondieron", len(results_from_worker_group))
-        logger.debug("Contenido bruto de resultados_from_worker_group: %s", results_from_worker_group)
+    if results.ready(group_state):
+        cached = []
+        if group_state['blocked']:
+            queries = json.loads(group_state['batch']) if group_state['batch'] else [group_state['query'] or ""]
+            cached = await run_in_threadpool(cached_results, group_state['blocked'], queries)
+        with tracing.span(task_id, "aggregate"):
+            return aggregate_results(task_id, group_state, cached)
+    else:
+        return {"status": "PENDING", "completed": f"{results.completed_count(group_state)}/{len(group_state['states'])}"}
 
-        all_results = [item for sublist in results_from_worker_group if sublist for item in sublist]
-        logger.info("Total de items después de aplanar: %d", len(all_results))
+def aggregate_results(task_id: str, group_state: dict, cached: list = None) -> dict:
+    """
+    Combina los resultados de todos los spiders de un grupo terminado.
+    Deduplica por URL, normaliza precios, calcula descuentos y ordena por
+    similitud con la consulta, reseñas y precio.
 
-        try:
-            for it in all_results:
-                if isinstance(it, dict):
-                    raw = it.get('reviews_count_raw')
-                    parsed = it.get('reviews_count')
-                    if parsed and parsed > 1000000:
-                        logger.warning("reviews_count grande detectado: parsed=%s raw=%r title=%r url=%s", parsed, raw, it.get('title'), it.get('url'))
-                    elif raw and 'mil' in str(raw).lower() and (not parsed or parsed > 1000000):
-                        logger.warning("posible discrepancia reviews: parsed=%s raw=%r title=%r url=%s", parsed, raw, it.get('title'), it.get('url'))
-        except Exception:
-            pass
-
-        final_results = []
-        seen_urls = set()
+    Args:
+        task_id: ID del grupo de tareas
+        group_state: Estado del grupo leído con ResultStore.fetch_group
+        cached: Items del índice local de las tiendas bloqueadas (cached_results)
+    """
+    # Las tareas vencidas en la cola (ADMISSION_TASK_EXPIRES) terminan REVOKED y no aportan items
+    results_from_worker_group = results.successful_results(group_state)
+    logger.info("Resultados recuperados de Redis: %d de %d tareas respondieron",
+                len(results_from_worker_group), len(group_state['states']))
+    logger.debug("Contenido bruto de resultados_from_worker_group: %s", results_from_worker_group)
+
+    # Las tareas incrementales devuelven {'items': [...], 'unchanged': N}
+    unchanged = sum(r.get('unchanged', 0) for r in results_from_worker_group if isinstance(r, dict))
+    all_results = [
+        item for sublist in results_from_worker_group if sublist
+        for item in (sublist.get('items', []) if isinstance(sublist, dict) else sublist)
+    ]
+    all_results += cached or []
+    logger.info("Total de items después de aplanar: %d (sin cambios: %d)", len(all_results), unchanged)
+
+    # Las búsquedas por lote (/buscar/lote) se ordenan y devuelven por consulta
+    batch = group_state['batch']
+    if batch:
+        queries = json.loads(batch)
+        items_by_query = {q: [] for q in queries}
         for item in all_results:
-            if isinstance(item, dict):
-                url = item.get("url")
-                raw_price_numeric = item.get("price_numeric")
-                price_numeric = raw_price_numeric
-                if not isinstance(price_numeric, (int, float)):
+            if isinstance(item, dict) and item.get('query') in items_by_query:
+                items_by_query[item['query']].append(item)
+        response = {
+            "status": "SUCCESS",
+            "results_by_query": {q: rank_results(items, q) for q, items in items_by_query.items()},
+        }
+    else:
+        query = group_state['query'] or ""
+        response = {"status": "SUCCESS", "results": rank_results(all_results, query), "debug_info": {"reviews_count_raw_included": True}}
+    if any(isinstance(r, dict) for r in results_from_worker_group):
+        response["unchanged"] = unchanged
+    if group_state['blocked']:
+        response["blocked_stores"] = json.loads(group_state['blocked'])["spiders"]
+    return response
+
+def rank_results(all_results: list, query: str) -> list:
+    """
+    Filtra y ordena los items de una búsqueda.
+    Deduplica por URL, normaliza precios, calcula descuentos y ordena por
+    similitud con la consulta, reseñas y precio.
+    """
+
+    try:
+        for it in all_results:
+            if isinstance(it, dict):
+                raw = it.get('reviews_count_raw')
+                parsed = it.get('reviews_count')
+                if parsed and parsed > 1000000:
+                    logger.warning("reviews_count grande detectado: parsed=%s raw=%r title=%r url=%s", parsed, raw, it.get('title'), it.get('url'))
+                elif raw and 'mil' in str(raw).lower() and (not parsed or parsed > 1000000):
+                    logger.warning("posible discrepancia reviews: parsed=%s raw=%r title=%r url=%s", parsed, raw, it.get('title'), it.get('url'))
+    except Exception:
+        pass
+
+    final_results = []
+    seen_urls = set()
+    for item in all_results:
+        if isinstance(item, dict):
+            url = item.get("url")
+            raw_price_numeric = item.get("price_numeric")
+            price_numeric = raw_price_numeric
+            if not isinstance(price_numeric, (int, float)):
+                try:
+                    price_numeric = float(price_numeric)
+                except Exception:
+                    price_numeric = None
+            if price_numeric is None:
+                def money_to_float(s: str):
+                    """
+                    Parsea cadenas monetarias en float, manejando formatos europeos y estadounidenses.
+                    Elimina caracteres no numéricos y ajusta separadores decimales.
+                    """
+                    if not s or not isinstance(s, str):
+                        return None
+                    import re as _re
+                    s2 = _re.sub(r"[^\d.,]", "", s)
+                    if "," in s2 and "." in s2:
+                        s2 = s2.replace(".", "").replace(",", ".")
+                    elif "." in s2 and "," not in s2:
+                        parts = s2.split(".")
+                        if len(parts[-1]) == 3 and len(parts) > 1:
+                            s2 = "".join(parts)
+                    elif "," in s2 and "." not in s2:
+                        parts = s2.split(",")
+                        if len(parts[-1]) == 3 and len(parts) > 1:
+                            s2 = "".join(parts)
+                        else:
+                            s2 = s2.replace(",", ".")
                     try:
-                        price_numeric = float(price_numeric)
+                        return float(s2)
                     except Exception:
-                        price_numeric = None
-                if price_numeric is None:
-                    def money_to_float(s: str):
-                        """
-                        Parsea cadenas monetarias en float, manejando formatos europeos y estadounidenses.
-                        Elimina caracteres no numéricos y ajusta separadores decimales.
-                        """
-                        if not s or not isinstance(s, str):
-                            return None
-                        import re as _re
-                        s2 = _re.sub(r"[^\d.,]", "", s)
-                        if "," in s2 and "." in s2:
-                            s2 = s2.replace(".", "").replace(",", ".")
-                        elif "." in s2 and "," not in s2:
-                            parts = s2.split(".")
-                            if len(parts[-1]) == 3 and len(parts) > 1:
-                                s2 = "".join(parts)
-                        elif "," in s2 and "." not in s2:
-                            parts = s2.split(",")
-                            if len(parts[-1]) == 3 and len(parts) > 1:
-                                s2 = "".join(parts)
-                            else:
-                                s2 = s2.replace(",", ".")
-                        try:
-                            return float(s2)
-                        except Exception:
-                            return None
-                    price_numeric = money_to_float(item.get("price_display")) or money_to_float(item.get("price"))
-
-                logger.debug("Revisando item url=%s price_numeric=%s type=%s (raw=%s)", url, price_numeric, type(price_numeric), raw_price_numeric)
-                if url and url not in seen_urls and isinstance(price_numeric, (int, float)):
-                    seen_urls.add(url)
-                    item["price_numeric"] = price_numeric
-                    final_results.append(item)
-                else:
-                    logger.debug("Item filtrado url=%s precio_valido=%s url_duplicada=%s", url, isinstance(price_numeric, (int, float)), (url in seen_urls if url else 'N/A'))
+                        return None
+                price_numeric = money_to_float(item.get("price_display")) or money_to_float(item.get("price"))
 
-        logger.info("Items después de filtrado: %d de %d", len(final_results), len(all_results))
+            logger.debug("Revisando item url=%s price_numeric=%s type=%s (raw=%s)", url, price_numeric, type(price_numeric), raw_price_numeric)
+            if url and url not in seen_urls and isinstance(price_numeric, (int, float)):
+                seen_urls.add(url)
+                item["price_numeric"] = price_numeric
+                final_results.append(item)
+            else:
+                logger.debug("Item filtrado url=%s precio_valido=%s url_duplicada=%s", url, isinstance(price_numeric, (int, float)), (url in seen_urls if url else 'N/A'))
 
-        for it in final_results:
-            try:
-                is_disc = it.get('is_discounted', None)
-                p = it.get('price_numeric')
-                pb = it.get('price_before_numeric')
+    logger.info("Items después de filtrado: %d de %d", len(final_results), len(all_results))
 
-                if is_disc is True:
-                    it['on_sale'] = True
-                    if pb is not None and p is not None and pb > 0:
-                        try:
-                            it['discount_percent'] = round((pb - p) / pb * 100, 2)
-                        except Exception:
-                            it['discount_percent'] = None
-                    else:
+    for it in final_results:
+        try:
+            is_disc = it.get('is_discounted', None)
+            p = it.get('price_numeric')
+            pb = it.get('price_before_numeric')
+
+            if is_disc is True:
+                it['on_sale'] = True
+                if pb is not None and p is not None and pb > 0:
+                    try:
+                        it['discount_percent'] = round((pb - p) / pb * 100, 2)
+                    except Exception:
                         it['discount_percent'] = None
-                elif is_disc is False:
-                    it['on_sale'] = False
-                    it['discount_percent'] = None
                 else:
-                    if pb is not None and p is not None and pb > p * 1.01:
-                        it['on_sale'] = True
-                        try:
-                            it['discount_percent'] = round((pb - p) / pb * 100, 2)
-                        except Exception:
-                            it['discount_percent'] = None
-                    else:
-                        it['on_sale'] = False
-                        it['discount_percent'] = None
-            except Exception as e:
-                logger.exception("Error calculando descuento para item %s", it.get('url'))
+                    it['discount_percent'] = None
+            elif is_disc is False:
                 it['on_sale'] = False
                 it['discount_percent'] = None
+            else:
+                if pb is not None and p is not None and pb > p * 1.01:
+                    it['on_sale'] = True
+                    try:
+                        it['discount_percent'] = round((pb - p) / pb * 100, 2)
+                    except Exception:
+                        it['discount_percent'] = None
+                else:
+                    it['on_sale'] = False
+                    it['discount_percent'] = None
+        except Exception as e:
+            logger.exception("Error calculando descuento para item %s", it.get('url'))
+            it['on_sale'] = False
+            it['discount_percent'] = None
 
-        query = celery_app.backend.get(f"query:{task_id}")
-        if query:
-            query = query.decode('utf-8') if isinstance(query, bytes) else query
-        else:
-            query = ""
-
-        for item in final_results:
-            item['similarity_score'] = calculate_similarity_score(item.get('title', ''), query)
+    for item in final_results:
+        item['similarity_score'] = calculate_similarity_score(item.get('title', ''), query)
+    with_thumbnails(final_results)
 
-        final_results.sort(key=lambda x: (-x.get("similarity_score", 0), -x.get("reviews_count", 0), x.get("price_numeric", float('inf'))))
-        return {"status": "SUCCESS", "results": final_results, "debug_info": {"reviews_count_raw_included": True}}
-    else:
-        return {"status": "PENDING", "completed": f"{result_group.completed_count()}/{len(result_group)}"}
\ No newline at end of file
+    final_results.sort(key=lambda x: (-x.get("similarity_score", 0), -x.get("reviews_count", 0), x.get("price_numeric", float('inf'))))
+    return final_results
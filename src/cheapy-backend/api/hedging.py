@@ -0,0 +1,181 @@
+"""
+Ejecución cubierta ("hedging") de crawls rezagados.
+
+Una búsqueda tarda lo que tarda su spider más lento, y los crawls con
+Chromium tienen colas de latencia largas: un render trabado o un
+`wait_for_selector` que agota sus 45 s. Cuando la extensión sondea una
+búsqueda y un crawl lleva corriendo más que el percentil HEDGE_QUANTILE de la
+duración histórica de su spider, se lanza un duplicado con los mismos
+argumentos y se usa el primero que termine (ResultStore.fetch_group combina
+ambos); el otro se revoca y, si ya corría, el worker termina su proceso de
+Scrapy (worker/tasks.py).
+
+La duración histórica sale del histograma `cheapy_task_duration_seconds` de
+metrics.py, y el instante de inicio de cada crawl del estado STARTED que guarda
+la tarea. Para no multiplicar la carga en un pico, los duplicados salen de un
+presupuesto global (token bucket en Redis) y no se lanzan si la cola de la
+clase del spider ya está atrasada (admission.py): el duplicado no empezaría a
+tiempo. Cada decisión se cuenta en `cheapy_hedges_total`.
+"""
+
+import json
+import logging
+import time
+from collections import OrderedDict
+
+from celery import states, uuid
+from fastapi.concurrency import run_in_threadpool
+
+import metrics
+from config import (
+    ADMISSION_TASK_EXPIRES, HEDGE_BUDGET, HEDGE_ENABLED, HEDGE_MAX_QUEUE_WAIT, HEDGE_MIN_SAMPLES,
+    HEDGE_QUANTILE, SPIDER_PROFILES,
+)
+from ratelimit import RedisTokenBucket
+from worker.queues import SPIDER_TASK_NAME, get_spider_profile
+
+logger = logging.getLogger("cheapy.hedging")
+
+DURATION_METRIC = 'cheapy_task_duration_seconds'
+# Segundos que se reutilizan los umbrales calculados del histograma
+THRESHOLDS_CACHE_SECONDS = 60
+# Decisiones recordadas para no contar ni revocar dos veces el mismo duplicado
+MAX_REMEMBERED = 10000
+
+
+class Hedger:
+    """
+    Lanza duplicados de los crawls rezagados de una búsqueda y revoca los perdedores.
+
+    Args:
+        app: Aplicación de Celery
+        store: ResultStore de la API (lee y registra los duplicados)
+        admission: AdmissionController de la API (carga de las colas)
+        enabled: Con False no se lanzan duplicados
+    """
+
+    def __init__(self, app, store, admission, enabled: bool = HEDGE_ENABLED):
+        self.app = app
+        self.store = store
+        self.admission = admission
+        self.enabled = enabled
+        self._bucket = None
+        self._thresholds = {}
+        self._thresholds_at = 0.0
+        self._done = OrderedDict()
+
+    @property
+    def bucket(self):
+        if self._bucket is None:
+            self._bucket = RedisTokenBucket(metrics.get_async_client(), prefix="hedge")
+        return self._bucket
+
+    def saved_tasks(self, signatures: list) -> dict:
+        """
+        Claves auxiliares a guardar con un grupo nuevo (ResultStore.save_group):
+        los argumentos de cada crawl, para poder duplicarlo.
+        """
+        if not self.enabled:
+            return {}
+        return {'tasks': json.dumps([signature['kwargs'] for signature in signatures])}
+
+    def _once(self, key: str) -> bool:
+        """True la primera vez que se ve `key`."""
+        if key in self._done:
+            return False
+        self._done[key] = True
+        while len(self._done) > MAX_REMEMBERED:
+            self._done.popitem(last=False)
+        return True
+
+    async def thresholds(self) -> dict:
+        """
+        Duración a partir de la cual un crawl se considera rezagado, por spider.
+
+        Returns:
+            dict: Spider -> segundos; sólo spiders con al menos HEDGE_MIN_SAMPLES
+                crawls exitosos medidos
+        """
+        if time.monotonic() - self._thresholds_at > THRESHOLDS_CACHE_SECONDS:
+            series = await metrics.get_async_client().hgetall(f"{metrics.KEY_PREFIX}:{DURATION_METRIC}")
+            thresholds = {}
+            for spider in SPIDER_PROFILES:
+                value, count = metrics.histogram_quantile(
+                    DURATION_METRIC, series, HEDGE_QUANTILE, outcome='success', spider=spider,
+                )
+                if value is not None and count >= HEDGE_MIN_SAMPLES:
+                    thresholds[spider] = value
+            self._thresholds, self._thresholds_at = thresholds, time.monotonic()
+        return self._thresholds
+
+    async def check(self, group_id: str, group_state: dict):
+        """
+        Revisa una búsqueda en curso: revoca los perdedores de sus duplicados y
+        duplica los crawls rezagados. Nunca interrumpe el sondeo: los errores se registran.
+
+        Args:
+            group_id: task_id de la búsqueda
+            group_state: Estado leído con ResultStore.fetch_group
+        """
+        if not self.enabled:
+            return
+        try:
+            await self._settle(group_state)
+            await self._hedge_stragglers(group_id, group_state)
+        except Exception as e:
+            logger.warning("No se pudieron revisar los crawls rezagados de %s: %s", group_id, e)
+
+    async def _settle(self, group_state: dict):
+        """Revoca la tarea perdedora de cada duplicado resuelto y cuenta el resultado."""
+        for index, hedge in group_state['hedges'].items():
+            if not hedge['winner'] or not self._once(f"settled:{hedge['id']}"):
+                continue
+            original = group_state['task_ids'][index]
+            loser = hedge['id'] if hedge['winner'] == 'original' else original
+            await run_in_threadpool(self.app.control.revoke, loser)
+            outcome = 'won' if hedge['winner'] == 'hedge' else 'lost'
+            await metrics.inc_async('cheapy_hedges_total', spider=hedge['spider'], outcome=outcome)
+            logger.info("Duplicado de %s (%s): %s; se revoca %s", original, hedge['spider'], outcome, loser)
+
+    async def _hedge_stragglers(self, group_id: str, group_state: dict):
+        now = time.time()
+        stragglers = []
+        thresholds = None
+        for index, (state, result) in enumerate(zip(group_state['states'], group_state['results'])):
+            if state != states.STARTED or index in group_state['hedges'] or not isinstance(result, dict):
+                continue
+            if not result.get('started_at'):
+                continue
+            if thresholds is None:
+                thresholds = await self.thresholds()
+            threshold = thresholds.get(result.get('spider'))
+            if threshold is not None and now - result['started_at'] > threshold:
+                stragglers.append((index, result['spider']))
+        if not stragglers:
+            return
+
+        load = await self.admission.load()
+        tasks = None
+        for index, spider in stragglers:
+            task_id = group_state['task_ids'][index]
+            rendering = get_spider_profile(spider)['rendering']
+            if load.get(rendering, {}).get('wait', 0) > HEDGE_MAX_QUEUE_WAIT:
+                continue
+            if await self.bucket.atry_acquire('budget', HEDGE_BUDGET['rate'], HEDGE_BUDGET['burst']) > 0:
+                if self._once(f"no_budget:{task_id}"):
+                    await metrics.inc_async('cheapy_hedges_total', spider=spider, outcome='no_budget')
+                continue
+            if tasks is None:
+                tasks = json.loads(await self.store.fetch_value('tasks', group_id) or '[]')
+            if index >= len(tasks):
+                return
+            hedge_id = uuid()
+            if not await self.store.claim_hedge(task_id, hedge_id, spider):
+                continue
+            # Va a la misma cola: lo toma un slot libre, no el que está ocupado con el original
+            await run_in_threadpool(
+                self.app.signature(SPIDER_TASK_NAME, kwargs=tasks[index]).apply_async,
+                task_id=hedge_id, expires=ADMISSION_TASK_EXPIRES,
+            )
+            await metrics.inc_async('cheapy_hedges_total', spider=spider, outcome='fired')
+            logger.info("Crawl rezagado %s (%s): se lanza el duplicado %s", task_id, spider, hedge_id)
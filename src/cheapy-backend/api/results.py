@@ -0,0 +1,224 @@
+"""
+Acceso asíncrono a los resultados de búsqueda guardados en el backend de Celery.
+
+La extensión sondea `/resultados/{task_id}` cada 2 segundos mientras corren los
+spiders, así que la API pasa casi todo su tiempo leyendo estados de tareas.
+Con la API síncrona de Celery cada sondeo costaba varios viajes bloqueantes a
+Redis (`GroupResult.restore`, `failed()`, `ready()`, `completed_count()` y la
+consulta guardada), cada uno ocupando un hilo del threadpool, y el sondeo final
+además esperaba 0,5 s dentro de `GroupResult.get()`, que duerme un intervalo
+entre lecturas aunque todas las tareas ya hayan terminado.
+
+ResultStore lee y escribe las mismas claves que el backend de Celery (así los
+workers no cambian), con redis.asyncio y sin bloquear el event loop:
+
+    - La lista de tareas hijas de un grupo no cambia después de guardarse: se
+      lee una vez (o se conoce al crearlo en /buscar) y se conserva en memoria.
+    - Cada sondeo trae en un solo MGET el estado de todas las hijas y las
+      claves auxiliares de la búsqueda (`query:` / `batch:` / `blocked:`), y decodifica los
+      resultados con `backend.decode_result`, igual que Celery.
+    - Al crear la búsqueda, el grupo y sus claves auxiliares se guardan en un
+      único pipeline.
+
+Si un crawl del grupo tiene un duplicado (api/hedging.py), la clave
+`hedge:{task_id}` de la tarea original apunta a él y fetch_group combina ambos:
+cuenta el primero que terminó con éxito. Esas claves viajan en el mismo MGET.
+
+Con un backend que no es Redis (por ejemplo `cache+memory://` en
+benchmarks/api_load.py) las mismas operaciones se delegan al backend de Celery
+en el threadpool.
+"""
+
+from collections import OrderedDict
+
+import json
+
+import redis.asyncio
+from celery import states
+from celery.backends.redis import RedisBackend
+from celery.result import result_from_tuple
+from fastapi.concurrency import run_in_threadpool
+
+# Grupos cuya lista de tareas hijas se conserva en memoria
+MAX_CACHED_GROUPS = 10000
+HEDGE_PREFIX = "hedge"
+
+
+class ResultStore:
+    """
+    Lectura y escritura asíncronas de grupos de tareas en el backend de resultados.
+
+    Args:
+        app: Aplicación de Celery (usa su backend de resultados y `result_backend`)
+    """
+
+    def __init__(self, app, max_cached_groups: int = MAX_CACHED_GROUPS):
+        self.app = app
+        self.max_cached_groups = max_cached_groups
+        self._children = OrderedDict()
+        self._client = None
+
+    @property
+    def backend(self):
+        return self.app.backend
+
+    def _redis(self):
+        """Cliente redis.asyncio del backend, o None si el backend no es Redis."""
+        if not isinstance(self.backend, RedisBackend):
+            return None
+        if self._client is None:
+            self._client = redis.asyncio.Redis.from_url(self.app.conf.result_backend)
+        return self._client
+
+    async def _get_many(self, keys: list) -> list:
+        client = self._redis()
+        if client is not None:
+            return await client.mget(keys)
+        values = await run_in_threadpool(self.backend.mget, keys)
+        if isinstance(values, dict):
+            return [values.get(key) for key in keys]
+        return list(values)
+
+    async def _set_many(self, mapping: dict):
+        client = self._redis()
+        if client is None:
+            await run_in_threadpool(lambda: [self.backend.set(key, value) for key, value in mapping.items()])
+            return
+        pipe = client.pipeline(transaction=False)
+        for key, value in mapping.items():
+            pipe.set(key, value, ex=self.backend.expires or None)
+        await pipe.execute()
+
+    async def _set_if_absent(self, key: str, value) -> bool:
+        client = self._redis()
+        if client is not None:
+            return bool(await client.set(key, value, nx=True, ex=self.backend.expires or None))
+        # Sin Redis no hay SET NX atómico; alcanza para un único proceso de API
+        if (await self._get_many([key]))[0]:
+            return False
+        await self._set_many({key: value})
+        return True
+
+    def _remember(self, group_id: str, children: list):
+        self._children[group_id] = children
+        self._children.move_to_end(group_id)
+        while len(self._children) > self.max_cached_groups:
+            self._children.popitem(last=False)
+
+    async def save_group(self, result_group, **extra):
+        """
+        Guarda un grupo recién lanzado (como `GroupResult.save()`) y sus claves auxiliares.
+
+        Args:
+            result_group: GroupResult retornado por `apply_async`
+            **extra: Claves auxiliares de la búsqueda, por prefijo: query='...' se
+                guarda en `query:{group_id}`
+        """
+        mapping = {self.backend.get_key_for_group(result_group.id): self.backend.encode({'result': result_group.as_tuple()})}
+        for prefix, value in extra.items():
+            mapping[f"{prefix}:{result_group.id}"] = value
+        await self._set_many(mapping)
+        self._remember(result_group.id, [child.id for child in result_group.results])
+
+    async def fetch_group(self, group_id: str, extra: tuple = ('query', 'batch', 'blocked')):
+        """
+        Estado de todas las tareas de un grupo y sus claves auxiliares.
+
+        Con la lista de hijas en memoria es un único viaje a Redis; si no, uno
+        más para leer el grupo.
+
+        Args:
+            group_id: task_id de la búsqueda
+            extra: Prefijos de las claves auxiliares a leer
+
+        Returns:
+            dict or None: None si el grupo no existe. Si no, 'states' y 'results'
+                (uno por tarea, en el orden del grupo) y una entrada por prefijo
+                auxiliar con su valor decodificado (o None)
+        """
+        children = self._children.get(group_id)
+        if children is None:
+            meta = (await self._get_many([self.backend.get_key_for_group(group_id)]))[0]
+            if not meta:
+                return None
+            children = [child.id for child in result_from_tuple(self.backend.decode(meta)['result'], self.app).results]
+            self._remember(group_id, children)
+
+        keys = (
+            [self.backend.get_key_for_task(child) for child in children]
+            + [f"{HEDGE_PREFIX}:{child}" for child in children]
+            + [f"{prefix}:{group_id}" for prefix in extra]
+        )
+        values = await self._get_many(keys)
+        count = len(children)
+        metas = [self._decode_meta(value) for value in values[:count]]
+        hedges = {
+            index: json.loads(value) for index, value in enumerate(values[count:2 * count]) if value
+        }
+        if hedges:
+            hedge_values = await self._get_many([self.backend.get_key_for_task(h['id']) for h in hedges.values()])
+            for (index, hedge), value in zip(hedges.items(), hedge_values):
+                hedge['winner'], metas[index] = merge_hedge(metas[index], self._decode_meta(value))
+        group = {
+            'task_ids': children, 'hedges': hedges,
+            'states': [meta['status'] for meta in metas], 'results': [meta['result'] for meta in metas],
+        }
+        for prefix, value in zip(extra, values[2 * count:]):
+            group[prefix] = value.decode('utf-8') if isinstance(value, bytes) else value
+        return group
+
+    def _decode_meta(self, value) -> dict:
+        return self.backend.decode_result(value) if value else {'status': states.PENDING, 'result': None}
+
+    async def fetch_value(self, prefix: str, group_id: str):
+        """Clave auxiliar `prefix:{group_id}` de una búsqueda, decodificada (o None)."""
+        value = (await self._get_many([f"{prefix}:{group_id}"]))[0]
+        return value.decode('utf-8') if isinstance(value, bytes) else value
+
+    async def claim_hedge(self, task_id: str, hedge_id: str, spider: str) -> bool:
+        """
+        Registra `hedge_id` como duplicado de la tarea `task_id`, si no tenía uno.
+
+        Returns:
+            bool: False si otro sondeo ya lanzó un duplicado de esa tarea
+        """
+        return await self._set_if_absent(f"{HEDGE_PREFIX}:{task_id}", json.dumps({'id': hedge_id, 'spider': spider}))
+
+
+def merge_hedge(original: dict, hedge: dict) -> tuple:
+    """
+    Combina el estado de una tarea y el de su duplicado.
+
+    Returns:
+        tuple: (ganador, meta). Ganador 'original' o 'hedge' si alguna terminó
+            con éxito (la original tiene prioridad), o None; meta es el estado
+            que cuenta para el grupo: el del ganador, o si ninguno ganó, el de la
+            que sigue corriendo (la original si ambas terminaron)
+    """
+    if original['status'] == states.SUCCESS:
+        return 'original', original
+    if hedge['status'] == states.SUCCESS:
+        return 'hedge', hedge
+    if original['status'] in states.READY_STATES and hedge['status'] not in states.READY_STATES:
+        return None, hedge
+    return None, original
+
+
+def failed(group: dict) -> bool:
+    """Equivalente a `GroupResult.failed()`: alguna tarea falló."""
+    return any(state == states.FAILURE for state in group['states'])
+
+
+def ready(group: dict) -> bool:
+    """Equivalente a `GroupResult.ready()`: todas las tareas terminaron."""
+    return all(state in states.READY_STATES for state in group['states'])
+
+
+def completed_count(group: dict) -> int:
+    """Equivalente a `GroupResult.completed_count()`: tareas terminadas con éxito."""
+    return sum(state == states.SUCCESS for state in group['states'])
+
+
+def successful_results(group: dict) -> list:
+    """Resultados de las tareas terminadas con éxito (las vencidas sin ejecutarse quedan REVOKED)."""
+    return [result for state, result in zip(group['states'], group['results']) if state == states.SUCCESS]
@@ -0,0 +1,187 @@
+"""Pruebas de Hedger._settle y Hedger._hedge_stragglers con estados de grupo en dict."""
+
+import asyncio
+import json
+import time
+
+import pytest
+from celery import states
+
+import metrics
+from api.hedging import Hedger
+from api.results import merge_hedge
+
+
+class FakeSignature:
+    def __init__(self, app, kwargs):
+        self.app = app
+        self.kwargs = kwargs
+
+    def apply_async(self, task_id, expires):
+        self.app.sent.append((task_id, self.kwargs))
+
+
+class FakeControl:
+    def __init__(self):
+        self.revoked = []
+
+    def revoke(self, task_id):
+        self.revoked.append(task_id)
+
+
+class FakeApp:
+    def __init__(self):
+        self.control = FakeControl()
+        self.sent = []
+
+    def signature(self, name, kwargs):
+        return FakeSignature(self, kwargs)
+
+
+class FakeStore:
+    def __init__(self, tasks):
+        self.tasks = tasks
+        self.hedges = {}
+
+    async def fetch_value(self, prefix, group_id):
+        return json.dumps(self.tasks)
+
+    async def claim_hedge(self, task_id, hedge_id, spider):
+        if task_id in self.hedges:
+            return False
+        self.hedges[task_id] = {'id': hedge_id, 'spider': spider}
+        return True
+
+
+class FakeAdmission:
+    async def load(self):
+        return {}
+
+
+class FakeBucket:
+    async def atry_acquire(self, key, rate, burst):
+        return 0
+
+
+@pytest.fixture
+def counted(monkeypatch):
+    calls = []
+
+    async def inc_async(name, value=1, **labels):
+        calls.append((name, labels))
+
+    monkeypatch.setattr(metrics, 'inc_async', inc_async)
+    return calls
+
+
+def make_hedger(tasks=(), thresholds=None):
+    hedger = Hedger(FakeApp(), FakeStore(list(tasks)), FakeAdmission(), enabled=True)
+    hedger._bucket = FakeBucket()
+    hedger._thresholds = thresholds or {}
+    hedger._thresholds_at = time.monotonic()
+    return hedger
+
+
+def meta(status, result=None):
+    return {'status': status, 'result': result}
+
+
+def group_state(task_ids, pairs, hedge_ids):
+    """
+    Arma el estado de grupo que devolvería ResultStore.fetch_group.
+
+    Args:
+        task_ids: task_id de cada crawl original
+        pairs: (meta original, meta del duplicado o None) por crawl
+        hedge_ids: Índice -> (id, spider) de los duplicados lanzados
+    """
+    hedges, metas = {}, []
+    for index, (original, hedge) in enumerate(pairs):
+        if index in hedge_ids:
+            hedge_id, spider = hedge_ids[index]
+            winner, merged = merge_hedge(original, hedge)
+            hedges[index] = {'id': hedge_id, 'spider': spider, 'winner': winner}
+            metas.append(merged)
+        else:
+            metas.append(original)
+    return {
+        'task_ids': list(task_ids), 'hedges': hedges,
+        'states': [m['status'] for m in metas], 'results': [m['result'] for m in metas],
+    }
+
+
+def test_hedge_win_revokes_original_once_across_polls(counted):
+    hedger = make_hedger()
+    state = group_state(
+        ['t0'], [(meta(states.STARTED, {'started_at': 1.0}), meta(states.SUCCESS, {}))],
+        {0: ('h0', 'fravega')},
+    )
+    for _ in range(3):
+        asyncio.run(hedger.check('g', state))
+    assert hedger.app.control.revoked == ['t0']
+    assert counted == [('cheapy_hedges_total', {'spider': 'fravega', 'outcome': 'won'})]
+
+
+def test_original_win_revokes_hedge_once_across_polls(counted):
+    hedger = make_hedger()
+    running = group_state(
+        ['t0'], [(meta(states.STARTED, {'started_at': 1.0}), meta(states.STARTED, {'started_at': 2.0}))],
+        {0: ('h0', 'fravega')},
+    )
+    done = group_state(
+        ['t0'], [(meta(states.SUCCESS, {}), meta(states.STARTED, {'started_at': 2.0}))],
+        {0: ('h0', 'fravega')},
+    )
+    for state in (running, done, done):
+        asyncio.run(hedger.check('g', state))
+    assert hedger.app.control.revoked == ['h0']
+    assert counted == [('cheapy_hedges_total', {'spider': 'fravega', 'outcome': 'lost'})]
+
+
+def test_original_failed_while_hedge_running_revokes_nothing(counted):
+    old = time.time() - 3600
+    hedger = make_hedger(thresholds={'fravega': 1.0})
+    state = group_state(
+        ['t0'],
+        [(meta(states.FAILURE, 'error'), meta(states.STARTED, {'spider': 'fravega', 'started_at': old}))],
+        {0: ('h0', 'fravega')},
+    )
+    asyncio.run(hedger.check('g', state))
+    assert state['states'] == [states.STARTED]
+    assert hedger.app.control.revoked == []
+    # El crawl ya tiene duplicado: aunque el que corre esté rezagado no se lanza otro
+    assert hedger.app.sent == []
+    assert counted == []
+
+
+def test_both_failed_revokes_nothing(counted):
+    hedger = make_hedger()
+    state = group_state(
+        ['t0'], [(meta(states.FAILURE, 'error'), meta(states.FAILURE, 'error'))],
+        {0: ('h0', 'fravega')},
+    )
+    asyncio.run(hedger.check('g', state))
+    assert state['states'] == [states.FAILURE]
+    assert hedger.app.control.revoked == []
+    assert counted == []
+
+
+def test_straggler_is_hedged_once_across_polls(counted):
+    old = time.time() - 3600
+    hedger = make_hedger(tasks=[{'query': 'tv', 'spider': 'fravega'}], thresholds={'fravega': 1.0})
+    state = group_state(['t0'], [(meta(states.STARTED, {'spider': 'fravega', 'started_at': old}), None)], {})
+    for _ in range(2):
+        asyncio.run(hedger.check('g', state))
+    hedge_id = hedger.store.hedges['t0']['id']
+    assert hedger.app.sent == [(hedge_id, {'query': 'tv', 'spider': 'fravega'})]
+    assert counted == [('cheapy_hedges_total', {'spider': 'fravega', 'outcome': 'fired'})]
+
+
+def test_crawl_under_threshold_is_not_hedged(counted):
+    hedger = make_hedger(tasks=[{'query': 'tv', 'spider': 'fravega'}], thresholds={'fravega': 3600.0})
+    state = group_state(
+        ['t0'], [(meta(states.STARTED, {'spider': 'fravega', 'started_at': time.time()}), None)], {},
+    )
+    asyncio.run(hedger.check('g', state))
+    assert hedger.app.sent == []
+    assert counted == []
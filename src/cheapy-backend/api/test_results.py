@@ -0,0 +1,61 @@
+"""Pruebas de merge_hedge y los equivalentes de GroupResult sobre estados en dict."""
+
+from celery import states
+
+from api.results import completed_count, failed, merge_hedge, ready
+
+
+def meta(status, result=None):
+    return {'status': status, 'result': result}
+
+
+def test_original_success_wins_even_if_hedge_also_succeeded():
+    original, hedge = meta(states.SUCCESS, 'a'), meta(states.SUCCESS, 'b')
+    assert merge_hedge(original, hedge) == ('original', original)
+
+
+def test_hedge_success_wins_over_running_original():
+    original, hedge = meta(states.STARTED, {'started_at': 1.0}), meta(states.SUCCESS, 'b')
+    assert merge_hedge(original, hedge) == ('hedge', hedge)
+
+
+def test_hedge_success_wins_over_failed_original():
+    original, hedge = meta(states.FAILURE, 'error'), meta(states.SUCCESS, 'b')
+    assert merge_hedge(original, hedge) == ('hedge', hedge)
+
+
+def test_original_failed_while_hedge_running_reports_the_hedge():
+    original, hedge = meta(states.FAILURE, 'error'), meta(states.STARTED, {'started_at': 2.0})
+    winner, merged = merge_hedge(original, hedge)
+    assert winner is None
+    assert merged is hedge
+    # El grupo sigue en curso y no cuenta como fallido mientras corre el duplicado
+    group = {'states': [merged['status']], 'results': [merged['result']]}
+    assert not failed(group)
+    assert not ready(group)
+
+
+def test_original_failed_while_hedge_pending_reports_the_hedge():
+    original, hedge = meta(states.FAILURE, 'error'), meta(states.PENDING)
+    assert merge_hedge(original, hedge) == (None, hedge)
+
+
+def test_both_failed_reports_the_original():
+    original, hedge = meta(states.FAILURE, 'error original'), meta(states.FAILURE, 'error hedge')
+    winner, merged = merge_hedge(original, hedge)
+    assert winner is None
+    assert merged is original
+    group = {'states': [merged['status']], 'results': [merged['result']]}
+    assert failed(group)
+    assert ready(group)
+    assert completed_count(group) == 0
+
+
+def test_both_running_reports_the_original():
+    original, hedge = meta(states.STARTED, {'started_at': 1.0}), meta(states.STARTED, {'started_at': 2.0})
+    assert merge_hedge(original, hedge) == (None, original)
+
+
+def test_hedge_failed_while_original_running_reports_the_original():
+    original, hedge = meta(states.STARTED, {'started_at': 1.0}), meta(states.FAILURE, 'error')
+    assert merge_hedge(original, hedge) == (None, original)
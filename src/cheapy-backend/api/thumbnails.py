@@ -0,0 +1,322 @@
+"""
+Miniaturas de las imágenes de los resultados, servidas por GET /img.
+
+Los resultados traen la imagen de tamaño completo del CDN de cada tienda y el
+popup las mostraba a 70 px descargándolas todas. /img descarga cada imagen una
+sola vez, la reduce a THUMBNAIL_SIZE px de lado en WebP y la guarda en disco:
+
+    thumbnails/index.db          URL de origen -> hash de la miniatura, y tamaño
+                                 y último acceso de cada archivo (para el LRU)
+    thumbnails/ab/abcd….webp     la miniatura, nombrada por el hash de su contenido
+
+Dos URLs con la misma imagen (otro parámetro de tamaño, otro dominio del CDN)
+comparten el archivo. Al superar THUMBNAIL_CACHE_MAX_BYTES se borran los
+archivos menos usados. Como el contenido de cada miniatura no cambia, se sirve
+con caché de larga duración y su hash como ETag.
+
+Sólo se aceptan URLs de los hosts de THUMBNAIL_ALLOWED_HOSTS, también tras
+redirecciones, y se descartan las imágenes de más de THUMBNAIL_MAX_SOURCE_BYTES
+o THUMBNAIL_MAX_PIXELS.
+
+Con CHEAPY_MOCK_STORE_URL las imágenes se piden a la tienda falsa
+(benchmarks/mock_store.py), como los crawls.
+"""
+
+import asyncio
+import hashlib
+import io
+import logging
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from urllib.parse import quote, urlparse
+
+import httpx
+from fastapi.concurrency import run_in_threadpool
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+import metrics
+from config import (
+    THUMBNAIL_ALLOWED_HOSTS, THUMBNAIL_CACHE_DIR, THUMBNAIL_CACHE_MAX_BYTES, THUMBNAIL_FETCH_TIMEOUT,
+    THUMBNAIL_MAX_PIXELS, THUMBNAIL_MAX_SOURCE_BYTES, THUMBNAIL_QUALITY, THUMBNAIL_SIZE,
+)
+
+logger = logging.getLogger("cheapy.thumbnails")
+
+CACHE_DIR = Path(THUMBNAIL_CACHE_DIR) if THUMBNAIL_CACHE_DIR else Path(__file__).resolve().parent.parent / "thumbnails"
+MEDIA_TYPE = "image/webp"
+MOCK_STORE_URL = os.environ.get('CHEAPY_MOCK_STORE_URL')
+STORE_HEADER = 'X-Cheapy-Store'
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (digest TEXT PRIMARY KEY, size INTEGER, last_access REAL);
+CREATE INDEX IF NOT EXISTS idx_files_access ON files (last_access);
+CREATE TABLE IF NOT EXISTS sources (url TEXT PRIMARY KEY, digest TEXT);
+CREATE INDEX IF NOT EXISTS idx_sources_digest ON sources (digest);
+"""
+
+
+class ThumbnailError(Exception):
+    """
+    La imagen no se pudo convertir en miniatura.
+
+    Args:
+        message: Motivo, para el detalle de la respuesta
+        status: Status HTTP a responder
+    """
+
+    def __init__(self, message: str, status: int = 502):
+        super().__init__(message)
+        self.status = status
+
+
+def allowed_url(url: str) -> bool:
+    """True si la URL es http(s) de un host de THUMBNAIL_ALLOWED_HOSTS o de uno de sus subdominios."""
+    parsed = urlparse(url or '')
+    host = (parsed.hostname or '').lower()
+    if parsed.scheme not in ('http', 'https') or not host:
+        return False
+    return any(host == allowed or host.endswith(f".{allowed}") for allowed in THUMBNAIL_ALLOWED_HOSTS)
+
+
+def thumbnail_url(image_url: str):
+    """
+    Ruta de /img para la imagen de un resultado.
+
+    Returns:
+        str or None: '/img?url=…', o None si no hay imagen o su host no está permitido
+    """
+    if not image_url or not allowed_url(image_url):
+        return None
+    return f"/img?url={quote(image_url, safe='')}"
+
+
+def make_thumbnail(data: bytes, size: int = THUMBNAIL_SIZE, quality: int = THUMBNAIL_QUALITY) -> bytes:
+    """
+    Reduce una imagen a `size` px de lado (manteniendo la proporción) en WebP.
+
+    Raises:
+        ThumbnailError: Si no es una imagen o es demasiado grande para decodificarla
+    """
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            if image.width * image.height > THUMBNAIL_MAX_PIXELS:
+                raise ThumbnailError("Imagen demasiado grande", 413)
+            # En JPEG decodifica directamente a una escala reducida
+            image.draft('RGB', (size, size))
+            image = ImageOps.exif_transpose(image)
+            image.thumbnail((size, size))
+            image = image.convert('RGBA' if image.has_transparency_data else 'RGB')
+            output = io.BytesIO()
+            image.save(output, 'WEBP', quality=quality, method=4)
+            return output.getvalue()
+    except (UnidentifiedImageError, OSError, ValueError, Image.DecompressionBombError) as e:
+        logger.debug("Imagen no decodificable: %s", e)
+        raise ThumbnailError("No es una imagen válida", 415) from None
+
+
+class ThumbnailCache:
+    """
+    Caché en disco de miniaturas, direccionada por contenido y con desalojo LRU.
+
+    Es segura entre hilos (la API la usa desde el threadpool) y entre procesos
+    que compartan el directorio (índice SQLite en WAL, archivos escritos con
+    reemplazo atómico).
+
+    Args:
+        directory: Directorio de la caché
+        max_bytes: Tamaño máximo de las miniaturas guardadas
+    """
+
+    EVICTION_CHECK_EVERY = 50
+
+    def __init__(self, directory=CACHE_DIR, max_bytes: int = THUMBNAIL_CACHE_MAX_BYTES):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self._conn = None
+        self._lock = threading.Lock()
+        self._stored_since_eviction = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(self.directory / "index.db", timeout=5, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(SCHEMA)
+        return self._conn
+
+    def path_for(self, digest: str) -> Path:
+        """Archivo de la miniatura con ese hash."""
+        return self.directory / digest[:2] / f"{digest}.webp"
+
+    def get(self, url: str):
+        """
+        Miniatura guardada de una imagen.
+
+        Returns:
+            tuple or None: (hash, bytes de la miniatura), o None si no está en la caché
+        """
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute(
+                "SELECT s.digest FROM sources s JOIN files f ON f.digest = s.digest WHERE s.url = ?", (url,),
+            ).fetchone()
+            if not row:
+                return None
+            try:
+                data = self.path_for(row[0]).read_bytes()
+            except FileNotFoundError:
+                # Otro proceso la desalojó entre la consulta y la lectura
+                return None
+            conn.execute("UPDATE files SET last_access = ? WHERE digest = ?", (time.time(), row[0]))
+            conn.commit()
+            return row[0], data
+
+    def put(self, url: str, data: bytes) -> str:
+        """
+        Guarda la miniatura de una imagen.
+
+        Returns:
+            str: Hash de la miniatura
+        """
+        digest = hashlib.sha256(data).hexdigest()[:32]
+        path = self.path_for(digest)
+        with self._lock:
+            conn = self._connect()
+            if not path.exists():
+                path.parent.mkdir(parents=True, exist_ok=True)
+                tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+                tmp_path.write_bytes(data)
+                os.replace(tmp_path, path)
+            conn.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?)", (digest, len(data), time.time()))
+            conn.execute("INSERT OR REPLACE INTO sources VALUES (?, ?)", (url, digest))
+            conn.commit()
+            self._stored_since_eviction += 1
+            if self._stored_since_eviction >= self.EVICTION_CHECK_EVERY:
+                self._evict(conn)
+        return digest
+
+    def evict(self):
+        """Borra las miniaturas menos usadas si se supera el tamaño máximo."""
+        with self._lock:
+            self._evict(self._connect())
+
+    def _evict(self, conn: sqlite3.Connection):
+        self._stored_since_eviction = 0
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM files").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Desalojar por último acceso hasta quedar en el 90% del límite
+        to_free = total - int(self.max_bytes * 0.9)
+        freed = 0
+        victims = []
+        for digest, size in conn.execute("SELECT digest, size FROM files ORDER BY last_access"):
+            victims.append(digest)
+            freed += size
+            if freed >= to_free:
+                break
+        conn.executemany("DELETE FROM files WHERE digest = ?", [(digest,) for digest in victims])
+        conn.executemany("DELETE FROM sources WHERE digest = ?", [(digest,) for digest in victims])
+        conn.commit()
+        for digest in victims:
+            self.path_for(digest).unlink(missing_ok=True)
+        logger.info("Miniaturas desalojadas: %d (%d bytes)", len(victims), freed)
+
+
+class Thumbnailer:
+    """
+    Obtiene miniaturas: de la caché o descargando y reduciendo la imagen una vez.
+
+    Las requests simultáneas de la misma imagen esperan la misma descarga.
+
+    Args:
+        cache: ThumbnailCache a usar (por defecto, la de CACHE_DIR)
+        mock_url: Tienda falsa a la que pedir las imágenes (por defecto, CHEAPY_MOCK_STORE_URL)
+    """
+
+    def __init__(self, cache: ThumbnailCache = None, mock_url: str = MOCK_STORE_URL):
+        self.cache = cache or ThumbnailCache()
+        self.mock_url = mock_url.rstrip('/') if mock_url else None
+        self._client = None
+        self._inflight = {}
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=THUMBNAIL_FETCH_TIMEOUT, follow_redirects=True, headers={'User-Agent': USER_AGENT},
+                event_hooks={'request': [self._check_request]},
+            )
+        return self._client
+
+    async def _check_request(self, request: httpx.Request):
+        """Rechaza las redirecciones hacia hosts no permitidos."""
+        url = str(request.url)
+        if not allowed_url(url) and not (self.mock_url and url.startswith(self.mock_url)):
+            raise ThumbnailError("Host de imagen no permitido", 400)
+
+    async def get(self, url: str) -> tuple:
+        """
+        Miniatura de una imagen.
+
+        Returns:
+            tuple: (hash de la miniatura, bytes WebP)
+
+        Raises:
+            ThumbnailError: Si la URL no está permitida o la imagen no se pudo obtener
+        """
+        if not allowed_url(url):
+            await metrics.inc_async('cheapy_thumbnails_total', outcome='rejected')
+            raise ThumbnailError("Host de imagen no permitido", 400)
+        cached = await run_in_threadpool(self.cache.get, url)
+        if cached:
+            await metrics.inc_async('cheapy_thumbnails_total', outcome='hit')
+            return cached
+
+        task = self._inflight.get(url)
+        if task is None:
+            task = asyncio.ensure_future(self._create(url))
+            self._inflight[url] = task
+            task.add_done_callback(lambda _: self._inflight.pop(url, None))
+        # shield: si el cliente se desconecta la descarga sigue para los demás que la esperan
+        return await asyncio.shield(task)
+
+    async def _create(self, url: str) -> tuple:
+        try:
+            source = await self._fetch(url)
+            thumbnail = await run_in_threadpool(make_thumbnail, source)
+        except ThumbnailError as e:
+            await metrics.inc_async('cheapy_thumbnails_total', outcome='error')
+            logger.info("No se pudo crear la miniatura de %s: %s", url, e)
+            raise
+        digest = await run_in_threadpool(self.cache.put, url, thumbnail)
+        await metrics.inc_async('cheapy_thumbnails_total', outcome='miss')
+        await metrics.inc_async('cheapy_thumbnail_bytes_total', len(source), kind='source')
+        await metrics.inc_async('cheapy_thumbnail_bytes_total', len(thumbnail), kind='thumbnail')
+        return digest, thumbnail
+
+    async def _fetch(self, url: str) -> bytes:
+        """Descarga la imagen original, cortando si supera THUMBNAIL_MAX_SOURCE_BYTES."""
+        headers = {}
+        if self.mock_url:
+            parsed = urlparse(url)
+            headers[STORE_HEADER] = parsed.hostname
+            url = self.mock_url + (parsed.path or '/') + (f"?{parsed.query}" if parsed.query else '')
+        try:
+            async with self.client.stream('GET', url, headers=headers) as response:
+                if response.status_code != 200:
+                    raise ThumbnailError(f"La tienda respondió {response.status_code}", 502)
+                if int(response.headers.get('content-length') or 0) > THUMBNAIL_MAX_SOURCE_BYTES:
+                    raise ThumbnailError("Imagen demasiado grande", 413)
+                chunks, size = [], 0
+                async for chunk in response.aiter_bytes():
+                    size += len(chunk)
+                    if size > THUMBNAIL_MAX_SOURCE_BYTES:
+                        raise ThumbnailError("Imagen demasiado grande", 413)
+                    chunks.append(chunk)
+                return b''.join(chunks)
+        except httpx.HTTPError as e:
+            raise ThumbnailError(f"No se pudo descargar la imagen: {e}", 502) from None
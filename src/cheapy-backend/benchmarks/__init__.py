@@ -0,0 +1,3 @@
+"""
+Benchmarks offline de Cheapy: miden el backend sin golpear tiendas reales.
+"""
@@ -0,0 +1,340 @@
+"""
+Prueba de carga de la API con clientes que imitan a la extensión.
+
+`popup.js` llama a `/buscar` una vez y luego consulta `/resultados/{task_id}`
+inmediatamente y cada 2 segundos (hasta 45 intentos), así que la carga de la
+API está dominada por el sondeo. Este harness reproduce ese comportamiento con
+N usuarios concurrentes contra la app FastAPI real, pero con las tareas de
+spider reemplazadas por un stub que duerme el tiempo típico del spider
+(según su costo en SPIDER_PROFILES) y devuelve los items de su fixture.
+
+La API corre en un subproceso junto con un worker de Celery en hilos que
+ejecuta el stub. Se reporta:
+
+    cpu/search     segundos de CPU del proceso de la API por búsqueda
+    rt/search      viajes de ida y vuelta a Redis por búsqueda
+    p50/p90/p99    latencia de /buscar, de los sondeos pendientes y del sondeo final
+
+Modos:
+    memoria (por defecto): broker `memory://` y backend `cache+memory://`, sin
+        servidores externos. Los viajes a Redis se estiman contando las
+        operaciones del backend de resultados (cada una es un viaje con Redis);
+        las métricas de Prometheus se desactivan porque no hay Redis.
+    --redis-url URL: broker y backend en Redis reales; se cuentan los envíos de
+        comandos de redis-py (un pipeline cuenta como un único viaje).
+
+Uso (desde src/cheapy-backend):
+    python -m benchmarks.api_load --users 10,50,100 --duration 60
+    python -m benchmarks.api_load --users 50 --redis-url redis://localhost:6379/15
+"""
+
+import argparse
+import asyncio
+import contextvars
+import json
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+from benchmarks.loadtest import QUERIES, percentile
+
+BACKEND_ROOT = Path(__file__).resolve().parent.parent
+
+POLL_INTERVAL = 2.0
+MAX_POLL_ATTEMPTS = 45
+STATS_PATH = "/__loadtest"
+
+# Operaciones del backend de resultados que equivalen a un viaje a Redis
+BACKEND_OPERATIONS = ('get', 'mget', 'set', 'delete', 'incr', 'expire')
+
+
+class RoundTripCounter:
+    """
+    Cuenta viajes a Redis (o sus equivalentes) hechos al atender requests de la API.
+
+    El worker stub corre en el mismo proceso; sus viajes no se cuentan porque en
+    producción los hace otro proceso. Sólo cuenta lo ejecutado dentro de una
+    request HTTP (marcada con un contextvar que también heredan los hilos del
+    threadpool de FastAPI).
+    """
+
+    def __init__(self):
+        self.value = 0
+        self.in_request = contextvars.ContextVar('loadtest_in_request', default=False)
+
+    def hit(self):
+        if self.in_request.get():
+            self.value += 1
+
+    def wrap(self, owner, name: str):
+        """Reemplaza `owner.name` por una versión que cuenta cada llamada."""
+        original = getattr(owner, name)
+        counter = self
+
+        if asyncio.iscoroutinefunction(original):
+            async def counted(*args, **kwargs):
+                counter.hit()
+                return await original(*args, **kwargs)
+        else:
+            def counted(*args, **kwargs):
+                counter.hit()
+                return original(*args, **kwargs)
+        setattr(owner, name, counted)
+
+
+def build_stub_items() -> dict:
+    """Items de cada spider, obtenidos parseando su fixture una sola vez."""
+    import logging
+    from scrapy.utils.project import get_project_settings
+    from benchmarks.parsers import FIXTURES_DIR, SPIDERS, run_page
+
+    logging.disable(logging.INFO)
+    settings = get_project_settings()
+    items = {}
+    for name, (spider_cls, url, meta) in SPIDERS.items():
+        accepted, _ = run_page(spider_cls, url, meta, (FIXTURES_DIR / f"{name}.html").read_bytes(), settings)
+        items[name] = [item.to_output() for item in accepted]
+    logging.disable(logging.NOTSET)
+    return items
+
+
+def serve(args):
+    """
+    Proceso servidor: API real + worker de Celery en hilos con tareas stub.
+
+    Se ejecuta en un subproceso para que la CPU medida sea la de la API y no la
+    de los clientes simulados.
+    """
+    import uvicorn
+    from celery.contrib.testing.worker import start_worker
+
+    import metrics
+    import productindex
+    from api.app import admission_controller, app
+    from config import SPIDER_PROFILES, SPIDER_QUEUES
+    from worker.celery_app import celery
+    from worker.queues import SPIDER_TASK_NAME
+
+    counter = RoundTripCounter()
+    if args.redis_url:
+        celery.conf.update(broker_url=args.redis_url, result_backend=args.redis_url)
+        import redis.asyncio.connection
+        import redis.connection
+        counter.wrap(redis.connection.Connection, 'send_packed_command')
+        counter.wrap(redis.asyncio.connection.AbstractConnection, 'send_packed_command')
+    else:
+        celery.conf.update(broker_url='memory://', result_backend='cache+memory://')
+        for name in ('inc', 'set_gauge', 'observe'):
+            setattr(metrics, name, lambda *a, **kw: None)
+
+        async def observe_async(*args, **kwargs):
+            pass
+        metrics.observe_async = observe_async
+        metrics.inc_async = observe_async
+        for name in BACKEND_OPERATIONS:
+            counter.wrap(type(celery.backend), name)
+
+    # Todos los usuarios simulados comparten IP: el límite por cliente los rechazaría
+    admission_controller.enabled = False
+
+    # El índice local que consulta /buscar se crea en una base temporal, no en productos.db
+    productindex.DB_FILE = Path(tempfile.mkdtemp(prefix='cheapy-api-load-')) / 'productos.db'
+
+    stub_items = build_stub_items()
+    max_cost = max(profile['cost'] for profile in SPIDER_PROFILES.values())
+
+    # Reemplazar la tarea real (subproceso de Scrapy) por el stub con el mismo nombre
+    celery.tasks.pop(SPIDER_TASK_NAME, None)
+
+    @celery.task(name=SPIDER_TASK_NAME)
+    def stub_spider_task(spider_name: str, query: str, country: str, trace: dict = None,
+                         incremental: bool = False, queries: list = None):
+        cost = SPIDER_PROFILES.get(spider_name, {'cost': max_cost})['cost']
+        time.sleep(args.task_seconds * cost / max_cost * random.uniform(0.7, 1.3))
+        items = stub_items.get(spider_name, [])
+        if queries:
+            items = [dict(item, query=q) for q in queries for item in items]
+        return {'items': items, 'unchanged': 0} if incremental else items
+
+    @app.middleware("http")
+    async def mark_api_request(request, call_next):
+        token = counter.in_request.set(request.url.path != STATS_PATH)
+        try:
+            return await call_next(request)
+        finally:
+            counter.in_request.reset(token)
+
+    @app.get(STATS_PATH, include_in_schema=False)
+    def loadtest_stats():
+        return {'cpu': time.process_time(), 'roundtrips': counter.value}
+
+    queues = [profile['queue'] for profile in SPIDER_QUEUES.values()]
+    with start_worker(celery, pool='threads', concurrency=args.worker_concurrency,
+                      perform_ping_check=False, queues=queues, loglevel='error'):
+        uvicorn.run(app, host='127.0.0.1', port=args.port, log_level='warning')
+
+
+class ClientStats:
+    """Latencias y contadores acumulados por los clientes simulados."""
+
+    def __init__(self):
+        self.buscar = []
+        self.pending_polls = []
+        self.final_polls = []
+        self.searches = []
+        self.failures = 0
+        self.requests = 0
+
+
+async def simulated_client(client: httpx.AsyncClient, deadline: float, think_time: float, stats: ClientStats):
+    """Repite el ciclo de la extensión: /buscar y sondeo de /resultados cada 2 s."""
+    await asyncio.sleep(random.uniform(0, POLL_INTERVAL))  # no arrancar todos juntos
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        try:
+            t0 = time.perf_counter()
+            response = await client.get("/buscar", params={'q': random.choice(QUERIES), 'country': 'AR'})
+            stats.buscar.append(time.perf_counter() - t0)
+            stats.requests += 1
+            task_id = response.json().get('task_id')
+            status = None
+            for _ in range(MAX_POLL_ATTEMPTS):
+                t0 = time.perf_counter()
+                data = (await client.get(f"/resultados/{task_id}")).json()
+                elapsed = time.perf_counter() - t0
+                stats.requests += 1
+                status = data.get('status')
+                if status in ('SUCCESS', 'FAILURE'):
+                    stats.final_polls.append(elapsed)
+                    break
+                stats.pending_polls.append(elapsed)
+                await asyncio.sleep(POLL_INTERVAL)
+            if status == 'SUCCESS':
+                stats.searches.append(time.perf_counter() - start)
+            else:
+                stats.failures += 1
+        except (httpx.HTTPError, ValueError):
+            stats.failures += 1
+        await asyncio.sleep(random.uniform(0.5, 1.5) * think_time)
+
+
+async def run_step(base_url: str, users: int, args) -> dict:
+    """Corre un escalón de `users` clientes y devuelve sus resultados."""
+    stats = ClientStats()
+    limits = httpx.Limits(max_connections=users + 10)
+    async with httpx.AsyncClient(base_url=base_url, timeout=60, limits=limits) as client:
+        before = (await client.get(STATS_PATH)).json()
+        start = time.perf_counter()
+        deadline = start + args.duration
+        await asyncio.gather(*(simulated_client(client, deadline, args.think_time, stats) for _ in range(users)))
+        elapsed = time.perf_counter() - start
+        after = (await client.get(STATS_PATH)).json()
+
+    searches = len(stats.searches)
+    cpu = after['cpu'] - before['cpu']
+    roundtrips = after['roundtrips'] - before['roundtrips']
+    ms = lambda values, pct: round(percentile(values, pct) * 1000, 1)
+    return {
+        'users': users,
+        'searches': searches,
+        'failures': stats.failures,
+        'searches_per_sec': round(searches / elapsed, 2),
+        'requests_per_sec': round(stats.requests / elapsed, 1),
+        'api_cpu_pct': round(cpu / elapsed * 100, 1),
+        'cpu_ms_per_search': round(cpu / searches * 1000, 1) if searches else None,
+        'roundtrips_per_search': round(roundtrips / searches, 1) if searches else None,
+        'buscar_ms': {p: ms(stats.buscar, p) for p in (50, 90, 99)},
+        'poll_pending_ms': {p: ms(stats.pending_polls, p) for p in (50, 90, 99)},
+        'poll_final_ms': {p: ms(stats.final_polls, p) for p in (50, 90, 99)},
+        'search_s': {p: round(percentile(stats.searches, p), 2) for p in (50, 90, 99)},
+    }
+
+
+def print_step(step: dict):
+    print(
+        f"\n{step['users']} usuarios: {step['searches']} búsquedas ({step['failures']} fallidas), "
+        f"{step['searches_per_sec']} búsquedas/s, {step['requests_per_sec']} req/s"
+    )
+    print(
+        f"  CPU API: {step['api_cpu_pct']}% ({step['cpu_ms_per_search']} ms/búsqueda), "
+        f"viajes a Redis: {step['roundtrips_per_search']} por búsqueda"
+    )
+    for label, key, unit in (("/buscar", 'buscar_ms', 'ms'), ("sondeo pendiente", 'poll_pending_ms', 'ms'),
+                             ("sondeo final", 'poll_final_ms', 'ms'), ("búsqueda completa", 'search_s', 's')):
+        values = step[key]
+        print(f"  {label:<18} p50 {values[50]:>8} {unit}  p90 {values[90]:>8} {unit}  p99 {values[99]:>8} {unit}")
+
+
+def wait_for_server(base_url: str, process: subprocess.Popen, timeout: float = 60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("El servidor de la API terminó durante el arranque")
+        try:
+            if httpx.get(base_url + STATS_PATH, timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.25)
+    raise RuntimeError("El servidor de la API no respondió a tiempo")
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Carga de la API con clientes simulados de la extensión")
+    sub = parser.add_subparsers(dest='command')
+    parser.add_argument('--users', default='10,50,100',
+                        type=lambda s: [int(x) for x in s.split(',') if x.strip()],
+                        help="Escalones de usuarios concurrentes, separados por comas")
+    parser.add_argument('--duration', type=float, default=60, help="Segundos por escalón")
+    parser.add_argument('--think-time', type=float, default=5, help="Pausa media entre búsquedas de un usuario")
+    parser.add_argument('--output', help="Guardar los resultados en JSON")
+    for p in (parser, sub.add_parser('serve', help="(interno) proceso servidor")):
+        p.add_argument('--redis-url', help="Usar Redis real como broker y backend")
+        p.add_argument('--task-seconds', type=float, default=10,
+                       help="Duración simulada del spider más costoso; el resto escala por costo")
+        p.add_argument('--worker-concurrency', type=int, default=64)
+    sub.choices['serve'].add_argument('--port', type=int, required=True)
+    args = parser.parse_args(argv)
+
+    if args.command == 'serve':
+        serve(args)
+        return 0
+
+    port = free_port()
+    command = [sys.executable, '-m', 'benchmarks.api_load', 'serve', '--port', str(port),
+               '--task-seconds', str(args.task_seconds), '--worker-concurrency', str(args.worker_concurrency)]
+    if args.redis_url:
+        command += ['--redis-url', args.redis_url]
+    process = subprocess.Popen(command, cwd=BACKEND_ROOT)
+    base_url = f"http://127.0.0.1:{port}"
+    steps = []
+    try:
+        wait_for_server(base_url, process)
+        for users in args.users:
+            step = asyncio.run(run_step(base_url, users, args))
+            steps.append(step)
+            print_step(step)
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(steps, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
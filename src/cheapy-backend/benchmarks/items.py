@@ -0,0 +1,180 @@
+"""
+Benchmark de la representación de items en un crawl grande (10k+ productos).
+
+Compara la representación actual (ProductItem, dataclass con slots) con las
+anteriores: diccionarios planos (Frávega, Amazon, eBay) y el scrapy.Item de
+20 campos (MercadoLibre, Megatone, AliExpress). Los valores crudos salen de
+las páginas de benchmarks/fixtures y se replican hasta N items con URLs
+distintas. Se reporta, por representación:
+
+    bytes/item   memoria retenida por item construido (tracemalloc)
+    build us     construcción de un item, en microsegundos
+    export us    serialización a la salida JSON Lines que lee el worker
+
+Para ProductItem se mide además la cadena completa de pipelines y el total
+por item (construcción + pipelines + exportación).
+
+Uso (desde src/cheapy-backend):
+    python -m benchmarks.items                 # 10000 items
+    python -m benchmarks.items --items 50000
+"""
+
+import argparse
+import gc
+import io
+import logging
+import sys
+import time
+import tracemalloc
+
+import scrapy
+from scrapy.exporters import JsonLinesItemExporter
+from scrapy.utils.project import get_project_settings
+
+from benchmarks.parsers import FIXTURES_DIR, SPIDERS, load_pipelines, run_page
+from cheapy_scraper.exporters import ProductJsonLinesExporter
+from cheapy_scraper.items import ProductItem
+
+DEFAULT_ITEMS = 10000
+
+# Campos que completan los spiders (el resto los calcula DataCleaningPipeline)
+RAW_FIELDS = (
+    'title', 'url', 'image_url', 'source', 'price', 'price_before', 'is_discounted',
+    'rating_str', 'reviews_count_str', 'currency_code', 'country_code',
+    'price_numeric', 'price_before_numeric',
+)
+
+
+class LegacyProductItem(scrapy.Item):
+    """Representación anterior (scrapy.Item de 20 campos), sólo para comparar."""
+    title = scrapy.Field()
+    url = scrapy.Field()
+    image_url = scrapy.Field()
+    source = scrapy.Field()
+    price = scrapy.Field()
+    rating_str = scrapy.Field()
+    reviews_count_str = scrapy.Field()
+    reviews_count_raw = scrapy.Field()
+    currency_code = scrapy.Field()
+    country_code = scrapy.Field()
+    price_numeric = scrapy.Field()
+    currency = scrapy.Field()
+    rating = scrapy.Field()
+    reviews_count = scrapy.Field()
+    price_display = scrapy.Field()
+    price_before = scrapy.Field()
+    price_before_numeric = scrapy.Field()
+    is_discounted = scrapy.Field()
+    on_sale = scrapy.Field()
+    discount_percent = scrapy.Field()
+
+
+REPRESENTATIONS = {
+    'dict': (dict, lambda file: JsonLinesItemExporter(file)),
+    'scrapy.Item': (LegacyProductItem, lambda file: JsonLinesItemExporter(file)),
+    'ProductItem': (ProductItem, lambda file: ProductJsonLinesExporter(file)),
+}
+
+
+def load_raw_items(count: int, settings) -> list:
+    """
+    Valores crudos de `count` productos, tomados de los fixtures de todos los spiders.
+
+    Las URLs se hacen únicas para que DuplicatesPipeline no descarte las réplicas.
+    """
+    pool = []
+    for name, (spider_cls, url, meta) in SPIDERS.items():
+        accepted, _ = run_page(spider_cls, url, meta, (FIXTURES_DIR / f"{name}.html").read_bytes(), settings)
+        pool.extend(accepted)
+    # run_page devuelve items ya limpios: se vuelve a los valores que emite el spider
+    raw = []
+    for i in range(count):
+        item = pool[i % len(pool)]
+        values = {field: getattr(item, field) for field in RAW_FIELDS if getattr(item, field) is not None}
+        values['price'] = item.price_display
+        values['url'] = f"{item.url}#r{i}"
+        raw.append(values)
+    return raw
+
+
+def build(item_cls, raw: list) -> list:
+    return [item_cls(**values) for values in raw]
+
+
+def bench_representation(name: str, raw: list, settings) -> dict:
+    """
+    Mide memoria, construcción y exportación de una representación.
+
+    Returns:
+        dict: Resultados de la representación
+    """
+    item_cls, make_exporter = REPRESENTATIONS[name]
+    count = len(raw)
+
+    gc.collect()
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    items = build(item_cls, raw)
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del items
+
+    gc.collect()
+    start = time.perf_counter()
+    items = build(item_cls, raw)
+    build_elapsed = time.perf_counter() - start
+
+    result = {
+        'items': count,
+        'bytes_per_item': round((after - before) / count),
+        'build_us': round(build_elapsed / count * 1e6, 2),
+    }
+
+    if name == 'ProductItem':
+        spider = SPIDERS['fravega'][0](query="smart tv")
+        pipelines = load_pipelines(settings)
+        start = time.perf_counter()
+        for item in items:
+            for pipeline in pipelines:
+                item = pipeline.process_item(item, spider)
+        result['pipelines_us'] = round((time.perf_counter() - start) / count * 1e6, 2)
+
+    exporter = make_exporter(io.BytesIO())
+    exporter.start_exporting()
+    start = time.perf_counter()
+    for item in items:
+        exporter.export_item(item)
+    export_elapsed = time.perf_counter() - start
+    exporter.finish_exporting()
+    result['export_us'] = round(export_elapsed / count * 1e6, 2)
+    result['output_bytes_per_item'] = round(len(exporter.file.getvalue()) / count)
+
+    if 'pipelines_us' in result:
+        result['total_us'] = round(result['build_us'] + result['pipelines_us'] + result['export_us'], 2)
+        result['items_per_sec'] = round(1e6 / result['total_us'], 1)
+    return result
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark de representación de items")
+    parser.add_argument('--items', type=int, default=DEFAULT_ITEMS, help="Items por crawl simulado")
+    args = parser.parse_args(argv)
+
+    logging.disable(logging.INFO)
+    settings = get_project_settings()
+    raw = load_raw_items(args.items, settings)
+
+    print(f"{args.items} items por crawl")
+    print(f"{'repr':<14}{'bytes/item':>12}{'build us':>10}{'export us':>11}{'out B/item':>12}{'pipes us':>10}{'items/s':>10}")
+    print('-' * 79)
+    for name in REPRESENTATIONS:
+        r = bench_representation(name, raw, settings)
+        print(
+            f"{name:<14}{r['bytes_per_item']:>12}{r['build_us']:>10}{r['export_us']:>11}"
+            f"{r['output_bytes_per_item']:>12}{r.get('pipelines_us', '-'):>10}{r.get('items_per_sec', '-'):>10}"
+        )
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,147 @@
+"""
+Driver de carga de punta a punta: API → Celery → crawl → pipelines → agregación.
+
+Cada usuario virtual repite el ciclo de la extensión: `GET /buscar`, luego
+consulta `/resultados/{task_id}` hasta que la búsqueda termina. La carga se
+sube por escalones de concurrencia y para cada escalón se reporta:
+
+    searches/s   búsquedas completadas por segundo
+    p50 / p99    latencia de la búsqueda completa (desde /buscar hasta SUCCESS)
+    errors       búsquedas fallidas o que superaron el timeout
+
+Requiere la API, los workers y Redis en marcha, con las tiendas apuntando a la
+tienda falsa (ver benchmarks/mock_store.py):
+
+    python -m benchmarks.mock_store --latency-ms 400 &
+    export CHEAPY_MOCK_STORE_URL=http://127.0.0.1:8900
+    uvicorn api.app:app &  python -m worker.launch http &  python -m worker.launch rendered &
+    python -m benchmarks.loadtest --concurrency 1,2,4,8,16 --duration 60
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+
+import httpx
+
+QUERIES = [
+    "smart tv", "celular", "notebook", "heladera", "lavarropas", "auriculares",
+    "aire acondicionado", "microondas", "tablet", "smartwatch",
+]
+
+
+def percentile(values: list, pct: float) -> float:
+    """Percentil por rango más cercano; 0.0 si no hay muestras."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+async def run_search(client: httpx.AsyncClient, country: str, poll_interval: float, timeout: float) -> tuple:
+    """
+    Ejecuta una búsqueda completa como lo hace la extensión.
+
+    Returns:
+        tuple: (éxito, segundos hasta el resultado final, cantidad de resultados)
+    """
+    start = time.perf_counter()
+    response = await client.get("/buscar", params={'q': random.choice(QUERIES), 'country': country})
+    response.raise_for_status()
+    task_id = response.json().get('task_id')
+    if not task_id:
+        return False, time.perf_counter() - start, 0
+
+    while time.perf_counter() - start < timeout:
+        await asyncio.sleep(poll_interval)
+        data = (await client.get(f"/resultados/{task_id}")).json()
+        if data.get('status') == 'SUCCESS':
+            return True, time.perf_counter() - start, len(data.get('results', []))
+        if data.get('status') == 'FAILURE':
+            return False, time.perf_counter() - start, 0
+    return False, time.perf_counter() - start, 0
+
+
+async def virtual_user(client, deadline: float, args, samples: dict):
+    while time.perf_counter() < deadline:
+        try:
+            ok, elapsed, results = await run_search(client, args.country, args.poll_interval, args.timeout)
+        except httpx.HTTPError:
+            ok, elapsed, results = False, 0.0, 0
+        if ok:
+            samples['latencies'].append(elapsed)
+            samples['results'] += results
+        else:
+            samples['errors'] += 1
+
+
+async def run_step(concurrency: int, args) -> dict:
+    """
+    Corre un escalón de carga con `concurrency` usuarios durante `args.duration` segundos.
+
+    Las búsquedas que siguen en vuelo al vencer el escalón se dejan terminar y
+    cuentan para el escalón, por lo que su duración real puede superar la pedida.
+
+    Returns:
+        dict: Resultados del escalón
+    """
+    samples = {'latencies': [], 'errors': 0, 'results': 0}
+    limits = httpx.Limits(max_connections=concurrency * 2)
+    async with httpx.AsyncClient(base_url=args.api, timeout=30, limits=limits) as client:
+        start = time.perf_counter()
+        deadline = start + args.duration
+        await asyncio.gather(*(virtual_user(client, deadline, args, samples) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    latencies = samples['latencies']
+    return {
+        'concurrency': concurrency,
+        'searches': len(latencies),
+        'errors': samples['errors'],
+        'searches_per_sec': round(len(latencies) / elapsed, 3),
+        'p50': round(percentile(latencies, 50), 2),
+        'p99': round(percentile(latencies, 99), 2),
+        'avg_results': round(samples['results'] / len(latencies), 1) if latencies else 0,
+    }
+
+
+async def run(args) -> list:
+    steps = []
+    print(f"{'conc':>5}{'searches':>10}{'errors':>8}{'search/s':>10}{'p50 s':>9}{'p99 s':>9}{'results':>9}")
+    for concurrency in args.concurrency:
+        step = await run_step(concurrency, args)
+        steps.append(step)
+        print(
+            f"{step['concurrency']:>5}{step['searches']:>10}{step['errors']:>8}{step['searches_per_sec']:>10}"
+            f"{step['p50']:>9}{step['p99']:>9}{step['avg_results']:>9}",
+            flush=True,
+        )
+    return steps
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Prueba de carga de punta a punta contra la API")
+    parser.add_argument('--api', default='http://127.0.0.1:8000', help="URL base de la API")
+    parser.add_argument('--concurrency', default='1,2,4,8,16',
+                        type=lambda s: [int(x) for x in s.split(',') if x.strip()],
+                        help="Escalones de usuarios concurrentes, separados por comas")
+    parser.add_argument('--duration', type=float, default=60, help="Segundos por escalón")
+    parser.add_argument('--country', default='AR', help="País de las búsquedas (define los spiders)")
+    parser.add_argument('--poll-interval', type=float, default=1.0, help="Segundos entre consultas a /resultados")
+    parser.add_argument('--timeout', type=float, default=180, help="Timeout de una búsqueda completa")
+    parser.add_argument('--output', help="Guardar los resultados en JSON")
+    args = parser.parse_args(argv)
+
+    steps = asyncio.run(run(args))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(steps, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,266 @@
+"""
+Tienda falsa local para pruebas de carga de punta a punta.
+
+Sirve las páginas de `benchmarks/fixtures/` como si fueran las tiendas reales,
+con latencia, tasa de error y cantidad de páginas configurables. Los crawls
+llegan aquí a través de MockStoreMiddleware (setting MOCK_STORE_URL), que
+reescribe cada request hacia este servidor e indica la tienda original en el
+header X-Cheapy-Store.
+
+Uso (desde src/cheapy-backend):
+    python -m benchmarks.mock_store --port 8900 --latency-ms 400 --jitter-ms 200 --error-rate 0.02
+
+    # API y workers apuntando a la tienda falsa
+    export CHEAPY_MOCK_STORE_URL=http://127.0.0.1:8900
+
+Cada página lleva un ETag (hash del cuerpo) y una request con If-None-Match
+igual recibe 304 sin cuerpo, como el spider `refresh` espera de las tiendas que
+soportan requests condicionales; con --no-validators se omiten.
+
+Con --block-rate una fracción de las respuestas es una página de captcha con
+status 200, como las que sirven las tiendas a un scraper detectado
+(BlockDetectorMiddleware las reconoce por sus marcadores).
+
+Con --consent la primera visita de cada cliente (sin la cookie de
+consentimiento) recibe una redirección con Set-Cookie, como los banners de
+consentimiento y las redirecciones por país: un viaje extra que una sesión
+reutilizada (SessionMiddleware) se ahorra.
+
+Las URLs de imágenes (.jpg, .png, .webp) de cualquier host reciben una
+imagen generada de IMAGE_SIZE px, para probar /img (api/thumbnails.py).
+
+`GET /__stats` devuelve los contadores del servidor en JSON.
+"""
+
+import argparse
+import hashlib
+import io
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+FIXTURES_DIR = Path(__file__).resolve().parent / "fixtures"
+
+STORE_HEADER = 'X-Cheapy-Store'
+
+# Marcador de host de la tienda -> fixture
+STORE_FIXTURES = {
+    'mercadolibre.': 'mercadolibre',
+    'fravega.com': 'fravega',
+    'amazon.': 'amazon',
+    'ebay.': 'ebay',
+    'aliexpress.': 'aliexpress',
+    'megatone.net': 'megatone',
+}
+
+# Bloques de paginación de los fixtures; se quitan en la última página
+PAGINATION_RE = re.compile(rb'<nav>.*?</nav>|<div class="paginador">.*?</div></div>', re.S)
+# Bloques de resultados; se vacían en páginas posteriores a la última
+RESULTS_RE = re.compile(rb'<main>.*</main>', re.S)
+MELI_OFFSET_RE = re.compile(r'_Desde_(\d+)')
+
+MELI_PAGE_SIZE = 50
+
+CONSENT_COOKIE = 'cheapy_consent=1'
+
+# Imágenes de producto servidas en lugar de las de los CDN
+IMAGE_RE = re.compile(r'\.(jpe?g|png|webp)$', re.I)
+IMAGE_SIZE = 800
+
+# Página de verificación servida con --block-rate
+BLOCK_PAGE = (
+    '<html><head><title>Robot Check</title></head><body>'
+    '<p>Detectamos tráfico inusual desde tu red. Resolvé el captcha para continuar.</p>'
+    '<form action="/errors/validateCaptcha"><input name="field-keywords"></form></body></html>'
+).encode()
+
+
+def page_number(url: str) -> int:
+    """
+    Deduce el número de página pedido a partir de la URL de la tienda.
+
+    Soporta el parámetro `page` (Frávega, AliExpress), `_pg` y el offset
+    `_Desde_N` de MercadoLibre.
+    """
+    parsed = urlparse(url)
+    params = parse_qs(parsed.query)
+    for name in ('page', '_pg'):
+        if params.get(name, [''])[0].isdigit():
+            return max(1, int(params[name][0]))
+    match = MELI_OFFSET_RE.search(parsed.path)
+    if match:
+        return (int(match.group(1)) - 1) // MELI_PAGE_SIZE + 1
+    return 1
+
+
+class MockStoreState:
+    """Configuración y contadores compartidos por los hilos del servidor."""
+
+    def __init__(self, latency_ms: float, jitter_ms: float, error_rate: float, pages: int,
+                 validators: bool = True, block_rate: float = 0.0, consent: bool = False):
+        self.latency = latency_ms / 1000
+        self.jitter = jitter_ms / 1000
+        self.error_rate = error_rate
+        self.pages = pages
+        self.validators = validators
+        self.block_rate = block_rate
+        self.consent = consent
+        self.fixtures = {name: (FIXTURES_DIR / f"{name}.html").read_bytes() for name in STORE_FIXTURES.values()}
+        self.lock = threading.Lock()
+        self.counters = {'requests': 0, 'errors': 0, 'bytes': 0, 'not_modified': 0, 'blocked': 0, 'consent_redirects': 0, 'images': 0,
+                         'by_store': {}}
+
+    def count(self, store: str, size: int, error: bool):
+        with self.lock:
+            self.counters['requests'] += 1
+            self.counters['errors'] += int(error)
+            self.counters['bytes'] += size
+            self.counters['by_store'][store] = self.counters['by_store'].get(store, 0) + 1
+
+    def image(self, path: str) -> bytes:
+        """JPEG de IMAGE_SIZE px de un color derivado de la ruta (Pillow se importa sólo si se usa)."""
+        from PIL import Image
+
+        color = tuple(hashlib.blake2b(path.encode(), digest_size=3).digest())
+        output = io.BytesIO()
+        Image.new('RGB', (IMAGE_SIZE, IMAGE_SIZE), color).save(output, 'JPEG', quality=90)
+        return output.getvalue()
+
+    def render(self, store: str, page: int) -> bytes:
+        """Arma el cuerpo de la página `page` de la tienda según la paginación configurada."""
+        body = self.fixtures[store]
+        if page > self.pages:
+            return RESULTS_RE.sub(b'<main></main>', body, count=1)
+        if page == self.pages:
+            return PAGINATION_RE.sub(b'', body)
+        return body
+
+
+class MockStoreHandler(BaseHTTPRequestHandler):
+    server_version = "CheapyMockStore/1.0"
+    protocol_version = "HTTP/1.1"
+
+    @property
+    def state(self) -> MockStoreState:
+        return self.server.state
+
+    def log_message(self, format, *args):
+        pass  # Una línea por request satura la consola bajo carga
+
+    def _send(self, status: int, body: bytes, content_type: str = 'text/html; charset=utf-8', etag: str = None,
+              headers: dict = None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        if etag:
+            self.send_header('ETag', etag)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == '/__stats':
+            with self.state.lock:
+                body = json.dumps(self.state.counters).encode()
+            return self._send(200, body, 'application/json')
+
+        if IMAGE_RE.search(urlparse(self.path).path):
+            body = self.state.image(urlparse(self.path).path)
+            with self.state.lock:
+                self.state.counters['images'] += 1
+                self.state.counters['bytes'] += len(body)
+            return self._send(200, body, 'image/jpeg')
+
+        host = (self.headers.get(STORE_HEADER) or self.headers.get('Host') or '').lower()
+        store = next((name for marker, name in STORE_FIXTURES.items() if marker in host), None)
+        if store is None:
+            self.state.count('unknown', 0, True)
+            return self._send(404, b'tienda desconocida')
+
+        delay = self.state.latency + random.uniform(-self.state.jitter, self.state.jitter)
+        if delay > 0:
+            time.sleep(delay)
+
+        if random.random() < self.state.error_rate:
+            self.state.count(store, 0, True)
+            return self._send(503, b'<html><body>Service Unavailable</body></html>')
+
+        if self.state.consent and CONSENT_COOKIE not in (self.headers.get('Cookie') or ''):
+            self.state.count(store, 0, False)
+            with self.state.lock:
+                self.state.counters['consent_redirects'] += 1
+            return self._send(302, b'', headers={
+                'Location': self.path, 'Set-Cookie': f"{CONSENT_COOKIE}; Path=/; Max-Age=86400",
+            })
+
+        if random.random() < self.state.block_rate:
+            self.state.count(store, len(BLOCK_PAGE), False)
+            with self.state.lock:
+                self.state.counters['blocked'] += 1
+            return self._send(200, BLOCK_PAGE)
+
+        body = self.state.render(store, page_number(self.path))
+        etag = None
+        if self.state.validators:
+            etag = f'"{hashlib.blake2b(body, digest_size=8).hexdigest()}"'
+            if self.headers.get('If-None-Match') == etag:
+                self.state.count(store, 0, False)
+                with self.state.lock:
+                    self.state.counters['not_modified'] += 1
+                return self._send(304, b'', etag=etag)
+        self.state.count(store, len(body), False)
+        self._send(200, body, etag=etag)
+
+    do_HEAD = do_GET
+
+
+def serve(host: str, port: int, state: MockStoreState) -> ThreadingHTTPServer:
+    """
+    Crea el servidor de la tienda falsa (sin arrancarlo).
+
+    Returns:
+        ThreadingHTTPServer: Servidor listo para `serve_forever()`
+    """
+    server = ThreadingHTTPServer((host, port), MockStoreHandler)
+    server.daemon_threads = True
+    server.state = state
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Tienda falsa para pruebas de carga")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8900)
+    parser.add_argument('--latency-ms', type=float, default=300, help="Latencia media por página")
+    parser.add_argument('--jitter-ms', type=float, default=100, help="Variación uniforme de la latencia")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Fracción de respuestas 503")
+    parser.add_argument('--pages', type=int, default=2, help="Páginas de resultados por búsqueda")
+    parser.add_argument('--block-rate', type=float, default=0.0, help="Fracción de páginas de captcha (status 200)")
+    parser.add_argument('--consent', action='store_true',
+                        help="Redirigir la primera visita de cada cliente para fijar una cookie de consentimiento")
+    parser.add_argument('--no-validators', action='store_true', help="Sin ETag ni respuestas 304")
+    args = parser.parse_args(argv)
+
+    state = MockStoreState(args.latency_ms, args.jitter_ms, args.error_rate, args.pages, not args.no_validators,
+                           args.block_rate, args.consent)
+    server = serve(args.host, args.port, state)
+    print(f"Tienda falsa en http://{args.host}:{args.port} "
+          f"(latencia {args.latency_ms}±{args.jitter_ms} ms, errores {args.error_rate:.0%}, "
+          f"bloqueos {args.block_rate:.0%}, {args.pages} páginas)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,302 @@
+"""
+Benchmark offline de parseo: spiders + pipelines sobre páginas guardadas.
+
+Cada spider recibe su página de resultados de `benchmarks/fixtures/<spider>.html`
+como un HtmlResponse, y los items que produce `parse()` pasan por la cadena
+completa de ITEM_PIPELINES del proyecto. Se reporta, por spider:
+
+    items/s      items procesados por segundo (parseo + pipelines)
+    us/item      latencia promedio por item en microsegundos
+    allocs/page  bloques de memoria asignados y retenidos al procesar una página
+    peak_kb      pico de memoria Python durante el procesamiento de una página
+    doc_kb       memoria residente del documento parseado (incluye el heap de C
+                 de lxml o lexbor, que tracemalloc no ve)
+
+Uso (desde src/cheapy-backend):
+    python -m benchmarks.parsers                     # correr y comparar con baseline.json
+    python -m benchmarks.parsers --spider ebay       # un solo spider
+    python -m benchmarks.parsers --update-baseline   # regrabar la línea base
+    python -m benchmarks.parsers --backend all       # comparar backends HTML (htmlbackends.py)
+
+Con otro backend que parsel los resultados se identifican como 'spider@backend'
+y sólo se miden los spiders que extraen con ExtractionSpec.
+
+El proceso termina con código 1 si algún spider queda por debajo de la línea
+base más allá de la tolerancia, para que un job de CI marque la regresión.
+"""
+
+import argparse
+import gc
+import json
+import logging
+import os
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from types import SimpleNamespace
+
+from scrapy import Request
+from scrapy.exceptions import DropItem, NotConfigured
+from scrapy.http import HtmlResponse
+from scrapy.utils.misc import load_object
+from scrapy.utils.project import get_project_settings
+
+from cheapy_scraper.htmlbackends import BACKENDS, get_backend
+from cheapy_scraper.spiders.aliexpress import AliexpressSpider
+from cheapy_scraper.spiders.amazon_spider import AmazonSpider
+from cheapy_scraper.spiders.ebay import EbaySpider
+from cheapy_scraper.spiders.fravega import FravegaSpider
+from cheapy_scraper.spiders.megatone import MegatoneSpider
+from cheapy_scraper.spiders.mercadolibre import MercadoLibreSpider
+
+BENCH_DIR = Path(__file__).resolve().parent
+FIXTURES_DIR = BENCH_DIR / "fixtures"
+BASELINE_PATH = BENCH_DIR / "baseline.json"
+
+# spider -> (clase, URL con la que se guardó la página, meta de la request original)
+SPIDERS = {
+    'mercadolibre': (MercadoLibreSpider, "https://listado.mercadolibre.com.ar/smart-tv", {}),
+    'fravega': (FravegaSpider, "https://www.fravega.com/l/?keyword=smart%20tv", {}),
+    'amazon': (AmazonSpider, "https://www.amazon.com/s?k=smart+tv", {'playwright': True}),
+    'ebay': (EbaySpider, "https://www.ebay.com/sch/i.html?_nkw=smart+tv", {'playwright': True}),
+    'aliexpress': (AliexpressSpider, "https://www.aliexpress.com/w/wholesale-smart-tv.html", {'playwright': True}),
+    'megatone': (MegatoneSpider, "https://www.megatone.net/search/?q=smart+tv", {'playwright': True}),
+}
+
+DEFAULT_ITERATIONS = 10
+ROUNDS = 5
+DEFAULT_TOLERANCE = 0.3
+
+
+def load_pipelines(settings) -> list:
+    """
+    Instancia los pipelines de ITEM_PIPELINES en el orden del proyecto.
+
+    Los que tienen from_crawler reciben un crawler mínimo con los settings;
+    los que lanzan NotConfigured (como IncrementalPipeline) quedan afuera.
+    El índice local de productos se desactiva: el benchmark no escribe en productos.db.
+    """
+    settings.set('PRODUCT_INDEX_ENABLED', False)
+    crawler = SimpleNamespace(settings=settings)
+    pipelines = []
+    for path, _ in sorted(settings.getdict('ITEM_PIPELINES').items(), key=lambda kv: kv[1]):
+        pipeline_cls = load_object(path)
+        try:
+            pipelines.append(pipeline_cls.from_crawler(crawler) if hasattr(pipeline_cls, 'from_crawler') else pipeline_cls())
+        except NotConfigured:
+            continue
+    return pipelines
+
+
+def run_page(spider_cls, url: str, meta: dict, body: bytes, settings, backend: str = 'parsel') -> tuple:
+    """
+    Procesa una página completa: parse() más la cadena de pipelines.
+
+    Se crean spider y pipelines nuevos en cada corrida para que el estado
+    acumulado (contadores de página, URLs vistas) no altere la medición.
+
+    Returns:
+        tuple: (items aceptados, items descartados)
+    """
+    spider = spider_cls(query="smart tv")
+    if backend != 'parsel':
+        spider.extractor = spider_cls.EXTRACTION.bind(backend=backend)
+    pipelines = load_pipelines(settings)
+    response = HtmlResponse(url=url, body=body, encoding='utf-8', request=Request(url, meta=dict(meta)))
+    accepted, dropped = [], 0
+    for output in spider.parse(response):
+        if isinstance(output, Request):
+            continue  # La paginación no se sigue en el benchmark
+        try:
+            for pipeline in pipelines:
+                output = pipeline.process_item(output, spider)
+        except DropItem:
+            dropped += 1
+            continue
+        accepted.append(output)
+    return accepted, dropped
+
+
+def measure_allocations(spider_cls, url: str, meta: dict, body: bytes, settings, backend: str) -> dict:
+    """
+    Mide bloques asignados y pico de memoria al procesar una página.
+
+    Se corre aparte de la medición de tiempo porque tracemalloc la distorsiona.
+    """
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    tracemalloc.reset_peak()
+    items, _ = run_page(spider_cls, url, meta, body, settings, backend)
+    after = tracemalloc.take_snapshot()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    blocks = sum(stat.count_diff for stat in after.compare_to(before, 'filename'))
+    del items
+    return {'allocs_per_page': blocks, 'peak_kb': round(peak / 1024, 1)}
+
+
+def _rss_bytes() -> int:
+    """Memoria residente del proceso (Linux); 0 si no está disponible."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return 0
+
+
+def measure_document_memory(url: str, body: bytes, backend: str, copies: int = 20) -> float:
+    """
+    Memoria residente por documento parseado, en KB.
+
+    Mantiene vivas `copies` copias del documento y divide el aumento de RSS,
+    porque los árboles de lxml y lexbor viven en el heap de C.
+    """
+    html_backend = get_backend(backend)
+    gc.collect()
+    before = _rss_bytes()
+    documents = []
+    for _ in range(copies):
+        response = HtmlResponse(url=url, body=body, encoding='utf-8')
+        documents.append((response, html_backend.document(response)))
+    after = _rss_bytes()
+    del documents
+    return round(max(0, after - before) / copies / 1024, 1)
+
+
+def bench_spider(name: str, iterations: int, settings, backend: str = 'parsel') -> dict:
+    """
+    Corre el benchmark de un spider sobre su fixture.
+
+    Args:
+        name: Nombre del spider (clave de SPIDERS)
+        iterations: Cantidad de veces que se procesa la página en cada ronda
+        settings: Settings del proyecto Scrapy
+        backend: Backend HTML para los spiders con ExtractionSpec
+
+    Returns:
+        dict: Métricas del spider
+    """
+    spider_cls, url, meta = SPIDERS[name]
+    body = (FIXTURES_DIR / f"{name}.html").read_bytes()
+
+    run_page(spider_cls, url, meta, body, settings, backend)  # calentamiento
+    # Como en timeit, se toma la ronda más rápida: el ruido del sistema sólo suma tiempo
+    elapsed = None
+    for _ in range(ROUNDS):
+        total_items = total_dropped = 0
+        round_elapsed = 0.0
+        for _ in range(iterations):
+            start = time.perf_counter()
+            items, dropped = run_page(spider_cls, url, meta, body, settings, backend)
+            round_elapsed += time.perf_counter() - start
+            total_items += len(items)
+            total_dropped += dropped
+        elapsed = round_elapsed if elapsed is None else min(elapsed, round_elapsed)
+
+    produced = total_items + total_dropped
+    result = {
+        'items_per_page': total_items // iterations,
+        'dropped_per_page': total_dropped // iterations,
+        'items_per_sec': round(produced / elapsed, 1) if elapsed else 0.0,
+        'us_per_item': round(elapsed / produced * 1e6, 1) if produced else 0.0,
+        'ms_per_page': round(elapsed / iterations * 1000, 2),
+    }
+    result.update(measure_allocations(spider_cls, url, meta, body, settings, backend))
+    result['doc_kb'] = measure_document_memory(url, body, backend)
+    return result
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """
+    Compara resultados con la línea base.
+
+    Se marca regresión si el throughput cae, o las asignaciones suben, más que
+    `tolerance` (fracción), o si un spider deja de extraer items.
+
+    Returns:
+        list: Descripciones de las regresiones encontradas
+    """
+    regressions = []
+    for name, current in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        if current['items_per_page'] < base['items_per_page']:
+            regressions.append(
+                f"{name}: {current['items_per_page']} items por página (base {base['items_per_page']})"
+            )
+        if current['items_per_sec'] < base['items_per_sec'] * (1 - tolerance):
+            regressions.append(
+                f"{name}: {current['items_per_sec']} items/s (base {base['items_per_sec']})"
+            )
+        if current['allocs_per_page'] > base['allocs_per_page'] * (1 + tolerance):
+            regressions.append(
+                f"{name}: {current['allocs_per_page']} asignaciones por página (base {base['allocs_per_page']})"
+            )
+    return regressions
+
+
+def print_table(results: dict, baseline: dict):
+    header = (f"{'spider':<24}{'items':>7}{'items/s':>11}{'us/item':>10}{'ms/page':>10}"
+              f"{'allocs':>9}{'peak_kb':>10}{'doc_kb':>9}{'vs base':>10}")
+    print(header)
+    print('-' * len(header))
+    for name, r in results.items():
+        base = baseline.get(name)
+        delta = f"{(r['items_per_sec'] / base['items_per_sec'] - 1) * 100:+.1f}%" if base else 'n/a'
+        print(
+            f"{name:<24}{r['items_per_page']:>7}{r['items_per_sec']:>11}{r['us_per_item']:>10}"
+            f"{r['ms_per_page']:>10}{r['allocs_per_page']:>9}{r['peak_kb']:>10}{r.get('doc_kb', '-'):>9}{delta:>10}"
+        )
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark offline de parseo de spiders")
+    parser.add_argument('--spider', action='append', choices=sorted(SPIDERS), help="Spider a medir (repetible)")
+    parser.add_argument('--iterations', type=int, default=DEFAULT_ITERATIONS)
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help="Caída de throughput tolerada antes de fallar (fracción)")
+    parser.add_argument('--update-baseline', action='store_true', help="Grabar los resultados como línea base")
+    parser.add_argument('--backend', default='parsel', choices=sorted(BACKENDS) + ['all'],
+                        help="Backend HTML de los spiders con ExtractionSpec")
+    parser.add_argument('--json', action='store_true', help="Imprimir los resultados en JSON")
+    args = parser.parse_args(argv)
+
+    # Los spiders loguean cada página a INFO; en el benchmark sólo ensucia la salida
+    logging.disable(logging.INFO)
+    settings = get_project_settings()
+    names = args.spider or list(SPIDERS)
+    backends = list(BACKENDS) if args.backend == 'all' else [args.backend]
+    results = {}
+    for name in names:
+        for backend in backends:
+            if backend == 'parsel':
+                results[name] = bench_spider(name, args.iterations, settings)
+            elif hasattr(SPIDERS[name][0], 'EXTRACTION'):
+                results[f"{name}@{backend}"] = bench_spider(name, args.iterations, settings, backend)
+    baseline = json.loads(BASELINE_PATH.read_text()) if BASELINE_PATH.exists() else {}
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_table(results, baseline)
+
+    if args.update_baseline:
+        baseline.update(results)
+        BASELINE_PATH.write_text(json.dumps(baseline, indent=2, sort_keys=True) + '\n')
+        print(f"\nLínea base actualizada en {BASELINE_PATH}")
+        return 0
+
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print("\nRegresiones respecto de la línea base:")
+        for line in regressions:
+            print(f"  - {line}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
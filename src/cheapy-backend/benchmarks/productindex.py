@@ -0,0 +1,154 @@
+"""
+Benchmark del índice local de productos (productindex.py) con millones de filas.
+
+Llena una base temporal con productos sintéticos repartidos entre varios
+países (títulos armados con marcas, tipos de producto y atributos con
+frecuencias desparejas, como en las tiendas reales) y mide:
+
+    insert/s      productos nuevos por segundo, en lotes como los del pipeline
+    update/s      productos ya indexados vueltos a ver (cambia precio y last_seen)
+    p50/p99 ms    latencia de productindex.search() por búsqueda, desde abrir la
+                  conexión hasta armar los resultados
+
+Las búsquedas cubren términos muy comunes ("smart tv"), raros y sin
+coincidencias. Termina con código 1 si el p99 de alguna supera --max-p99-ms.
+
+Uso (desde src/cheapy-backend):
+    python -m benchmarks.productindex                  # 2 millones de productos
+    python -m benchmarks.productindex --rows 5000000 --keep /tmp/productos.db
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+import productindex
+
+DEFAULT_ROWS = 2_000_000
+DEFAULT_BATCH = 5000
+DEFAULT_MAX_P99_MS = 50.0
+QUERY_RUNS = 50
+
+COUNTRIES = ('AR', 'US', 'ES', 'MX', 'BR')
+BRANDS = ('samsung', 'lg', 'sony', 'philips', 'noblex', 'tcl', 'motorola', 'xiaomi', 'apple', 'lenovo',
+          'hp', 'asus', 'acer', 'bgh', 'atma', 'liliana', 'drean', 'whirlpool', 'gafa', 'peabody')
+PRODUCTS = ('smart tv', 'celular', 'notebook', 'heladera', 'lavarropas', 'auriculares', 'parlante',
+            'microondas', 'aire acondicionado', 'tablet', 'monitor', 'cafetera', 'licuadora',
+            'ventilador', 'impresora', 'teclado', 'mouse', 'smartwatch', 'consola', 'freidora de aire')
+ATTRIBUTES = ('4k', 'uhd', 'led', 'bluetooth', 'inalambrico', 'negro', 'blanco', 'plata', 'gamer',
+              'inverter', 'digital', 'pro', 'max', 'mini', 'ultra', 'frio calor', 'no frost', 'wifi')
+
+QUERIES = (
+    'smart tv', 'smart tv samsung 50', 'celular motorola', 'notebook lenovo 16gb', 'heladera no frost',
+    'auriculares bluetooth', 'freidora de aire', 'aire acondicionado inverter', 'xiaomi 12345',
+    'producto inexistente',
+)
+
+
+def synthetic_title(rng: random.Random, n: int) -> str:
+    """Título de producto sintético; marcas y tipos con frecuencia tipo Zipf."""
+    brand = BRANDS[min(int(rng.paretovariate(1.2)) - 1, len(BRANDS) - 1)]
+    product = PRODUCTS[min(int(rng.paretovariate(1.1)) - 1, len(PRODUCTS) - 1)]
+    attributes = ' '.join(rng.sample(ATTRIBUTES, rng.randint(1, 3)))
+    return f"{product} {brand} {attributes} {rng.choice((32, 43, 50, 55, 65, 128, 256, 8, 16))} {n}"
+
+
+def synthetic_rows(start: int, count: int, rng: random.Random, seen: float) -> list:
+    rows = []
+    for n in range(start, start + count):
+        item = {
+            'url': f"https://tienda{n % 7}.example/p/{n}", 'title': synthetic_title(rng, n),
+            'source': f"tienda{n % 7}", 'price_numeric': round(rng.uniform(1000, 900000), 2),
+            'currency': 'ARS', 'image_url': f"https://img.example/{n}.jpg",
+        }
+        rows.append(productindex.item_row(item, COUNTRIES[n % len(COUNTRIES)], seen))
+    return rows
+
+
+def fill(conn, total: int, batch: int, rng: random.Random) -> float:
+    """Inserta `total` productos nuevos; retorna productos por segundo."""
+    now = time.time()
+    started = time.perf_counter()
+    for start in range(0, total, batch):
+        # Productos agregados a lo largo de una semana: el filtro de antigüedad descarta los primeros
+        seen = now - 7 * 86400 * (1 - start / total)
+        productindex.upsert(conn, synthetic_rows(start, min(batch, total - start), rng, seen))
+    return total / (time.perf_counter() - started)
+
+
+def refresh(conn, total: int, batch: int, rng: random.Random) -> float:
+    """Vuelve a ver un lote de productos existentes con otro precio; retorna productos por segundo."""
+    first = rng.randrange(1, max(2, total - batch))
+    now = time.time()
+    rows = [
+        tuple(row[:5]) + (round(row[5] * 0.95, 2), row[6], row[7], now)
+        for row in conn.execute(
+            "SELECT country, product_key, url, title, source, price, currency, image_url "
+            "FROM products WHERE id BETWEEN ? AND ?", (first, first + batch - 1)
+        )
+    ]
+    started = time.perf_counter()
+    productindex.upsert(conn, rows)
+    return len(rows) / (time.perf_counter() - started)
+
+
+def time_query(query: str, country: str, db_file: str) -> dict:
+    latencies = []
+    results = 0
+    for _ in range(QUERY_RUNS):
+        started = time.perf_counter()
+        results = len(productindex.search(query, country, db_file=db_file))
+        latencies.append((time.perf_counter() - started) * 1000)
+    latencies.sort()
+    return {
+        'results': results,
+        'p50_ms': round(statistics.median(latencies), 2),
+        'p99_ms': round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))], 2),
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark del índice local de productos")
+    parser.add_argument('--rows', type=int, default=DEFAULT_ROWS, help="Productos a indexar")
+    parser.add_argument('--batch', type=int, default=DEFAULT_BATCH, help="Productos por transacción")
+    parser.add_argument('--max-p99-ms', type=float, default=DEFAULT_MAX_P99_MS,
+                        help="Latencia p99 máxima tolerada por búsqueda")
+    parser.add_argument('--keep', help="Usar (y conservar) esta base en lugar de una temporal")
+    args = parser.parse_args(argv)
+
+    db_file = args.keep or os.path.join(tempfile.mkdtemp(prefix='cheapy-index-'), 'productos.db')
+    rng = random.Random(42)
+    conn = productindex.connect(db_file)
+    existing = conn.execute("SELECT COUNT(*) FROM products").fetchone()[0]
+    if existing < args.rows:
+        print(f"Indexando {args.rows - existing} productos en {db_file}...")
+        insert_rate = fill(conn, args.rows - existing, args.batch, rng)
+        print(f"  insert: {insert_rate:,.0f} productos/s")
+    update_rate = refresh(conn, args.rows, args.batch, rng)
+    print(f"  update: {update_rate:,.0f} productos/s (precio, last_seen e id nuevo: se reindexa en el índice de texto)")
+    conn.close()
+    print(f"  tamaño: {os.path.getsize(db_file) / 1e6:,.0f} MB\n")
+
+    print(f"{'búsqueda':<32}{'país':>6}{'results':>9}{'p50_ms':>9}{'p99_ms':>9}")
+    slow = []
+    for query in QUERIES:
+        for country in ('AR', 'US'):
+            r = time_query(query, country, db_file)
+            print(f"{query:<32}{country:>6}{r['results']:>9}{r['p50_ms']:>9}{r['p99_ms']:>9}")
+            if r['p99_ms'] > args.max_p99_ms:
+                slow.append(f"{query!r} ({country}): p99 {r['p99_ms']} ms")
+
+    if slow:
+        print(f"\nBúsquedas por encima de {args.max_p99_ms} ms:")
+        for line in slow:
+            print(f"  - {line}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
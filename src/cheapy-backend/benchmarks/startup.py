@@ -0,0 +1,208 @@
+"""
+Perfil de arranque de los crawls: imports y tiempo hasta la primera request.
+
+Cada tarea del worker lanza un proceso de Scrapy nuevo, así que el arranque se
+paga en cada búsqueda. Este benchmark lanza `scrapy crawl` por spider con
+`python -X importtime` y con StartupProfilerMiddleware activo (setting
+STARTUP_PROFILE_PATH), que descarta las requests antes de descargarlas: no se
+toca la red. Se reporta, por spider (mediana de --runs corridas):
+
+    first_ms     desde el lanzamiento del proceso hasta la primera request
+    engine_ms    desde el lanzamiento hasta que arranca el motor de Scrapy
+    import_ms    tiempo total de imports según -X importtime
+    modules      módulos cargados al llegar la primera request
+    playwright   si la pila de Playwright quedó importada
+
+y el desglose de import_ms por grupo de paquetes (scrapy, twisted, playwright,
+redis, ...), para ver qué dependencia pesa en cada spider.
+
+Uso (desde src/cheapy-backend):
+    python -m benchmarks.startup                          # comparar con startup_baseline.json
+    python -m benchmarks.startup --spider mercadolibre    # un solo spider
+    python -m benchmarks.startup --update-baseline        # regrabar la línea base
+
+Como benchmarks.parsers, termina con código 1 si algún spider arranca más
+lento que la línea base más allá de la tolerancia, carga más módulos, o pasa
+a importar Playwright sin ser un spider renderizado.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+BASELINE_PATH = BENCH_DIR / "startup_baseline.json"
+PROJECT_DIR = BENCH_DIR.parent
+
+DEFAULT_RUNS = 5
+DEFAULT_TOLERANCE = 0.3
+
+# spider -> argumentos del crawl
+SPIDER_ARGS = {
+    'mercadolibre': {'query': 'smart tv', 'country': 'AR'},
+    'fravega': {'query': 'smart tv', 'country': 'AR'},
+    'megatone': {'query': 'smart tv', 'country': 'AR'},
+    'amazon': {'query': 'smart tv', 'country': 'US'},
+    'ebay': {'query': 'smart tv', 'country': 'US'},
+    'aliexpress': {'query': 'smart tv', 'country': 'ES'},
+    'refresh': {'country': 'AR', 'products': '["https://www.fravega.com/p/smart-tv-50/"]'},
+}
+
+# Paquete raíz -> grupo del desglose de imports
+IMPORT_GROUPS = {
+    'scrapy': 'scrapy', 'twisted': 'twisted', 'zope': 'twisted', 'OpenSSL': 'twisted',
+    'cryptography': 'twisted', 'service_identity': 'twisted', 'h2': 'twisted', 'hpack': 'twisted',
+    'playwright': 'playwright', 'scrapy_playwright': 'playwright', 'greenlet': 'playwright', 'pyee': 'playwright',
+    'redis': 'redis',
+    'lxml': 'parsing', 'parsel': 'parsing', 'cssselect': 'parsing', 'w3lib': 'parsing', 'selectolax': 'parsing',
+    'cheapy_scraper': 'cheapy', 'config': 'cheapy', 'metrics': 'cheapy', 'tracing': 'cheapy',
+    'ratelimit': 'cheapy', 'watchlists': 'cheapy',
+}
+GROUPS = ('scrapy', 'twisted', 'parsing', 'redis', 'playwright', 'cheapy', 'other')
+
+
+def parse_importtime(stderr: str) -> dict:
+    """
+    Suma el tiempo propio de cada import de `-X importtime`, agrupado por paquete.
+
+    Returns:
+        dict: Grupo -> milisegundos, más 'total'
+    """
+    groups = dict.fromkeys(GROUPS, 0.0)
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, _, name = line[len('import time:'):].split('|')
+        root = name.strip().split('.')[0]
+        groups[IMPORT_GROUPS.get(root, 'other')] += int(self_us) / 1000
+    groups = {group: round(ms, 1) for group, ms in groups.items()}
+    groups['total'] = round(sum(groups.values()), 1)
+    return groups
+
+
+def profile_once(name: str) -> dict:
+    """Lanza un crawl de `name` y retorna su perfil de arranque."""
+    fd, profile_path = tempfile.mkstemp(prefix='cheapy-startup-', suffix='.json')
+    os.close(fd)
+    command = [sys.executable, '-X', 'importtime', '-m', 'scrapy', 'crawl', name]
+    for key, value in SPIDER_ARGS[name].items():
+        command += ['-a', f"{key}={value}"]
+    command += [
+        '-s', f"STARTUP_PROFILE_PATH={profile_path}", '-s', f"STARTUP_SPAWNED_AT={time.time()}",
+        '-s', 'LOG_LEVEL=ERROR',
+    ]
+    try:
+        result = subprocess.run(command, capture_output=True, text=True, cwd=PROJECT_DIR)
+        with open(profile_path, encoding='utf-8') as f:
+            content = f.read()
+        if not content:
+            raise RuntimeError(f"{name}: el crawl no llegó a la primera request\n{result.stderr[-2000:]}")
+        profile = json.loads(content)
+    finally:
+        os.unlink(profile_path)
+    profile['imports'] = parse_importtime(result.stderr)
+    return profile
+
+
+def profile_spider(name: str, runs: int) -> dict:
+    """
+    Perfil de arranque de un spider: mediana de `runs` corridas.
+
+    Returns:
+        dict: Resultados del spider
+    """
+    profiles = [profile_once(name) for _ in range(runs)]
+
+    def median(values):
+        return round(statistics.median(values), 1)
+
+    return {
+        'first_request_ms': median([p['marks_ms']['first_request'] for p in profiles]),
+        'engine_started_ms': median([p['marks_ms'].get('engine_started', 0) for p in profiles]),
+        'import_ms': median([p['imports']['total'] for p in profiles]),
+        'modules': max(p['modules'] for p in profiles),
+        'playwright_loaded': any(p['playwright_loaded'] for p in profiles),
+        'imports_by_group_ms': {group: median([p['imports'][group] for p in profiles]) for group in GROUPS},
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """
+    Compara resultados con la línea base.
+
+    Returns:
+        list: Descripciones de las regresiones encontradas
+    """
+    regressions = []
+    for name, current in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        if current['first_request_ms'] > base['first_request_ms'] * (1 + tolerance):
+            regressions.append(
+                f"{name}: primera request a los {current['first_request_ms']} ms (base {base['first_request_ms']})"
+            )
+        if current['modules'] > base['modules'] * (1 + tolerance):
+            regressions.append(f"{name}: {current['modules']} módulos cargados (base {base['modules']})")
+        if current['playwright_loaded'] and not base['playwright_loaded']:
+            regressions.append(f"{name}: ahora importa Playwright")
+    return regressions
+
+
+def print_table(results: dict, baseline: dict):
+    header = (f"{'spider':<14}{'first_ms':>10}{'engine_ms':>11}{'import_ms':>11}{'modules':>9}{'pw':>5}"
+              + ''.join(f"{group:>11}" for group in GROUPS) + f"{'vs base':>10}")
+    print(header)
+    print('-' * len(header))
+    for name, r in results.items():
+        base = baseline.get(name)
+        delta = f"{(r['first_request_ms'] / base['first_request_ms'] - 1) * 100:+.1f}%" if base else 'n/a'
+        print(
+            f"{name:<14}{r['first_request_ms']:>10}{r['engine_started_ms']:>11}{r['import_ms']:>11}"
+            f"{r['modules']:>9}{'yes' if r['playwright_loaded'] else 'no':>5}"
+            + ''.join(f"{r['imports_by_group_ms'][group]:>11}" for group in GROUPS) + f"{delta:>10}"
+        )
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Perfil de arranque de los crawls")
+    parser.add_argument('--spider', action='append', choices=sorted(SPIDER_ARGS), help="Spider a medir (repetible)")
+    parser.add_argument('--runs', type=int, default=DEFAULT_RUNS, help="Corridas por spider (se toma la mediana)")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help="Aumento del tiempo de arranque tolerado antes de fallar (fracción)")
+    parser.add_argument('--update-baseline', action='store_true', help="Grabar los resultados como línea base")
+    parser.add_argument('--json', action='store_true', help="Imprimir los resultados en JSON")
+    args = parser.parse_args(argv)
+
+    names = args.spider or list(SPIDER_ARGS)
+    results = {name: profile_spider(name, args.runs) for name in names}
+    baseline = json.loads(BASELINE_PATH.read_text()) if BASELINE_PATH.exists() else {}
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_table(results, baseline)
+
+    if args.update_baseline:
+        baseline.update(results)
+        BASELINE_PATH.write_text(json.dumps(baseline, indent=2, sort_keys=True) + '\n')
+        print(f"\nLínea base actualizada en {BASELINE_PATH}")
+        return 0
+
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print("\nRegresiones respecto de la línea base:")
+        for line in regressions:
+            print(f"  - {line}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,148 @@
+"""
+Detección de bloqueos de las tiendas y circuit breaker compartido por tienda.
+
+Cuando una tienda responde con un captcha o una página de verificación
+("robot check"), el crawl igual gasta el render completo, espera el
+`wait_for_selector` hasta su timeout, no encuentra productos y la tarea se
+reintenta para repetir lo mismo. BlockDetectorMiddleware reconoce esas páginas
+con los marcadores de BLOCK_MARKERS (config.py), descarta la respuesta sin
+parsearla ni reintentarla, cierra el crawl y registra el bloqueo aquí.
+
+El circuito de cada tienda (por nombre de spider) vive en Redis y lo comparten
+todos los workers y la API:
+
+    circuit:{spider}:hits    bloqueos recientes (vencen a los BLOCK_WINDOW s)
+    circuit:{spider}:open    existe mientras el circuito está abierto; su TTL
+                             es lo que falta para volver a intentar
+    circuit:{spider}:trips   aperturas seguidas, para duplicar la espera
+
+Con el circuito abierto la API no encola crawls de esa tienda y completa la
+búsqueda con sus productos del índice local (productindex.py), y el worker
+descarta sin lanzar Scrapy las tareas que ya estaban en cola. Al vencer la
+espera el siguiente crawl hace de prueba: si vuelve a encontrar un bloqueo, el
+circuito se reabre con el doble de espera.
+"""
+
+from config import (
+    BLOCK_COOLDOWN, BLOCK_MARKERS, BLOCK_MAX_COOLDOWN, BLOCK_SCAN_BYTES, BLOCK_THRESHOLD, BLOCK_WINDOW,
+)
+
+KEY_PREFIX = "circuit"
+BLOCK_STATUSES = (429,)
+
+# Registra un bloqueo y abre el circuito si se alcanzó el umbral.
+# Retorna {1 si lo abrió esta llamada, segundos que seguirá abierto (0 si está cerrado)}.
+RECORD_BLOCK_LUA = """
+local threshold = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local cooldown = tonumber(ARGV[3])
+local max_cooldown = tonumber(ARGV[4])
+local ttl = redis.call('TTL', KEYS[2])
+if ttl > 0 then
+    return {0, ttl}
+end
+local hits = redis.call('INCR', KEYS[1])
+if hits == 1 then
+    redis.call('EXPIRE', KEYS[1], window)
+end
+if hits < threshold then
+    return {0, 0}
+end
+redis.call('DEL', KEYS[1])
+local trips = redis.call('INCR', KEYS[3])
+redis.call('EXPIRE', KEYS[3], max_cooldown * 2)
+local seconds = math.min(max_cooldown, cooldown * 2 ^ (trips - 1))
+redis.call('SET', KEYS[2], ARGV[5], 'EX', math.floor(seconds))
+return {1, math.floor(seconds)}
+"""
+
+
+def markers_for(spider_name: str) -> tuple:
+    """Marcadores de bloqueo de un spider: los propios más los comunes."""
+    return tuple(BLOCK_MARKERS.get(spider_name, ())) + tuple(BLOCK_MARKERS.get('*', ()))
+
+
+def detect_block(spider_name: str, status: int, url: str, body: bytes):
+    """
+    Reconoce una respuesta de bloqueo (captcha, verificación, rate limit).
+
+    Args:
+        spider_name: Spider que hizo la request
+        status: Status HTTP de la respuesta
+        url: URL final de la respuesta (tras redirecciones)
+        body: Cuerpo de la respuesta
+
+    Returns:
+        str or None: Motivo del bloqueo ('status_429' o el marcador encontrado), o None
+    """
+    if status in BLOCK_STATUSES:
+        return f"status_{status}"
+    url = (url or '').lower()
+    head = body[:BLOCK_SCAN_BYTES].lower() if body else b''
+    for marker in markers_for(spider_name):
+        if marker in url or marker.encode() in head:
+            return marker
+    return None
+
+
+class CircuitBreaker:
+    """
+    Circuito abierto/cerrado por tienda, compartido en Redis.
+
+    Funciona con clientes síncronos (`redis.Redis`) y asíncronos
+    (`redis.asyncio.Redis`); los métodos con prefijo `a` son las versiones
+    asíncronas.
+
+    Args:
+        client: Cliente Redis
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self._record = client.register_script(RECORD_BLOCK_LUA)
+
+    @staticmethod
+    def _keys(spider_name: str) -> list:
+        return [f"{KEY_PREFIX}:{spider_name}:{part}" for part in ('hits', 'open', 'trips')]
+
+    def _args(self, spider_name: str, reason: str) -> dict:
+        return {
+            'keys': self._keys(spider_name),
+            'args': [BLOCK_THRESHOLD, BLOCK_WINDOW, BLOCK_COOLDOWN, BLOCK_MAX_COOLDOWN, reason],
+        }
+
+    def record_block(self, spider_name: str, reason: str) -> tuple:
+        """
+        Registra un bloqueo de la tienda.
+
+        Returns:
+            tuple: (True si este bloqueo abrió el circuito, segundos que seguirá abierto)
+        """
+        opened, seconds = self._record(**self._args(spider_name, reason))
+        return bool(opened), int(seconds)
+
+    async def arecord_block(self, spider_name: str, reason: str) -> tuple:
+        """Versión asíncrona de `record_block`."""
+        opened, seconds = await self._record(**self._args(spider_name, reason))
+        return bool(opened), int(seconds)
+
+    def _ttls(self, spider_names: list):
+        pipe = self.client.pipeline(transaction=False)
+        for name in spider_names:
+            pipe.ttl(self._keys(name)[1])
+        return pipe
+
+    def open_stores(self, spider_names: list) -> dict:
+        """
+        Tiendas con el circuito abierto.
+
+        Returns:
+            dict: Spider -> segundos hasta que se vuelva a intentar
+        """
+        ttls = self._ttls(spider_names).execute()
+        return {name: ttl for name, ttl in zip(spider_names, ttls) if ttl and ttl > 0}
+
+    async def aopen_stores(self, spider_names: list) -> dict:
+        """Versión asíncrona de `open_stores`."""
+        ttls = await self._ttls(spider_names).execute()
+        return {name: ttl for name, ttl in zip(spider_names, ttls) if ttl and ttl > 0}
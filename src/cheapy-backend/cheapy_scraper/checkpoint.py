@@ -0,0 +1,92 @@
+"""
+Checkpoints de crawls en Redis para que los reintentos de una tarea se reanuden.
+
+La tarea de Celery reintenta el crawl completo si falla: sin checkpoints, un
+error en la página 2 repite la página 1 (con su render de Chromium) en cada
+reintento y descarta los items que el intento fallido ya había extraído.
+CheckpointMiddleware guarda, al terminar el callback de cada respuesta y en una
+única transacción:
+
+    done      huellas de las requests ya procesadas
+    pending   requests generadas por esas páginas y todavía sin procesar
+              (serializadas con `Request.to_dict`, como el JOBDIR de Scrapy)
+    items     items crudos extraídos, antes de pasar por los pipelines
+
+El reintento (mismo task_id, así que misma CHECKPOINT_KEY) vuelve a emitir los
+items guardados, que recorren los pipelines como en un crawl normal, y sólo
+descarga las requests iniciales no procesadas y las pendientes. Un crawl que
+termina bien borra su checkpoint; si no, vence a los CHECKPOINT_TTL segundos.
+"""
+
+import pickle
+
+from scrapy.utils.request import request_from_dict
+
+KEY_PREFIX = "checkpoint"
+
+
+class CrawlCheckpoint:
+    """
+    Estado persistido de un crawl en Redis.
+
+    Args:
+        client: Cliente redis.asyncio
+        key: Identificador del crawl (el task_id de Celery)
+        ttl: Segundos de vida del checkpoint desde la última página guardada
+    """
+
+    def __init__(self, client, key: str, ttl: int):
+        self.client = client
+        self.key = key
+        self.ttl = ttl
+
+    def _key(self, part: str) -> str:
+        return f"{KEY_PREFIX}:{self.key}:{part}"
+
+    async def load(self) -> tuple:
+        """
+        Lee el checkpoint de un intento anterior.
+
+        Returns:
+            tuple: (huellas procesadas, {huella: request serializada}, items); vacíos si no hay
+        """
+        pipe = self.client.pipeline(transaction=False)
+        pipe.smembers(self._key('done'))
+        pipe.hgetall(self._key('pending'))
+        pipe.lrange(self._key('items'), 0, -1)
+        done, pending, items = await pipe.execute()
+        done = {fp.decode() if isinstance(fp, bytes) else fp for fp in done}
+        pending = {
+            (fp.decode() if isinstance(fp, bytes) else fp): pickle.loads(data)
+            for fp, data in pending.items()
+        }
+        return done, pending, [pickle.loads(item) for item in items]
+
+    async def save_page(self, fingerprint: str, items: list, requests: dict):
+        """
+        Marca una request como procesada junto con lo que produjo.
+
+        Args:
+            fingerprint: Huella de la request procesada
+            items: Items crudos ya serializados con pickle
+            requests: {huella: request serializada} de las requests generadas
+        """
+        pipe = self.client.pipeline(transaction=True)
+        pipe.sadd(self._key('done'), fingerprint)
+        pipe.hdel(self._key('pending'), fingerprint)
+        if requests:
+            pipe.hset(self._key('pending'), mapping={fp: pickle.dumps(data) for fp, data in requests.items()})
+        if items:
+            pipe.rpush(self._key('items'), *items)
+        for part in ('done', 'pending', 'items'):
+            pipe.expire(self._key(part), self.ttl)
+        await pipe.execute()
+
+    async def clear(self):
+        """Borra el checkpoint (el crawl terminó bien)."""
+        await self.client.delete(self._key('done'), self._key('pending'), self._key('items'))
+
+
+def restore_request(data: dict, spider):
+    """Reconstruye una request guardada, con sus callbacks ligados al spider actual."""
+    return request_from_dict(data, spider=spider)
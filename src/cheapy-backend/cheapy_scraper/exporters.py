@@ -0,0 +1,27 @@
+"""
+Exportador del formato de salida que el worker lee del crawl.
+
+El worker corre `scrapy crawl ... -o -:jsonlines` y parsea una línea JSON por
+producto. Este exportador reemplaza al JsonLinesItemExporter de Scrapy para
+ese formato (FEED_EXPORTERS en settings.py): escribe directamente
+`ProductItem.to_output()`, sin pasar por ItemAdapter ni por los serializadores
+por campo, y con separadores compactos.
+"""
+
+import json
+
+from scrapy.exporters import BaseItemExporter
+
+
+class ProductJsonLinesExporter(BaseItemExporter):
+    """JSON Lines compacto a partir de ProductItem.to_output()."""
+
+    def __init__(self, file, **kwargs):
+        super().__init__(dont_fail=True, **kwargs)
+        self.file = file
+        self.encoding = self.encoding or 'utf-8'
+
+    def export_item(self, item):
+        data = item.to_output() if hasattr(item, 'to_output') else dict(self.get_serialized_fields(item))
+        line = json.dumps(data, ensure_ascii=False, separators=(',', ':')) + '\n'
+        self.file.write(line.encode(self.encoding))
@@ -0,0 +1,333 @@
+"""
+Extensiones de Scrapy para Cheapy Scraper.
+"""
+
+import json
+import time
+from collections import deque
+
+import redis.asyncio as aioredis
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+from scrapy.utils.httpobj import urlparse_cached
+
+import metrics
+import tracing
+from blocking import detect_block
+from config import REDIS_URL
+from stores import resolve_store
+
+
+class AdaptiveConcurrency:
+    """
+    Ajusta la concurrencia y el delay de cada tienda según su comportamiento observado.
+
+    Por cada slot de descarga (un hostname) mantiene una ventana de latencias y
+    de respuestas de bloqueo (429, 503 y las páginas de captcha o verificación
+    que reconoce blocking.detect_block). Aplica una política AIMD:
+
+    - Ante bloqueos reduce la concurrencia a la mitad y duplica el delay.
+    - Tras una ventana sin errores y con latencia p90 bajo el objetivo, suma
+      uno a la concurrencia y reduce el delay un 20%.
+    - Si el p90 de latencia supera el doble del objetivo, aumenta el delay.
+
+    Lo aprendido (delay, concurrencia y la ventana: latencias y respuestas
+    buenas seguidas) se guarda en Redis al cerrar el spider, de modo que el
+    siguiente crawl de la misma tienda (en cualquier worker) arranca desde la
+    última tasa conocida como buena en lugar de los valores por defecto. Un
+    crawl de búsqueda descarga una o dos páginas, así que la ventana se completa
+    a lo largo de varios crawls. Además, un estado frenado se recupera solo con
+    el tiempo: por cada ADAPTIVE_RECOVERY_SECONDS sin actualizarse, la
+    concurrencia sube uno y el delay baja un 20%, hasta los valores iniciales.
+
+    Con suficientes latencias de una tienda, el timeout de sus requests HTTP
+    (no las de Playwright, que tienen sus propios timeouts de navegación) baja
+    de DOWNLOAD_TIMEOUT a ADAPTIVE_TIMEOUT_FACTOR veces su p90.
+    """
+
+    STATE_KEY = "adaptive:slots"
+    BLOCK_STATUSES = (429, 503)
+
+    def __init__(self, crawler):
+        """
+        Inicializa el controlador con los límites definidos en settings.
+
+        Args:
+            crawler: Crawler de Scrapy
+        """
+        settings = crawler.settings
+        self.crawler = crawler
+        self.stats = crawler.stats
+        self.min_delay = settings.getfloat('ADAPTIVE_MIN_DELAY', 0.25)
+        self.max_delay = settings.getfloat('ADAPTIVE_MAX_DELAY', 30.0)
+        self.max_concurrency = settings.getint('ADAPTIVE_MAX_CONCURRENCY', 8)
+        self.target_latency = settings.getfloat('ADAPTIVE_TARGET_LATENCY', 5.0)
+        self.window_size = settings.getint('ADAPTIVE_WINDOW', 20)
+        self.state_ttl = settings.getint('ADAPTIVE_STATE_TTL', 7 * 86400)
+        self.recovery_seconds = settings.getfloat('ADAPTIVE_RECOVERY_SECONDS', 600)
+        self.start_concurrency = settings.getint('CONCURRENT_REQUESTS_PER_DOMAIN')
+        self.start_delay = settings.getfloat('DOWNLOAD_DELAY')
+        self.download_timeout = settings.getfloat('DOWNLOAD_TIMEOUT')
+        self.min_timeout = settings.getfloat('ADAPTIVE_MIN_TIMEOUT', 5)
+        self.timeout_factor = settings.getfloat('ADAPTIVE_TIMEOUT_FACTOR', 3)
+        self.timeout_samples = settings.getint('ADAPTIVE_TIMEOUT_MIN_SAMPLES', 5)
+        self.redis_url = settings.get('ADAPTIVE_REDIS_URL') or REDIS_URL
+        self.windows = {}
+        self.restored = {}
+
+        crawler.signals.connect(self.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(self.request_scheduled, signal=signals.request_scheduled)
+        crawler.signals.connect(self.spider_closed, signal=signals.spider_closed)
+        crawler.signals.connect(self.response_downloaded, signal=signals.response_downloaded)
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool('ADAPTIVE_ENABLED'):
+            raise NotConfigured
+        return cls(crawler)
+
+    def _client(self):
+        # El cliente async se crea dentro del loop de asyncio del reactor
+        return aioredis.Redis.from_url(self.redis_url, socket_timeout=1)
+
+    async def spider_opened(self, spider):
+        """Carga el estado persistido y lo aplica a los slots que se creen."""
+        try:
+            async with self._client() as client:
+                saved = await client.hgetall(self.STATE_KEY)
+        except Exception as e:
+            spider.logger.warning(f"AdaptiveConcurrency: no se pudo cargar el estado: {e}")
+            return
+
+        now = time.time()
+        per_slot = self.crawler.engine.downloader.per_slot_settings
+        for raw_key, raw_state in saved.items():
+            state = json.loads(raw_state)
+            if now - state.get('updated', 0) > self.state_ttl:
+                continue
+            key = raw_key.decode() if isinstance(raw_key, bytes) else raw_key
+            delay, concurrency = self._recover(state['delay'], state['concurrency'], now - state.get('updated', now))
+            per_slot.setdefault(key, {}).update({'delay': delay, 'concurrency': concurrency})
+            self.restored[key] = {
+                'latencies': deque(state.get('latencies', []), maxlen=self.window_size),
+                'ok': state.get('ok', 0), 'delay': delay, 'concurrency': concurrency,
+            }
+        self.stats.set_value('adaptive/slots_restored', len(self.restored))
+
+    def _recover(self, delay: float, concurrency: int, elapsed: float) -> tuple:
+        """Acerca un estado frenado por bloqueos a los valores iniciales según el tiempo transcurrido."""
+        steps = int(elapsed // self.recovery_seconds) if self.recovery_seconds > 0 else 0
+        if steps <= 0:
+            return delay, concurrency
+        if concurrency < self.start_concurrency:
+            concurrency = min(self.start_concurrency, concurrency + steps)
+        if delay > self.start_delay:
+            delay = max(self.start_delay, delay * 0.8 ** steps)
+        return delay, concurrency
+
+    def request_scheduled(self, request, spider):
+        """Ajusta el timeout de las requests HTTP al p90 de latencia de su tienda."""
+        if 'download_timeout' in request.meta or request.meta.get('playwright'):
+            return
+        key = urlparse_cached(request).hostname
+        window = self.windows.get(key) or self.restored.get(key)
+        if not window or len(window['latencies']) < self.timeout_samples:
+            return
+        p90 = self._percentile(window['latencies'], 0.9)
+        timeout = min(self.download_timeout, max(self.min_timeout, p90 * self.timeout_factor))
+        request.meta['download_timeout'] = timeout
+        self.stats.set_value(f'adaptive/{key}/timeout', round(timeout, 2))
+
+    async def spider_closed(self, spider):
+        """Persiste la concurrencia y el delay de los slots usados en este crawl."""
+        # Se usa el último valor registrado en la ventana: el downloader puede haber
+        # descartado ya los slots inactivos
+        now = time.time()
+        mapping = {
+            key: json.dumps({
+                'delay': window['delay'], 'concurrency': window['concurrency'],
+                'latencies': [round(latency, 3) for latency in window['latencies']], 'ok': window['ok'],
+                'updated': now,
+            })
+            for key, window in self.windows.items()
+        }
+        if not mapping:
+            return
+        try:
+            async with self._client() as client:
+                pipe = client.pipeline(transaction=False)
+                pipe.hset(self.STATE_KEY, mapping=mapping)
+                pipe.expire(self.STATE_KEY, self.state_ttl)
+                await pipe.execute()
+        except Exception as e:
+            spider.logger.warning(f"AdaptiveConcurrency: no se pudo guardar el estado: {e}")
+
+    def _is_blocked(self, response, request, spider) -> bool:
+        if response.status in self.BLOCK_STATUSES:
+            return True
+        store = resolve_store(spider.name, urlparse_cached(request).hostname)
+        return detect_block(store, response.status, response.url, response.body) is not None
+
+    def response_downloaded(self, response, request, spider):
+        """Registra la respuesta en la ventana de su slot y ajusta si corresponde."""
+        key = request.meta.get('download_slot')
+        slot = self.crawler.engine.downloader.slots.get(key) if key else None
+        latency = request.meta.get('download_latency')
+        if slot is None or latency is None:
+            return
+
+        window = self.windows.get(key)
+        if window is None:
+            # Continúa la ventana guardada por los crawls anteriores de la tienda
+            window = self.restored.pop(key, None) or {'latencies': deque(maxlen=self.window_size), 'ok': 0}
+            self.windows[key] = window
+
+        if self._is_blocked(response, request, spider):
+            slot.concurrency = max(1, slot.concurrency // 2)
+            slot.delay = min(self.max_delay, max(slot.delay * 2, self.min_delay * 2))
+            window['ok'] = 0
+            self.stats.inc_value(f'adaptive/{key}/blocked')
+            spider.logger.info(
+                f"AdaptiveConcurrency: bloqueo en {key} (status={response.status}), "
+                f"concurrencia={slot.concurrency} delay={slot.delay:.2f}s"
+            )
+        else:
+            window['latencies'].append(latency)
+            window['ok'] += 1
+            p90 = self._percentile(window['latencies'], 0.9)
+            if p90 > self.target_latency * 2:
+                slot.delay = min(self.max_delay, slot.delay * 1.25 or self.min_delay)
+                window['ok'] = 0
+            elif window['ok'] >= self.window_size and p90 <= self.target_latency:
+                slot.concurrency = min(self.max_concurrency, slot.concurrency + 1)
+                slot.delay = max(self.min_delay, slot.delay * 0.8)
+                window['ok'] = 0
+
+        window['delay'], window['concurrency'] = slot.delay, slot.concurrency
+        self.stats.set_value(f'adaptive/{key}/delay', round(slot.delay, 3))
+        self.stats.set_value(f'adaptive/{key}/concurrency', slot.concurrency)
+
+    @staticmethod
+    def _percentile(values, q: float) -> float:
+        """Percentil por rango más cercano sobre una ventana pequeña."""
+        ordered = sorted(values)
+        if not ordered:
+            return 0.0
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class SpiderMetrics:
+    """
+    Publica en Redis las métricas de cada crawl para que la API las exponga en /metrics.
+
+    Los procesos de Scrapy son efímeros y no pueden ser consultados por
+    Prometheus, así que acumulan sus métricas en memoria (items emitidos y
+    descartados por pipeline y motivo, tiempos de página de Playwright, uso de
+    la caché HTTP) y las envían a Redis en un solo lote al cerrar el spider.
+    """
+
+    def __init__(self, crawler):
+        self.stats = crawler.stats
+        self.batch = metrics.Batch()
+        crawler.signals.connect(self.item_scraped, signal=signals.item_scraped)
+        crawler.signals.connect(self.item_dropped, signal=signals.item_dropped)
+        crawler.signals.connect(self.response_downloaded, signal=signals.response_downloaded)
+        crawler.signals.connect(self.spider_closed, signal=signals.spider_closed)
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool('SPIDER_METRICS_ENABLED'):
+            raise NotConfigured
+        return cls(crawler)
+
+    def item_scraped(self, item, response, spider):
+        self.batch.inc('cheapy_items_scraped_total', spider=spider.name)
+
+    def item_dropped(self, item, response, exception, spider):
+        self.batch.inc(
+            'cheapy_items_dropped_total', spider=spider.name,
+            pipeline=getattr(exception, 'pipeline', 'unknown'),
+            reason=getattr(exception, 'reason', 'other'),
+        )
+
+    def response_downloaded(self, response, request, spider):
+        latency = request.meta.get('download_latency')
+        if request.meta.get('playwright') and latency is not None:
+            self.batch.observe('cheapy_playwright_page_seconds', latency, spider=spider.name)
+
+    def spider_closed(self, spider):
+        for result in ('hit', 'miss'):
+            count = self.stats.get_value(f'httpcache/{result}', 0)
+            if count:
+                self.batch.inc('cheapy_httpcache_requests_total', count, spider=spider.name, result=result)
+        saved = self.stats.get_value('httpcache/bytes_saved', 0)
+        if saved:
+            self.batch.inc('cheapy_httpcache_bytes_saved_total', saved, spider=spider.name)
+        for result in ('not_modified', 'hash_unchanged', 'parsed'):
+            count = self.stats.get_value(f'refresh/{result}', 0)
+            if count:
+                self.batch.inc('cheapy_refresh_pages_total', count, spider=spider.name, result=result)
+        for kind in ('downloaded', 'saved'):
+            count = self.stats.get_value(f'refresh/bytes_{kind}', 0)
+            if count:
+                self.batch.inc('cheapy_refresh_bytes_total', count, spider=spider.name, kind=kind)
+        self.batch.flush()
+
+
+class CrawlTracing:
+    """
+    Emite los spans de un crawl cuando el worker le pasa un contexto de traza.
+
+    El worker lanza el crawl con los settings TRACE_ID (task_id de la búsqueda),
+    TRACE_PARENT_ID (span de la tarea) y TRACE_SPAWNED_AT (instante en que lanzó
+    el subproceso). Con ellos se registran:
+
+    - 'spawn': desde el lanzamiento del subproceso hasta que abre el spider
+      (arranque de Python, imports de Scrapy/Playwright, settings).
+    - 'download': un span por request descargada.
+    - 'pipeline.<Clase>': tiempo total de cada pipeline (ver tracing.traced_pipeline).
+
+    Los spans de parseo los emite ParseTracingMiddleware.
+    """
+
+    def __init__(self, crawler, trace_id, parent_id):
+        self.trace_id = trace_id
+        self.parent_id = parent_id
+        self.spawned_at = crawler.settings.getfloat('TRACE_SPAWNED_AT')
+        self.crawl_span_id = tracing.new_span_id()
+        self.opened_at = None
+        crawler.signals.connect(self.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(self.spider_closed, signal=signals.spider_closed)
+        crawler.signals.connect(self.response_downloaded, signal=signals.response_downloaded)
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        trace_id = crawler.settings.get('TRACE_ID')
+        if not trace_id:
+            raise NotConfigured
+        return cls(crawler, trace_id, crawler.settings.get('TRACE_PARENT_ID'))
+
+    def spider_opened(self, spider):
+        self.opened_at = time.time()
+        if self.spawned_at:
+            tracing.record_span(
+                self.trace_id, 'spawn', self.spawned_at, self.opened_at,
+                parent_id=self.parent_id, spider=spider.name,
+            )
+
+    def response_downloaded(self, response, request, spider):
+        latency = request.meta.get('download_latency')
+        if latency is None:
+            return
+        end = time.time()
+        tracing.record_span(
+            self.trace_id, 'download', end - latency, end, parent_id=self.crawl_span_id,
+            url=request.url, status=response.status, rendered=bool(request.meta.get('playwright')),
+        )
+
+    def spider_closed(self, spider, reason):
+        tracing.flush_stages(self.trace_id, parent_id=self.crawl_span_id)
+        tracing.record_span(
+            self.trace_id, 'crawl', self.opened_at or time.time(), time.time(),
+            parent_id=self.parent_id, span_id=self.crawl_span_id, spider=spider.name, reason=reason,
+        )
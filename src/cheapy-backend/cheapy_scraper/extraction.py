@@ -0,0 +1,169 @@
+"""
+Especificaciones declarativas de extracción para los spiders.
+
+Cada spider declara sus campos como cadenas ordenadas de selectores CSS:
+
+    EXTRACTION = ExtractionSpec({
+        'title': ['a.poly-component__title::text', 'h2.ui-search-item__title::text'],
+        'reviews': ['span.reviews::text', ('::text', r'(?i).*opiniones.*')],
+    })
+
+La especificación se compila una sola vez al importar el spider: con el
+backend por defecto cada selector CSS se traduce a XPath y se precompila con
+lxml, así el parseo no vuelve a traducir ni compilar expresiones por producto
+(ver cheapy_scraper/htmlbackends.py para los backends disponibles). Al extraer
+un campo los selectores se evalúan en orden y los de respaldo sólo corren si
+los anteriores no encontraron nada.
+
+Un selector puede ir acompañado de una expresión regular `(css, patrón)`: el
+resultado son las coincidencias del patrón en los textos (el grupo 1 si el
+patrón tiene un grupo), como `SelectorList.re()`.
+
+Cada evaluación queda registrada en las stats del crawl:
+    extraction/<campo>/<índice>/runs   veces que el selector se evaluó
+    extraction/<campo>/<índice>/hits   veces que encontró un valor
+    extraction/<campo>/<índice>/time   segundos acumulados
+    extraction/<campo>/misses          veces que ningún selector encontró valor
+Un respaldo con `runs` pero sin `hits` en producción es candidato a eliminarse.
+"""
+
+import re
+import time
+
+from scrapy.http import TextResponse
+
+from cheapy_scraper.htmlbackends import get_backend
+
+
+class ExtractionSpec:
+    """
+    Conjunto de campos de un spider, cada uno con su cadena de selectores.
+
+    Los selectores se compilan para el backend por defecto al crear la
+    especificación (al importar el spider) y, a pedido, para otros backends.
+
+    Args:
+        fields: Diccionario campo -> lista de selectores CSS o tuplas (css, patrón)
+    """
+
+    def __init__(self, fields: dict):
+        self.chains = {}
+        self.stat_keys = {}
+        for name, chain in fields.items():
+            entries = []
+            for entry in chain:
+                css, pattern = entry if isinstance(entry, tuple) else (entry, None)
+                pattern = re.compile(pattern) if pattern else None
+                if pattern is not None and pattern.groups > 1:
+                    raise ValueError(f"El patrón de '{css}' debe tener a lo sumo un grupo")
+                entries.append((css, pattern))
+            self.chains[name] = entries
+            self.stat_keys[name] = [
+                (f"extraction/{name}/{i}/runs", f"extraction/{name}/{i}/hits", f"extraction/{name}/{i}/time")
+                for i in range(len(entries))
+            ]
+        self._compiled = {}
+        self.compiled(get_backend())
+
+    def compiled(self, backend) -> dict:
+        """
+        Retorna los campos compilados para `backend`, compilándolos la primera vez.
+
+        Returns:
+            dict: Campo -> lista de (función de evaluación, patrón o None)
+        """
+        if backend.name not in self._compiled:
+            self._compiled[backend.name] = {
+                name: [(backend.compile(css), pattern) for css, pattern in chain]
+                for name, chain in self.chains.items()
+            }
+        return self._compiled[backend.name]
+
+    def bind(self, stats=None, backend: str = 'parsel') -> 'Extractor':
+        """
+        Crea un extractor que registra sus evaluaciones en `stats`.
+
+        Args:
+            stats: Colector de stats del crawl, o None para no registrar nada
+            backend: Backend de parseo HTML (setting HTML_PARSER_BACKEND)
+        """
+        return Extractor(self, stats, backend)
+
+
+class Extractor:
+    """Evalúa los campos de una ExtractionSpec con un backend de parseo."""
+
+    def __init__(self, spec: ExtractionSpec, stats=None, backend: str = 'parsel'):
+        self.spec = spec
+        self.stats = stats
+        self.backend = get_backend(backend)
+        self.fields = spec.compiled(self.backend)
+        # Documento de la última respuesta: se parsea una sola vez por página
+        self._document = (None, None)
+
+    def open_spider(self, spider):
+        """Handler de spider_opened: las stats del crawl existen recién desde ese momento."""
+        self.stats = spider.crawler.stats
+
+    def _root(self, sel):
+        # Acepta tanto la respuesta de Scrapy como un nodo devuelto por nodes()
+        if isinstance(sel, TextResponse):
+            if self._document[0] is not sel:
+                self._document = (sel, self.backend.document(sel))
+            return self._document[1]
+        return self.backend.root(sel)
+
+    @staticmethod
+    def _evaluate(evaluate, pattern, root) -> list:
+        values = evaluate(root)
+        if pattern is None:
+            return values
+        matches = []
+        for value in values:
+            matches.extend(pattern.findall(value))
+        return matches
+
+    def _run(self, sel, field: str, first: bool):
+        root = self._root(sel)
+        stats = self.stats
+        for i, (evaluate, pattern) in enumerate(self.fields[field]):
+            if stats is None:
+                values = self._evaluate(evaluate, pattern, root)
+            else:
+                start = time.perf_counter()
+                values = self._evaluate(evaluate, pattern, root)
+                runs_key, hits_key, time_key = self.spec.stat_keys[field][i]
+                stats.inc_value(time_key, time.perf_counter() - start)
+                stats.inc_value(runs_key)
+            # Como en `a.get() or b.get()`: en modo first un valor vacío pasa al respaldo
+            hit = bool(values[0]) if first and values else bool(values)
+            if hit:
+                if stats is not None:
+                    stats.inc_value(hits_key)
+                return values
+        if stats is not None:
+            stats.inc_value(f"extraction/{field}/misses")
+        return None
+
+    def first(self, sel, field: str, default=None):
+        """
+        Primer valor del primer selector de la cadena que encuentre algo.
+
+        Args:
+            sel: Respuesta de Scrapy o nodo devuelto por nodes() (por ejemplo, un producto)
+            field: Nombre del campo en la especificación
+            default: Valor si ningún selector encuentra nada
+
+        Returns:
+            str or None: Valor extraído
+        """
+        values = self._run(sel, field, first=True)
+        return values[0] if values else default
+
+    def all(self, sel, field: str) -> list:
+        """Todos los valores del primer selector de la cadena que encuentre algo."""
+        return self._run(sel, field, first=False) or []
+
+    def nodes(self, sel, field: str) -> list:
+        """Nodos (por ejemplo, contenedores de producto) para volver a pasarlos al extractor."""
+        return [self.backend.wrap(node) for node in self._run(sel, field, first=False) or []]
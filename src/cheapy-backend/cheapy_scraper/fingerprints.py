@@ -0,0 +1,142 @@
+"""
+Huellas persistentes de productos para el modo de crawl incremental.
+
+Las búsquedas en seguimiento vuelven a scrapear los mismos listados una y otra
+vez, y casi todos los productos vuelven idénticos. En modo incremental cada
+producto guarda una huella (hash de título, precio, precio anterior y
+descuento) y el IncrementalPipeline sólo deja pasar los productos nuevos o
+cambiados; los que no cambiaron se cuentan y se descartan sin log.
+
+La huella se indexa por búsqueda (spider, país y consulta) además de por
+producto: un mismo producto puede ser nuevo para una búsqueda y viejo para
+otra. Clave y huella son enteros de 64 bits en SQLite, así que la memoria del
+proceso no crece con el historial y el archivo queda acotado a
+INCREMENTAL_MAX_ENTRIES filas (se desalojan las vistas hace más tiempo).
+
+Los listados no informan disponibilidad: un producto que aparece está
+disponible. Las huellas vencen a los INCREMENTAL_TTL segundos, así que un
+producto que vuelve a aparecer después de ese tiempo se emite como nuevo.
+"""
+
+import hashlib
+import sqlite3
+import time
+from pathlib import Path
+from urllib.parse import urlsplit
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+# Campos que definen si un producto "cambió" para quien consume los resultados
+FINGERPRINT_FIELDS = ('title', 'price_numeric', 'price_before_numeric', 'is_discounted')
+
+
+def _hash64(text: str) -> int:
+    """Hash estable de 64 bits con signo (el rango de INTEGER en SQLite)."""
+    return int.from_bytes(hashlib.blake2b(text.encode('utf-8'), digest_size=8).digest(), 'big', signed=True)
+
+
+def product_key(scope: str, url: str) -> int:
+    """
+    Clave de un producto dentro de una búsqueda.
+
+    La URL se reduce a host y path: los parámetros de tracking y el fragmento
+    cambian entre crawls sin que cambie el producto.
+
+    Args:
+        scope: Identificador de la búsqueda (ver search_scope)
+        url: URL del producto
+    """
+    parts = urlsplit(url)
+    return _hash64(f"{scope}|{parts.netloc.lower()}{parts.path}")
+
+
+def fingerprint(item) -> int:
+    """Huella de los campos de FINGERPRINT_FIELDS de un ProductItem ya limpio."""
+    return _hash64(repr(tuple(getattr(item, field) for field in FINGERPRINT_FIELDS)))
+
+
+def search_scope(spider, query: str = None) -> str:
+    """
+    Identificador de una búsqueda: nombre del spider, país y consulta normalizada.
+
+    Args:
+        spider: Spider del crawl
+        query: Consulta del item (los crawls por lotes atienden varias); por
+            defecto, la del spider
+    """
+    query = ' '.join((query or getattr(spider, 'query', '') or '').lower().split())
+    return f"{spider.name}:{(getattr(spider, 'country_code', '') or '').upper()}:{query}"
+
+
+class FingerprintStore:
+    """
+    Huellas de productos en SQLite, compartidas por todos los workers de la máquina.
+
+    Las escrituras se acumulan y se confirman en lote al cerrar el crawl.
+
+    Args:
+        db_path: Archivo SQLite
+        max_entries: Máximo de huellas guardadas
+        ttl: Segundos tras los cuales una huella deja de valer
+    """
+
+    def __init__(self, db_path: str, max_entries: int, ttl: float):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.conn = None
+        self.pending = []
+
+    def open(self):
+        self.conn = sqlite3.connect(self.db_path, timeout=5, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS fingerprints (key INTEGER PRIMARY KEY, fp INTEGER, seen REAL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_fingerprints_seen ON fingerprints (seen)")
+        self.conn.commit()
+
+    def close(self):
+        if self.conn is None:
+            return
+        self.flush()
+        self._evict()
+        self.conn.close()
+        self.conn = None
+
+    def check(self, key: int, fp: int) -> str:
+        """
+        Compara la huella de un producto con la guardada y la actualiza.
+
+        Returns:
+            str: 'new', 'changed' o 'unchanged'
+        """
+        now = time.time()
+        row = self.conn.execute("SELECT fp, seen FROM fingerprints WHERE key = ?", (key,)).fetchone()
+        self.pending.append((key, fp, now))
+        if row is None or row[1] < now - self.ttl:
+            return 'new'
+        return 'unchanged' if row[0] == fp else 'changed'
+
+    def flush(self):
+        if self.pending:
+            self.conn.executemany("INSERT OR REPLACE INTO fingerprints VALUES (?, ?, ?)", self.pending)
+            self.conn.commit()
+            self.pending = []
+
+    def _evict(self):
+        """Elimina huellas vencidas y, si se supera el máximo, las vistas hace más tiempo."""
+        self.conn.execute("DELETE FROM fingerprints WHERE seen < ?", (time.time() - self.ttl,))
+        total = self.conn.execute("SELECT COUNT(*) FROM fingerprints").fetchone()[0]
+        if total > self.max_entries:
+            # Bajar al 90% del máximo para no desalojar en cada crawl
+            excess = total - int(self.max_entries * 0.9)
+            self.conn.execute(
+                "DELETE FROM fingerprints WHERE key IN (SELECT key FROM fingerprints ORDER BY seen LIMIT ?)",
+                (excess,),
+            )
+        self.conn.commit()
+
+
+def default_db_path() -> str:
+    return str(BASE_DIR / 'fingerprints.db')
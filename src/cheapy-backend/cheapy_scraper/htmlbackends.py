@@ -0,0 +1,151 @@
+"""
+Backends de parseo HTML intercambiables para las especificaciones de extracción.
+
+Las ExtractionSpec (cheapy_scraper/extraction.py) no dependen de una librería
+de parseo concreta: cada backend sabe construir el documento de una respuesta
+y compilar un selector CSS de Scrapy (con `::text`, ` ::text` y `::attr()`)
+a una función que lo evalúa sobre un nodo.
+
+    parsel      lxml vía parsel, el mismo motor que `response.css()`. Por defecto.
+    selectolax  parser lexbor de selectolax (opcional: `pip install selectolax`).
+                Parsea y evalúa CSS en C sin traducir a XPath.
+
+El backend se elige con el setting HTML_PARSER_BACKEND y afecta a los spiders
+que extraen con ExtractionSpec (MercadoLibre y Frávega). Los nodos que devuelve
+`Extractor.nodes()` son propios de cada backend y sólo deben pasarse de vuelta
+al extractor.
+"""
+
+import re
+
+from lxml import etree
+from parsel import Selector
+from parsel.csstranslator import HTMLTranslator
+from scrapy.http import TextResponse
+
+# Pseudo-elementos de Scrapy al final de un selector: '::text', ' ::text' o '::attr(nombre)'
+PSEUDO_RE = re.compile(r'(?P<space>\s*)::(?P<kind>text|attr\((?P<attr>[^)]+)\))\s*$')
+
+
+def split_selector(css: str) -> tuple:
+    """
+    Separa un selector CSS de Scrapy en su parte CSS y el tipo de extracción.
+
+    Todas las alternativas de un grupo ('a::text, b::text') deben extraer lo mismo.
+
+    Returns:
+        tuple: (css sin pseudo-elementos, tipo) con tipo 'node', 'text',
+            'deep_text' o ('attr', nombre)
+    """
+    parts, kinds = [], set()
+    for part in css.split(','):
+        match = PSEUDO_RE.search(part)
+        if not match:
+            parts.append(part.strip())
+            kinds.add('node')
+            continue
+        base = part[:match.start()].strip()
+        if match.group('attr'):
+            kinds.add(('attr', match.group('attr').strip()))
+        elif match.group('space') or not base or base == '*':
+            # ' ::text', '::text' y '*::text' toman los textos de todo el subárbol
+            kinds.add('deep_text')
+        else:
+            kinds.add('text')
+        parts.append(base if base != '*' else '')
+    if len(kinds) != 1:
+        raise ValueError(f"Las alternativas de '{css}' deben extraer el mismo tipo de valor")
+    return ', '.join(p for p in parts if p), kinds.pop()
+
+
+class ParselBackend:
+    """Backend lxml: traduce el CSS a XPath una vez y lo precompila."""
+
+    name = 'parsel'
+
+    def __init__(self):
+        self.translator = HTMLTranslator()
+
+    def document(self, response: TextResponse):
+        return response.selector.root
+
+    def root(self, node):
+        return node.root
+
+    def wrap(self, element):
+        return Selector(root=element, type='html')
+
+    def compile(self, css: str):
+        return etree.XPath(self.translator.css_to_xpath(css), smart_strings=False)
+
+
+class SelectolaxBackend:
+    """Backend lexbor (selectolax): CSS nativo, sin traducción a XPath."""
+
+    name = 'selectolax'
+
+    def __init__(self):
+        # Dependencia opcional: se importa sólo si se elige este backend
+        try:
+            from selectolax.lexbor import LexborHTMLParser
+        except ImportError:
+            raise ImportError("HTML_PARSER_BACKEND='selectolax' requiere instalar selectolax") from None
+        self.parser_cls = LexborHTMLParser
+
+    def document(self, response: TextResponse):
+        return self.parser_cls(response.text).root
+
+    def root(self, node):
+        return node
+
+    def wrap(self, element):
+        return element
+
+    def compile(self, css: str):
+        query, kind = split_selector(css)
+
+        def matches(node):
+            return node.css(query) if query else [node]
+
+        if kind == 'node':
+            return matches
+        if kind == 'text':
+            return lambda node: [
+                child.text_content for element in matches(node)
+                for child in element.iter(include_text=True) if child.is_text_node
+            ]
+        if kind == 'deep_text':
+            return lambda node: [
+                child.text_content for element in matches(node)
+                for child in element.traverse(include_text=True) if child.is_text_node
+            ]
+        attr = kind[1]
+        return lambda node: [
+            element.attributes[attr] or '' for element in matches(node) if attr in element.attributes
+        ]
+
+
+BACKENDS = {
+    'parsel': ParselBackend,
+    'selectolax': SelectolaxBackend,
+}
+
+_instances = {}
+
+
+def get_backend(name: str = 'parsel'):
+    """
+    Retorna la instancia compartida del backend `name`.
+
+    Args:
+        name: Clave de BACKENDS (setting HTML_PARSER_BACKEND)
+
+    Raises:
+        ValueError: Si el backend no existe
+        ImportError: Si falta la librería opcional del backend
+    """
+    if name not in BACKENDS:
+        raise ValueError(f"Backend HTML desconocido: {name!r} (opciones: {', '.join(BACKENDS)})")
+    if name not in _instances:
+        _instances[name] = BACKENDS[name]()
+    return _instances[name]
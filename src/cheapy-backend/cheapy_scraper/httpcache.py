@@ -0,0 +1,196 @@
+"""
+Almacenamiento de caché HTTP compartido para páginas de resultados de búsqueda.
+
+Varios usuarios que buscan lo mismo en pocos minutos disparan descargas
+idénticas de la misma página de resultados. Este backend de caché para el
+HttpCacheMiddleware de Scrapy guarda las respuestas en un único archivo SQLite
+compartido por todos los workers de la máquina, con TTL corto por tienda,
+cuerpos comprimidos con zlib y desalojo por tamaño (LRU).
+"""
+
+import json
+import sqlite3
+import time
+import zlib
+from pathlib import Path
+from urllib.parse import urlparse, urlencode, parse_qsl, urlunparse
+
+from scrapy.http import Headers
+from scrapy.responsetypes import responsetypes
+from w3lib.url import canonicalize_url
+
+from blocking import detect_block
+from config import HTTPCACHE_TTL_BY_STORE
+from stores import resolve_store, store_for_host
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+# Parámetros que no cambian el contenido de la página de resultados. Los nombres
+# exactos se comparan completos (así 'ref' no descarta 'refinements' ni 'refresh');
+# sólo las familias de Google Analytics se descartan por prefijo.
+TRACKING_PARAMS = frozenset({'gclid', 'fbclid', 'ref', 'tracking_id', 'spm'})
+TRACKING_PREFIXES = ('utm_', '_ga')
+
+
+def normalize_cache_key(method: str, url: str, body: bytes = b'') -> str:
+    """
+    Construye la clave de caché de una request a partir de su URL normalizada.
+
+    Normaliza mayúsculas del host, orden de parámetros y codificación, y descarta
+    parámetros de tracking, de modo que variantes equivalentes de la misma
+    búsqueda compartan la entrada.
+
+    Args:
+        method: Método HTTP
+        url: URL de la request
+        body: Cuerpo de la request (sólo relevante para POST)
+
+    Returns:
+        str: Clave estable para la tabla de caché
+    """
+    parsed = urlparse(canonicalize_url(url))
+    query = [
+        (k, v) for k, v in parse_qsl(parsed.query, keep_blank_values=True)
+        if k.lower() not in TRACKING_PARAMS and not k.lower().startswith(TRACKING_PREFIXES)
+    ]
+    normalized = urlunparse(parsed._replace(netloc=parsed.netloc.lower(), query=urlencode(query), fragment=''))
+    key = f"{method.upper()} {normalized}"
+    if body:
+        key += f" {zlib.crc32(body):08x}"
+    return key
+
+
+class SharedSqliteCacheStorage:
+    """
+    Backend de HTTPCACHE_STORAGE basado en SQLite compartido entre procesos.
+
+    Sólo almacena respuestas 200 de hosts con TTL definido en
+    HTTPCACHE_TTL_BY_STORE (config.py); el resto se descarga siempre. Las
+    páginas de captcha o verificación que la tienda responde con 200 no se
+    guardan: HttpCacheMiddleware procesa la respuesta antes que
+    BlockDetectorMiddleware, y una página de bloqueo cacheada se repetiría en
+    cada crawl hasta vencer.
+    Reporta en las stats de Scrapy los bytes y la latencia ahorrados por los hits.
+    """
+
+    EVICTION_CHECK_EVERY = 50
+
+    def __init__(self, settings):
+        """
+        Inicializa el backend con la ruta, límite de tamaño y TTLs configurados.
+
+        Args:
+            settings: Settings de Scrapy
+        """
+        self.db_path = settings.get('HTTPCACHE_SQLITE_PATH') or str(BASE_DIR / 'httpcache.db')
+        self.max_bytes = settings.getint('HTTPCACHE_MAX_BYTES', 200 * 1024 * 1024)
+        self.ttl_by_store = HTTPCACHE_TTL_BY_STORE
+        self.conn = None
+        self.stores_since_eviction = 0
+
+    def open_spider(self, spider):
+        self.stats = spider.crawler.stats
+        self.conn = sqlite3.connect(self.db_path, timeout=5, check_same_thread=False)
+        # WAL permite lecturas concurrentes de varios workers mientras otro escribe
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS http_cache ("
+            "key TEXT PRIMARY KEY, url TEXT, status INTEGER, headers TEXT, body BLOB, "
+            "size INTEGER, stored_size INTEGER, latency REAL, created REAL, expires REAL, last_access REAL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_http_cache_access ON http_cache (last_access)")
+        self.conn.commit()
+
+    def close_spider(self, spider):
+        if self.conn is None:
+            return
+        self._evict()
+        self.conn.close()
+        self.conn = None
+
+    def _ttl_for(self, url: str):
+        store, _ = store_for_host(urlparse(url).hostname)
+        return self.ttl_by_store.get(store)
+
+    def retrieve_response(self, spider, request):
+        """
+        Busca una respuesta vigente para la request.
+
+        Returns:
+            Response or None: Respuesta reconstruida, o None si no hay entrada vigente
+        """
+        if self._ttl_for(request.url) is None:
+            return None
+        key = normalize_cache_key(request.method, request.url, request.body)
+        row = self.conn.execute(
+            "SELECT url, status, headers, body, size, latency, created, expires FROM http_cache WHERE key = ?",
+            (key,),
+        ).fetchone()
+        now = time.time()
+        if not row or row[7] < now:
+            return None
+
+        url, status, raw_headers, compressed, size, latency, created, _ = row
+        self.conn.execute("UPDATE http_cache SET last_access = ? WHERE key = ?", (now, key))
+        self.conn.commit()
+
+        body = zlib.decompress(compressed)
+        headers = Headers(json.loads(raw_headers))
+        respcls = responsetypes.from_args(headers=headers, url=url, body=body)
+        request.meta['cache_timestamp'] = created
+
+        self.stats.inc_value('httpcache/bytes_saved', size)
+        self.stats.inc_value('httpcache/latency_saved', latency or 0)
+        return respcls(url=url, headers=headers, status=status, body=body)
+
+    def store_response(self, spider, request, response):
+        """Guarda la respuesta comprimida si su tienda tiene TTL, es un 200 y no es una página de bloqueo."""
+        ttl = self._ttl_for(request.url)
+        if ttl is None or response.status != 200:
+            return
+        store = resolve_store(spider.name, urlparse(request.url).hostname)
+        if detect_block(store, response.status, response.url, response.body):
+            self.stats.inc_value('httpcache/blocked_not_stored')
+            return
+
+        key = normalize_cache_key(request.method, request.url, request.body)
+        headers = {
+            k.decode('latin-1'): [v.decode('latin-1') for v in vs]
+            for k, vs in response.headers.items()
+        }
+        compressed = zlib.compress(response.body, 6)
+        now = time.time()
+        self.conn.execute(
+            "INSERT OR REPLACE INTO http_cache VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                key, response.url, response.status, json.dumps(headers), compressed,
+                len(response.body), len(compressed), request.meta.get('download_latency'),
+                now, now + ttl, now,
+            ),
+        )
+        self.conn.commit()
+        self.stats.inc_value('httpcache/stored_bytes', len(compressed))
+
+        self.stores_since_eviction += 1
+        if self.stores_since_eviction >= self.EVICTION_CHECK_EVERY:
+            self._evict()
+
+    def _evict(self):
+        """Elimina entradas vencidas y, si se supera el tamaño máximo, las menos usadas."""
+        self.stores_since_eviction = 0
+        self.conn.execute("DELETE FROM http_cache WHERE expires < ?", (time.time(),))
+        total = self.conn.execute("SELECT COALESCE(SUM(stored_size), 0) FROM http_cache").fetchone()[0]
+        if total > self.max_bytes:
+            # Desalojar por último acceso hasta quedar en el 90% del límite
+            to_free = total - int(self.max_bytes * 0.9)
+            freed = 0
+            victims = []
+            for key, stored_size in self.conn.execute(
+                "SELECT key, stored_size FROM http_cache ORDER BY last_access"
+            ):
+                victims.append((key,))
+                freed += stored_size
+                if freed >= to_free:
+                    break
+            self.conn.executemany("DELETE FROM http_cache WHERE key = ?", victims)
+        self.conn.commit()
@@ -1,28 +1,50 @@
-import scrapy
+from dataclasses import dataclass
 
-class ProductItem(scrapy.Item):
+
+@dataclass(slots=True)
+class ProductItem:
     """
-    Item de Scrapy que define la estructura para los datos de productos extraídos de sitios de comercio electrónico.
-    Incluye campos crudos de los spiders y campos procesados de los pipelines.
+    Producto extraído de un sitio de comercio electrónico, común a todos los spiders.
+
+    Dataclass con `__slots__`: cada item ocupa un bloque fijo sin diccionario
+    propio y los pipelines leen y escriben atributos directamente. Scrapy lo
+    acepta como item nativo (itemadapter soporta dataclasses).
+
+    Los campos crudos (`price`, `rating_str`, ...) los completa el spider y
+    sólo los usa DataCleaningPipeline; `to_output()` devuelve los campos
+    procesados, que son los que el worker recibe.
     """
-    title = scrapy.Field()
-    url = scrapy.Field()
-    image_url = scrapy.Field()
-    source = scrapy.Field()
-    price = scrapy.Field()
-    rating_str = scrapy.Field()
-    reviews_count_str = scrapy.Field()
-    reviews_count_raw = scrapy.Field()
-    currency_code = scrapy.Field()
-    country_code = scrapy.Field()
-
-    price_numeric = scrapy.Field()
-    currency = scrapy.Field()
-    rating = scrapy.Field()
-    reviews_count = scrapy.Field()
-    price_display = scrapy.Field()
-    price_before = scrapy.Field()
-    price_before_numeric = scrapy.Field()
-    is_discounted = scrapy.Field()
-    on_sale = scrapy.Field()
-    discount_percent = scrapy.Field()
\ No newline at end of file
+    # Campos crudos de los spiders
+    query: str = None
+    title: str = None
+    url: str = None
+    image_url: str = None
+    source: str = None
+    price: str = None
+    price_before: str = None
+    is_discounted: bool = None
+    rating_str: str = None
+    reviews_count_str: str = None
+    currency_code: str = None
+    country_code: str = None
+
+    # Campos procesados por los pipelines
+    price_numeric: float = None
+    price_before_numeric: float = None
+    currency: str = None
+    rating: float = None
+    reviews_count: int = None
+    reviews_count_raw: str = None
+    price_display: str = None
+
+    def to_output(self) -> dict:
+        """Campos que se exportan al worker (formato de salida del crawl)."""
+        return {field: getattr(self, field) for field in OUTPUT_FIELDS}
+
+
+# Campos de salida: los crudos que DataCleaningPipeline consume no se exportan
+OUTPUT_FIELDS = (
+    'query', 'title', 'url', 'image_url', 'source', 'price_before', 'is_discounted',
+    'price_numeric', 'price_before_numeric', 'currency', 'rating',
+    'reviews_count', 'reviews_count_raw', 'price_display',
+)
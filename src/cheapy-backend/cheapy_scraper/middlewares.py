@@ -0,0 +1,587 @@
+"""
+Middlewares de downloader y de spider de Cheapy Scraper.
+"""
+
+import asyncio
+import json
+import pickle
+import sys
+import time
+import redis.asyncio as aioredis
+from scrapy import Request, signals
+from scrapy.downloadermiddlewares.cookies import CookiesMiddleware
+from scrapy.exceptions import IgnoreRequest, NotConfigured
+from scrapy.utils.httpobj import urlparse_cached
+
+import metrics
+import tracing
+from blocking import CircuitBreaker, detect_block
+from cheapy_scraper.checkpoint import CrawlCheckpoint, restore_request
+from cheapy_scraper.sessions import SessionStore, jar_to_state, load_into_jar, session_key
+from config import REDIS_URL, STORE_RATE_LIMITS
+from ratelimit import RedisTokenBucket, budget_for_host
+from stores import resolve_store
+
+
+class StoreRateLimitMiddleware:
+    """
+    Limita la tasa de requests por tienda de forma global para todo el cluster.
+
+    `DOWNLOAD_DELAY` se aplica por proceso: diez crawls simultáneos de la misma
+    tienda la golpean diez veces más fuerte. Este middleware reserva un token
+    de un bucket en Redis compartido por todos los crawls del mismo dominio
+    antes de dejar pasar cada request, usando los presupuestos de
+    STORE_RATE_LIMITS en config.py. El bucket es por tienda y no por hostname,
+    para que los subdominios (listado., articulo., www.) no multipliquen el
+    presupuesto.
+
+    Si Redis no está disponible el middleware deja pasar las requests (falla
+    abierto) y queda como límite el DOWNLOAD_DELAY local.
+    """
+
+    def __init__(self, crawler):
+        """
+        Inicializa el middleware con los presupuestos de config.py.
+
+        Args:
+            crawler: Crawler de Scrapy (para settings y stats)
+        """
+        self.stats = crawler.stats
+        self.budgets = STORE_RATE_LIMITS
+        self.redis_url = crawler.settings.get('RATELIMIT_REDIS_URL') or REDIS_URL
+        self.bucket = None
+        self.redis_failed = False
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool('RATELIMIT_ENABLED'):
+            raise NotConfigured
+        return cls(crawler)
+
+    async def process_request(self, request, spider):
+        """
+        Espera el turno de la request en el bucket de su dominio.
+
+        Args:
+            request: Request saliente
+            spider: Spider en ejecución
+
+        Returns:
+            None: La request siempre continúa, sólo se demora
+        """
+        if self.redis_failed:
+            return None
+        host = urlparse_cached(request).hostname
+        bucket_key, budget = budget_for_host(host, self.budgets)
+        if not budget:
+            return None
+
+        try:
+            if self.bucket is None:
+                # El cliente async se crea dentro del loop de asyncio del reactor
+                self.bucket = RedisTokenBucket(aioredis.Redis.from_url(self.redis_url, socket_timeout=1))
+            wait = await self.bucket.areserve(bucket_key, budget['rate'], budget['burst'])
+        except Exception as e:
+            self.redis_failed = True
+            spider.logger.warning(f"Rate limiter sin Redis, se continúa sin límite global: {e}")
+            return None
+
+        self.stats.inc_value('ratelimit/requests')
+        if wait > 0:
+            self.stats.inc_value('ratelimit/delayed')
+            self.stats.inc_value('ratelimit/wait_time', wait)
+            self.stats.max_value('ratelimit/max_wait_time', wait)
+            await asyncio.sleep(wait)
+        await metrics.observe_async('cheapy_ratelimit_wait_seconds', wait, spider=spider.name)
+        return None
+
+
+class BlockDetectorMiddleware:
+    """
+    Detecta páginas de captcha o de verificación y corta el crawl de esa tienda.
+
+    Una respuesta de bloqueo (marcadores de BLOCK_MARKERS en config.py, o 429)
+    se descarta sin llegar al spider ni al RetryMiddleware: no se parsea, no se
+    guarda como página de depuración y no se reintenta. El bloqueo se registra
+    en el circuit breaker compartido de la tienda (blocking.py) y el crawl se
+    cierra con motivo 'blocked', porque las siguientes páginas recibirían lo mismo.
+
+    La tienda es la del host de la request (stores.py). En un crawl que mezcla
+    tiendas (el spider `refresh`) el bloqueo de una no cierra el crawl: sólo se
+    descartan las requests que faltaban a esa tienda.
+
+    Si Redis no está disponible el crawl igual se cierra; sólo no se comparte el bloqueo.
+    """
+
+    def __init__(self, crawler):
+        self.crawler = crawler
+        self.stats = crawler.stats
+        self.redis_url = crawler.settings.get('BLOCK_REDIS_URL') or REDIS_URL
+        self.breaker = None
+        self.closing = False
+        self.blocked_stores = set()
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool('BLOCK_DETECTION_ENABLED'):
+            raise NotConfigured
+        return cls(crawler)
+
+    def process_request(self, request, spider):
+        store = resolve_store(spider.name, urlparse_cached(request).hostname)
+        if store in self.blocked_stores:
+            self.stats.inc_value('blocking/skipped_requests')
+            raise IgnoreRequest(f"Tienda bloqueada en este crawl ({store})")
+        return None
+
+    async def process_response(self, request, response, spider):
+        store = resolve_store(spider.name, urlparse_cached(request).hostname)
+        reason = detect_block(store, response.status, response.url, response.body)
+        if reason is None:
+            return response
+
+        self.stats.inc_value('blocking/detected')
+        self.stats.inc_value(f'blocking/reason/{reason}')
+        await metrics.inc_async('cheapy_store_blocks_total', spider=store, reason=reason)
+        try:
+            if self.breaker is None:
+                # El cliente async se crea dentro del loop de asyncio del reactor
+                self.breaker = CircuitBreaker(aioredis.Redis.from_url(self.redis_url, socket_timeout=1))
+            opened, seconds = await self.breaker.arecord_block(store, reason)
+        except Exception as e:
+            opened, seconds = False, 0
+            spider.logger.warning(f"Circuit breaker sin Redis, el bloqueo no se comparte: {e}")
+        if opened:
+            await metrics.inc_async('cheapy_circuit_trips_total', spider=store)
+
+        self.blocked_stores.add(store)
+        if store != spider.name:
+            outcome = f"se descartan las requests restantes a {store}"
+        elif not self.closing:
+            self.closing = True
+            outcome = "se cierra el crawl"
+            asyncio.ensure_future(self.crawler.engine.close_spider_async(reason='blocked'))
+        else:
+            outcome = "el crawl ya se está cerrando"
+        spider.logger.warning(
+            f"Bloqueo detectado en {response.url} ({reason}); "
+            + (f"circuito de {store} abierto por {seconds} s; " if seconds else "") + outcome
+        )
+        raise IgnoreRequest(f"Respuesta de bloqueo ({reason})")
+
+
+class SessionMiddleware:
+    """
+    Reutiliza entre crawls el estado de sesión de cada tienda (cheapy_scraper/sessions.py).
+
+    Antes de la primera request a una tienda carga su sesión guardada (la
+    tienda del host de la request, ver stores.py, y el país del spider): las
+    cookies van al jar de CookiesMiddleware (por eso su orden, 690, es menor
+    que el 700 de CookiesMiddleware) y en las requests de Playwright el
+    `storage_state` se pasa al crear el contexto del navegador. Con la primera
+    respuesta buena de la tienda se guarda su sesión, leída del jar o, si el
+    crawl usa Playwright, del contexto del navegador (un PageMethod al final de
+    cada carga), y se vuelve a guardar al terminar el crawl. Una respuesta de
+    bloqueo descarta la sesión de esa tienda.
+
+    Un crawl que mezcla tiendas (el spider `refresh`) usa la sesión de cada una
+    y guarda en cada sesión sólo las cookies de los dominios de esa tienda.
+
+    El tiempo hasta la primera respuesta buena, con sesión reutilizada o nueva,
+    queda en `cheapy_first_response_seconds`. Sin Redis el crawl sigue con una sesión nueva.
+    """
+
+    def __init__(self, crawler):
+        self.crawler = crawler
+        self.stats = crawler.stats
+        self.redis_url = crawler.settings.get('SESSION_REDIS_URL') or REDIS_URL
+        self.ttl = crawler.settings.getint('SESSION_TTL', 4 * 3600)
+        self.store = None
+        self.redis_failed = False
+        # Tienda -> {'key', 'saved_state', 'first_response', 'discarded'}
+        self.sessions = {}
+        self.browser_state = None
+        self.started = None
+        self._lock = asyncio.Lock()
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool('SESSION_ENABLED'):
+            raise NotConfigured
+        middleware = cls(crawler)
+        crawler.signals.connect(middleware.spider_closed, signal=signals.spider_closed)
+        return middleware
+
+    def _cookie_jar(self):
+        for middleware in self.crawler.engine.downloader.middleware.middlewares:
+            if isinstance(middleware, CookiesMiddleware):
+                return middleware.jars[None]
+        return None
+
+    async def _load(self, store_name, spider):
+        session = {'key': session_key(store_name, getattr(spider, 'country_code', None)),
+                   'saved_state': None, 'first_response': False, 'discarded': False}
+        self.sessions[store_name] = session
+        try:
+            if self.store is None:
+                # El cliente async se crea dentro del loop de asyncio del reactor
+                self.store = SessionStore(aioredis.Redis.from_url(self.redis_url, socket_timeout=1), self.ttl)
+            session['saved_state'] = await self.store.load(session['key'])
+        except Exception as e:
+            self.redis_failed = True
+            spider.logger.warning(f"Sesiones sin Redis, el crawl empieza una sesión nueva: {e}")
+            return
+
+        outcome = 'reused' if session['saved_state'] else 'fresh'
+        if session['saved_state']:
+            jar = self._cookie_jar()
+            cookies = load_into_jar(jar, session['saved_state']) if jar is not None else 0
+            self.stats.inc_value('session/cookies_loaded', cookies)
+        self.stats.set_value('session/outcome', outcome)
+        await metrics.inc_async('cheapy_sessions_total', spider=store_name, outcome=outcome)
+
+    async def _session(self, request, spider):
+        """Sesión de la tienda de la request, cargada con su primera request."""
+        store_name = resolve_store(spider.name, urlparse_cached(request).hostname)
+        if store_name not in self.sessions:
+            async with self._lock:
+                if store_name not in self.sessions:
+                    await self._load(store_name, spider)
+        return store_name, self.sessions[store_name]
+
+    async def _capture_browser_state(self, page):
+        """PageMethod: lee el estado de sesión del contexto del navegador tras la carga."""
+        try:
+            self.browser_state = await page.context.storage_state()
+        except Exception as e:
+            self.crawler.spider.logger.debug(f"No se pudo leer el storage_state: {e}")
+
+    async def _save(self, store_name, session, spider):
+        state = self.browser_state
+        if state is None:
+            jar = self._cookie_jar()
+            state = jar_to_state(jar) if jar is not None else None
+            if state and store_name != spider.name:
+                # El jar tiene las cookies de todas las tiendas del crawl
+                state['cookies'] = [
+                    cookie for cookie in state['cookies']
+                    if resolve_store(None, cookie['domain'].lstrip('.')) == store_name
+                ]
+        if not state or not state.get('cookies'):
+            return
+        try:
+            await self.store.save(session['key'], state)
+            self.stats.inc_value('session/cookies_saved', len(state['cookies']))
+        except Exception as e:
+            spider.logger.warning(f"No se pudo guardar la sesión de {session['key']}: {e}")
+
+    async def process_request(self, request, spider):
+        if self.redis_failed:
+            return None
+        _, session = await self._session(request, spider)
+        if self.started is None:
+            self.started = time.monotonic()
+        if self.redis_failed or not request.meta.get('playwright'):
+            return None
+
+        from scrapy_playwright.page import PageMethod
+
+        if session['saved_state'] and 'playwright_context' not in request.meta:
+            # Sólo cuenta en la request que crea el contexto por defecto; en las demás se ignora
+            request.meta['playwright_context_kwargs'] = {
+                **request.meta.get('playwright_context_kwargs', {}), 'storage_state': session['saved_state'],
+            }
+        capture = PageMethod(self._capture_browser_state)
+        methods = request.meta.get('playwright_page_methods') or []
+        if isinstance(methods, dict):
+            request.meta['playwright_page_methods'] = {**methods, 'cheapy_session': capture}
+        else:
+            request.meta['playwright_page_methods'] = [*methods, capture]
+        return None
+
+    async def process_response(self, request, response, spider):
+        if self.redis_failed:
+            return response
+        store_name, session = await self._session(request, spider)
+        if self.redis_failed or session['discarded']:
+            return response
+        if detect_block(store_name, response.status, response.url, response.body):
+            session['discarded'] = True
+            await metrics.inc_async('cheapy_sessions_total', spider=store_name, outcome='discarded')
+            self.stats.set_value('session/discarded', True)
+            try:
+                await self.store.discard(session['key'])
+            except Exception as e:
+                spider.logger.warning(f"No se pudo descartar la sesión de {session['key']}: {e}")
+            return response
+        # Las respuestas de la caché HTTP no pasan por la tienda: no miden ni cambian la sesión
+        if response.status != 200 or 'cached' in response.flags or session['first_response']:
+            return response
+
+        session['first_response'] = True
+        seconds = time.monotonic() - self.started
+        self.stats.min_value('session/first_response_seconds', round(seconds, 3))
+        await metrics.observe_async('cheapy_first_response_seconds', seconds, spider=store_name,
+                                    session='reused' if session['saved_state'] else 'fresh')
+        await self._save(store_name, session, spider)
+        return response
+
+    async def spider_closed(self, spider, reason):
+        if self.redis_failed or reason != 'finished':
+            return
+        for store_name, session in self.sessions.items():
+            if session['first_response'] and not session['discarded']:
+                await self._save(store_name, session, spider)
+
+
+class ParseTracingMiddleware:
+    """
+    Spider middleware que mide el tiempo de parseo de cada respuesta.
+
+    Sólo cuenta el tiempo efectivamente consumido dentro del callback del
+    spider (cada avance de su generador), no el tiempo que el resto del motor
+    tarda en procesar los items o requests que produce. Se activa únicamente
+    si el crawl tiene el setting TRACE_ID.
+    """
+
+    def __init__(self, trace_id):
+        self.trace_id = trace_id
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        trace_id = crawler.settings.get('TRACE_ID')
+        if not trace_id:
+            raise NotConfigured
+        return cls(trace_id)
+
+    def _record(self, response, start, busy, produced, spider):
+        tracing.record_span(
+            self.trace_id, 'parse', start, start + busy, spider=spider.name,
+            url=response.url, outputs=produced,
+        )
+
+    def process_spider_output(self, response, result, spider):
+        start, busy, produced = time.time(), 0.0, 0
+        iterator = iter(result)
+        while True:
+            t0 = time.perf_counter()
+            try:
+                output = next(iterator)
+            except StopIteration:
+                busy += time.perf_counter() - t0
+                break
+            busy += time.perf_counter() - t0
+            produced += 1
+            yield output
+        self._record(response, start, busy, produced, spider)
+
+    async def process_spider_output_async(self, response, result, spider):
+        start, busy, produced = time.time(), 0.0, 0
+        iterator = result.__aiter__()
+        while True:
+            t0 = time.perf_counter()
+            try:
+                output = await iterator.__anext__()
+            except StopAsyncIteration:
+                busy += time.perf_counter() - t0
+                break
+            busy += time.perf_counter() - t0
+            produced += 1
+            yield output
+        self._record(response, start, busy, produced, spider)
+
+
+class CheckpointMiddleware:
+    """
+    Spider middleware que guarda en Redis el avance del crawl, página por página.
+
+    Al terminar el callback de cada respuesta guarda sus items crudos y las
+    requests que generó (cheapy_scraper/checkpoint.py). Si al arrancar encuentra
+    el checkpoint de un intento anterior de la misma tarea, re-emite esos items
+    y en lugar de las requests iniciales ya procesadas programa las pendientes.
+
+    Se activa sólo con el setting CHECKPOINT_KEY (el worker pasa el task_id).
+    Sin Redis el crawl sigue sin checkpoints.
+    """
+
+    def __init__(self, crawler, key: str, ttl: int):
+        self.crawler = crawler
+        self.stats = crawler.stats
+        self.key = key
+        self.ttl = ttl
+        self.redis_url = crawler.settings.get('CHECKPOINT_REDIS_URL') or REDIS_URL
+        self.store = None
+        self.failed = False
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        key = crawler.settings.get('CHECKPOINT_KEY')
+        if not key:
+            raise NotConfigured
+        middleware = cls(crawler, key, crawler.settings.getint('CHECKPOINT_TTL', 3600))
+        crawler.signals.connect(middleware.spider_closed, signal=signals.spider_closed)
+        return middleware
+
+    def _fingerprint(self, request) -> str:
+        return self.crawler.request_fingerprinter.fingerprint(request).hex()
+
+    def _disable(self, spider, error):
+        self.failed = True
+        spider.logger.warning(f"Checkpoints sin Redis, el crawl sigue sin ellos: {error}")
+
+    async def process_start(self, start):
+        """Reanuda desde el checkpoint de un intento anterior, si lo hay."""
+        spider = self.crawler.spider
+        try:
+            # El cliente async se crea dentro del loop de asyncio del reactor
+            self.store = CrawlCheckpoint(aioredis.Redis.from_url(self.redis_url, socket_timeout=1), self.key, self.ttl)
+            done, pending, items = await self.store.load()
+        except Exception as e:
+            self._disable(spider, e)
+            done, pending, items = set(), {}, []
+
+        if done:
+            spider.logger.info(
+                f"Reanudando desde checkpoint: {len(done)} páginas hechas, {len(items)} items, "
+                f"{len(pending)} requests pendientes"
+            )
+            self.stats.set_value('checkpoint/resumed_pages', len(done))
+            self.stats.set_value('checkpoint/resumed_items', len(items))
+            self.stats.set_value('checkpoint/resumed_requests', len(pending))
+        for item in items:
+            yield item
+        async for request in start:
+            if not done or self._fingerprint(request) not in done:
+                yield request
+        for data in pending.values():
+            yield restore_request(data, spider)
+
+    async def process_spider_output(self, response, result):
+        spider = self.crawler.spider
+        items, requests = [], {}
+        async for output in result:
+            if isinstance(output, Request):
+                requests[self._fingerprint(output)] = output
+            else:
+                # Se serializa antes de que los pipelines lo modifiquen
+                items.append(pickle.dumps(output))
+            yield output
+
+        if self.failed or self.store is None:
+            return
+        try:
+            serialized = {fp: request.to_dict(spider=spider) for fp, request in requests.items()}
+        except ValueError as e:
+            # Callback que no es un método del spider: esta página se repetirá al reanudar
+            spider.logger.debug(f"Página sin checkpoint ({response.url}): {e}")
+            return
+        try:
+            await self.store.save_page(self._fingerprint(response.request), items, serialized)
+        except Exception as e:
+            self._disable(spider, e)
+            return
+        self.stats.inc_value('checkpoint/pages_saved')
+
+    async def spider_closed(self, spider, reason):
+        """Un crawl completo ya no necesita su checkpoint."""
+        if reason != 'finished' or self.failed or self.store is None:
+            return
+        try:
+            await self.store.clear()
+        except Exception as e:
+            spider.logger.debug(f"No se pudo borrar el checkpoint: {e}")
+
+
+class MockStoreMiddleware:
+    """
+    Redirige las requests de las tiendas a la tienda falsa de pruebas de carga.
+
+    Con el setting MOCK_STORE_URL (variable de entorno CHEAPY_MOCK_STORE_URL)
+    cada request se reescribe hacia ese servidor, indicando la tienda original
+    en el header X-Cheapy-Store. La respuesta se devuelve con la URL original,
+    de modo que el spider parsea, arma URLs y pagina igual que en producción.
+
+    Si MOCK_STORE_PLAYWRIGHT es False se quita la metadata de Playwright y los
+    spiders renderizados se descargan por HTTP plano (sin Chromium).
+    """
+
+    ORIGINAL_URL_META = 'mock_store_original_url'
+    PLAYWRIGHT_META = ('playwright', 'playwright_page_methods', 'playwright_page_goto_kwargs', 'playwright_include_page')
+
+    def __init__(self, mock_url, keep_playwright):
+        self.mock_url = mock_url.rstrip('/')
+        self.keep_playwright = keep_playwright
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        mock_url = crawler.settings.get('MOCK_STORE_URL')
+        if not mock_url:
+            raise NotConfigured
+        return cls(mock_url, crawler.settings.getbool('MOCK_STORE_PLAYWRIGHT', True))
+
+    def process_request(self, request, spider):
+        if self.ORIGINAL_URL_META in request.meta or request.url.startswith(self.mock_url):
+            return None
+        parsed = urlparse_cached(request)
+        path = parsed.path or '/'
+        if parsed.query:
+            path += f"?{parsed.query}"
+        meta = dict(request.meta)
+        meta[self.ORIGINAL_URL_META] = request.url
+        if not self.keep_playwright:
+            for key in self.PLAYWRIGHT_META:
+                meta.pop(key, None)
+        headers = request.headers.copy()
+        headers['X-Cheapy-Store'] = parsed.hostname or ''
+        # La request reescrita vuelve a pasar por el scheduler con otra URL
+        return request.replace(url=self.mock_url + path, meta=meta, headers=headers, dont_filter=True)
+
+    def process_response(self, request, response, spider):
+        original_url = request.meta.get(self.ORIGINAL_URL_META)
+        if original_url:
+            return response.replace(url=original_url)
+        return response
+
+
+class StartupProfilerMiddleware:
+    """
+    Mide el arranque de un crawl hasta su primera request (benchmarks/startup.py).
+
+    Con el setting STARTUP_PROFILE_PATH registra, en milisegundos desde que el
+    proceso fue lanzado (STARTUP_SPAWNED_AT), cuándo se construyó el crawler,
+    cuándo arrancó el motor, cuándo se abrió el spider y cuándo llegó la primera
+    request al downloader, y escribe el perfil en ese archivo. Todas las
+    requests se descartan antes de descargarse: el crawl mide sólo el arranque
+    y termina sin tocar la red.
+    """
+
+    def __init__(self, crawler, path, spawned_at):
+        self.path = path
+        self.spawned_at = spawned_at
+        self.marks = {}
+        self.mark('crawler_ready')
+        crawler.signals.connect(lambda: self.mark('engine_started'), signal=signals.engine_started, weak=False)
+        crawler.signals.connect(lambda spider: self.mark('spider_opened'), signal=signals.spider_opened, weak=False)
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        path = crawler.settings.get('STARTUP_PROFILE_PATH')
+        if not path:
+            raise NotConfigured
+        return cls(crawler, path, crawler.settings.getfloat('STARTUP_SPAWNED_AT') or time.time())
+
+    def mark(self, name: str):
+        self.marks.setdefault(name, round((time.time() - self.spawned_at) * 1000, 1))
+
+    def process_request(self, request, spider):
+        if 'first_request' not in self.marks:
+            self.mark('first_request')
+            profile = {
+                'marks_ms': self.marks,
+                'modules': len(sys.modules),
+                'playwright_loaded': 'playwright' in sys.modules,
+            }
+            with open(self.path, 'w', encoding='utf-8') as f:
+                json.dump(profile, f)
+        raise IgnoreRequest("startup profiling")
+
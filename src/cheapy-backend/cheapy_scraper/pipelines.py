@@ -1,6 +1,34 @@
+import json
 import re
-from itemadapter import ItemAdapter
-from scrapy.exceptions import DropItem
+import time
+from scrapy.exceptions import DropItem, NotConfigured
+import productindex
+from tracing import traced_pipeline
+from cheapy_scraper.fingerprints import FingerprintStore, default_db_path, fingerprint, product_key, search_scope
+
+
+def drop_item(pipeline: str, reason: str, message: str, log_level: str = None) -> DropItem:
+    """
+    Crea un DropItem etiquetado con el pipeline y un motivo estable.
+
+    El mensaje puede incluir datos variables (como la URL); el motivo es un
+    código fijo que usa la extensión de métricas para contar descartes.
+
+    Args:
+        pipeline: Nombre del pipeline que descarta el item
+        reason: Código corto del motivo (ej: 'missing_url')
+        message: Mensaje legible para el log
+        log_level: Nivel de log del descarte (por defecto, el de Scrapy: WARNING)
+
+    Returns:
+        DropItem: Excepción lista para lanzar
+    """
+    exc = DropItem(message)
+    exc.pipeline = pipeline
+    exc.reason = reason
+    if log_level:
+        exc.log_level = log_level
+    return exc
 
 
 class ValidationPipeline:
@@ -13,6 +41,7 @@ class ValidationPipeline:
     como anuncios o elementos promocionales.
     """
 
+    @traced_pipeline
     def process_item(self, item, spider):
         """
         Valida la presencia de campos obligatorios en el item.
@@ -27,14 +56,12 @@ class ValidationPipeline:
         Raises:
             DropItem: Si faltan campos críticos como URL o imagen.
         """
-        adapter = ItemAdapter(item)
-
         # Validación defensiva de campos obligatorios
-        if not adapter.get('url'):
-            raise DropItem("Item sin URL: descartado por ValidationPipeline")
+        if not item.url:
+            raise drop_item('ValidationPipeline', 'missing_url', "Item sin URL: descartado por ValidationPipeline")
 
-        if not adapter.get('image_url'):
-            raise DropItem("Item sin image_url: descartado por ValidationPipeline")
+        if not item.image_url:
+            raise drop_item('ValidationPipeline', 'missing_image', "Item sin image_url: descartado por ValidationPipeline")
 
         return item
 
@@ -45,7 +72,9 @@ class DuplicatesPipeline:
 
     Utiliza un conjunto en memoria para rastrear URLs procesadas durante
     la ejecución del spider, previniendo duplicados y optimizando el
-    rendimiento al evitar re-procesamiento de items idénticos.
+    rendimiento al evitar re-procesamiento de items idénticos. En crawls
+    de varias búsquedas la deduplicación es por búsqueda: un producto que
+    aparece en dos consultas se conserva en ambas.
     """
 
     def __init__(self):
@@ -54,6 +83,7 @@ class DuplicatesPipeline:
         """
         self.urls_seen = set()
 
+    @traced_pipeline
     def process_item(self, item, spider):
         """
         Verifica y registra URLs para prevenir duplicados.
@@ -68,20 +98,20 @@ class DuplicatesPipeline:
         Raises:
             DropItem: Si la URL ya fue procesada anteriormente.
         """
-        adapter = ItemAdapter(item)
-        url = adapter.get('url')
+        url = item.url
 
         # Validación crítica: items sin URL no pueden ser deduplicados
         if not url:
-            raise DropItem("Item sin URL detectado, descartando.")
+            raise drop_item('DuplicatesPipeline', 'missing_url', "Item sin URL detectado, descartando.")
 
-        if url in self.urls_seen:
+        key = (item.query, url)
+        if key in self.urls_seen:
             # Logging de debug para monitoreo de duplicados
-            spider.logger.debug(f"Descartando ítem duplicado: {adapter.get('title', 'N/A')} - {url}")
-            raise DropItem(f"Item duplicado encontrado: {url}")
+            spider.logger.debug(f"Descartando ítem duplicado: {item.title or 'N/A'} - {url}")
+            raise drop_item('DuplicatesPipeline', 'duplicate', f"Item duplicado encontrado: {url}")
         else:
             # Registrar URL nueva y continuar procesamiento
-            self.urls_seen.add(url)
+            self.urls_seen.add(key)
             return item
 
 
@@ -95,6 +125,7 @@ class DataCleaningPipeline:
     para asegurar consistencia y calidad en los datos finales.
     """
 
+    @traced_pipeline
     def process_item(self, item, spider):
         """
         Aplica limpieza y normalización completa al item.
@@ -106,15 +137,13 @@ class DataCleaningPipeline:
         Returns:
             Item: Item con datos limpios y normalizados.
         """
-        adapter = ItemAdapter(item)
-
         # Extraer metadatos de localización para lógica de formateo
-        country_code = adapter.get('country_code', '').upper()
-        currency_code = adapter.get('currency_code')
+        country_code = (item.country_code or '').upper()
+        currency_code = item.currency_code
 
         # Normalización de precios considerando formatos regionales
-        existing_price_numeric = adapter.get('price_numeric')
-        price_str = adapter.get('price')
+        existing_price_numeric = item.price_numeric
+        price_str = item.price
 
         if price_str:
             # Remover caracteres no numéricos preservando separadores
@@ -131,20 +160,20 @@ class DataCleaningPipeline:
                 cleaned_str = cleaned_str.replace(',', '')
 
             try:
-                adapter['price_numeric'] = float(cleaned_str)
-                adapter['currency'] = currency_code
+                item.price_numeric = float(cleaned_str)
+                item.currency = currency_code
             except (ValueError, TypeError):
-                adapter['price_numeric'] = None
-                adapter['currency'] = None
+                item.price_numeric = None
+                item.currency = None
         elif existing_price_numeric is not None:
             # Preservar precio numérico si ya fue establecido por el spider
-            adapter['currency'] = currency_code
+            item.currency = currency_code
         else:
-            adapter['price_numeric'] = None
-            adapter['currency'] = None
+            item.price_numeric = None
+            item.currency = None
 
         # Procesamiento del precio anterior para cálculo de descuentos
-        price_before_str = adapter.get('price_before')
+        price_before_str = item.price_before
         if price_before_str:
             cleaned_before = re.sub(r'[^\d,.]', '', price_before_str)
             if country_code in ['AR', 'ES', 'BR', 'DE', 'FR', 'IT']:
@@ -152,27 +181,27 @@ class DataCleaningPipeline:
             else:
                 cleaned_before = cleaned_before.replace(',', '')
             try:
-                adapter['price_before_numeric'] = float(cleaned_before)
+                item.price_before_numeric = float(cleaned_before)
             except (ValueError, TypeError):
-                adapter['price_before_numeric'] = None
+                item.price_before_numeric = None
         else:
-            adapter['price_before_numeric'] = None
+            item.price_before_numeric = None
 
         # Normalización de ratings con manejo de formatos mixtos
-        rating_str = adapter.get('rating_str')
+        rating_str = item.rating_str
         if rating_str:
             try:
                 # Extraer componente numérica principal
                 numeric_part = rating_str.split(' ')[0]
-                adapter['rating'] = float(numeric_part.replace(',', '.'))
+                item.rating = float(numeric_part.replace(',', '.'))
             except (ValueError, TypeError):
-                adapter['rating'] = 0.0
+                item.rating = 0.0
         else:
-            adapter['rating'] = 0.0
+            item.rating = 0.0
 
         # Normalización avanzada de conteos de reseñas con sufijos
-        reviews_str = adapter.get('reviews_count_str')
-        adapter['reviews_count_raw'] = reviews_str  # Preservar original para debugging
+        reviews_str = item.reviews_count_str
+        item.reviews_count_raw = reviews_str  # Preservar original para debugging
 
         if reviews_str:
             # Priorizar números explícitos entre paréntesis
@@ -194,9 +223,9 @@ class DataCleaningPipeline:
                     else:
                         norm = norm.replace(',', '.')
                 try:
-                    adapter['reviews_count'] = int(float(norm))
+                    item.reviews_count = int(float(norm))
                 except Exception:
-                    adapter['reviews_count'] = 0
+                    item.reviews_count = 0
             else:
                 # Procesamiento de strings complejos sin paréntesis
                 orig = reviews_str
@@ -243,17 +272,17 @@ class DataCleaningPipeline:
 
                     try:
                         val = float(norm)
-                        adapter['reviews_count'] = int(round(val * multiplier))
+                        item.reviews_count = int(round(val * multiplier))
                     except (ValueError, TypeError):
-                        adapter['reviews_count'] = 0
+                        item.reviews_count = 0
 
                     # Monitoreo de valores extremos para calidad de datos
                     try:
-                        if adapter.get('reviews_count', 0) > 1000000:
+                        if item.reviews_count > 1000000:
                             msg = (
                                 f"[DataCleaningPipeline] Conteo de reseñas alto detectado: "
-                                f"raw={reviews_str!r} -> parsed={adapter['reviews_count']} "
-                                f"title={adapter.get('title', 'N/A')!r}"
+                                f"raw={reviews_str!r} -> parsed={item.reviews_count} "
+                                f"title={item.title or 'N/A'!r}"
                             )
                             if spider and hasattr(spider, 'logger'):
                                 spider.logger.warning(msg)
@@ -262,16 +291,146 @@ class DataCleaningPipeline:
                     except Exception:
                         pass  # No interrumpir pipeline por fallos de logging
                 else:
-                    adapter['reviews_count'] = 0
+                    item.reviews_count = 0
         else:
-            adapter['reviews_count'] = 0
+            item.reviews_count = 0
 
-        # Preservar versión display del precio antes de limpieza final
-        adapter['price_display'] = adapter.get('price')
+        # Preservar versión display del precio; los campos crudos no se exportan (ProductItem.to_output)
+        item.price_display = item.price
 
-        # Eliminar campos crudos innecesarios para output final
-        fields_to_remove = ['price', 'rating_str', 'reviews_count_str', 'currency_code', 'country_code']
-        for field in fields_to_remove:
-            adapter.pop(field, None)
+        return item
+
+
+class ProductIndexPipeline:
+    """
+    Pipeline que agrega los productos limpios al índice local de /buscar (productindex.py).
+
+    Corre antes de IncrementalPipeline, así también los productos sin cambios
+    renuevan su `last_seen`. Las filas se escriben en lotes de
+    PRODUCT_INDEX_BATCH items y al cerrar el crawl, que además elimina los
+    productos no vistos en PRODUCT_INDEX_TTL segundos. El item sigue su camino
+    sin cambios.
+
+    Se desactiva con PRODUCT_INDEX_ENABLED = False.
+    """
+
+    def __init__(self, db_file: str = None, batch_size: int = 500, ttl: float = 30 * 86400):
+        self.db_file = db_file
+        self.batch_size = batch_size
+        self.ttl = ttl
+        self.conn = None
+        self.pending = []
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if not settings.getbool('PRODUCT_INDEX_ENABLED', True):
+            raise NotConfigured
+        return cls(
+            settings.get('PRODUCT_INDEX_PATH'),
+            batch_size=settings.getint('PRODUCT_INDEX_BATCH', 500),
+            ttl=settings.getfloat('PRODUCT_INDEX_TTL', 30 * 86400),
+        )
+
+    def open_spider(self, spider):
+        self.stats = spider.crawler.stats
+        self.conn = productindex.connect(self.db_file)
+
+    def close_spider(self, spider):
+        if self.conn is None:
+            return
+        self.flush()
+        pruned = productindex.prune(self.conn, self.ttl)
+        if pruned:
+            self.stats.inc_value('product_index/pruned', pruned)
+        self.conn.close()
+        self.conn = None
+
+    def flush(self):
+        if self.pending:
+            productindex.upsert(self.conn, self.pending)
+            self.stats.inc_value('product_index/upserted', len(self.pending))
+            self.pending = []
+
+    @traced_pipeline
+    def process_item(self, item, spider):
+        """
+        Encola el producto para el índice local.
 
-        return item
\ No newline at end of file
+        Returns:
+            Item: El mismo item
+        """
+        country = (item.country_code or getattr(spider, 'country_code', '') or '').upper()
+        row = productindex.item_row(item.to_output(), country, time.time())
+        if row is not None:
+            self.pending.append(row)
+            if len(self.pending) >= self.batch_size:
+                self.flush()
+        return item
+
+
+class IncrementalPipeline:
+    """
+    Pipeline del modo incremental: sólo deja pasar productos nuevos o cambiados.
+
+    Compara la huella de cada item limpio con la del crawl anterior de la misma
+    búsqueda (cheapy_scraper/fingerprints.py). Los productos sin cambios se
+    descartan en nivel DEBUG con el motivo 'unchanged' y se cuentan (en total
+    y por búsqueda); al cerrar el crawl el conteo se escribe en
+    INCREMENTAL_SUMMARY_PATH para que el worker lo devuelva junto a los items.
+
+    Sólo se activa con INCREMENTAL_ENABLED (el worker lo pasa con `-s`).
+    """
+
+    def __init__(self, store: FingerprintStore, summary_path: str = None):
+        self.store = store
+        self.summary_path = summary_path
+        self.counts = {'new': 0, 'changed': 0, 'unchanged': 0}
+        self.unchanged_by_query = {}
+        self.scopes = {}
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if not settings.getbool('INCREMENTAL_ENABLED'):
+            raise NotConfigured
+        store = FingerprintStore(
+            settings.get('INCREMENTAL_DB_PATH') or default_db_path(),
+            max_entries=settings.getint('INCREMENTAL_MAX_ENTRIES', 500000),
+            ttl=settings.getfloat('INCREMENTAL_TTL', 7 * 86400),
+        )
+        return cls(store, settings.get('INCREMENTAL_SUMMARY_PATH'))
+
+    def open_spider(self, spider):
+        self.stats = spider.crawler.stats
+        self.store.open()
+
+    def close_spider(self, spider):
+        self.store.close()
+        if self.summary_path:
+            with open(self.summary_path, 'w', encoding='utf-8') as f:
+                json.dump(dict(self.counts, unchanged_by_query=self.unchanged_by_query), f)
+
+    @traced_pipeline
+    def process_item(self, item, spider):
+        """
+        Clasifica el item como nuevo, cambiado o sin cambios.
+
+        Returns:
+            Item: El item si es nuevo o cambió
+
+        Raises:
+            DropItem: Si el producto no cambió desde el crawl anterior
+        """
+        url = item.url
+        scope = self.scopes.get(item.query)
+        if scope is None:
+            scope = self.scopes[item.query] = search_scope(spider, item.query)
+        status = self.store.check(product_key(scope, url), fingerprint(item))
+        self.counts[status] += 1
+        self.stats.inc_value(f'incremental/{status}')
+        if status == 'unchanged':
+            key = item.query or ''
+            self.unchanged_by_query[key] = self.unchanged_by_query.get(key, 0) + 1
+            raise drop_item('IncrementalPipeline', 'unchanged', f"Producto sin cambios: {url}", log_level='DEBUG')
+        return item
@@ -0,0 +1,115 @@
+"""
+Estado de sesión por tienda en Redis, reutilizado entre crawls y workers.
+
+Cada crawl empezaba con el cookie jar vacío y un contexto de navegador nuevo:
+las tiendas repetían en cada búsqueda el banner de consentimiento, la
+redirección por país y a veces la verificación anti-bot, con sus viajes y su
+render extra. SessionMiddleware guarda el estado de la sesión de cada tienda
+(spider y país) y lo carga al empezar el siguiente crawl:
+
+    - Spiders por HTTP: las cookies del jar de CookiesMiddleware.
+    - Spiders con Playwright: el `storage_state` del contexto del navegador
+      (cookies y localStorage), que se pasa al crear el contexto.
+
+Ambos se guardan con el formato de `storage_state` de Playwright
+({'cookies': [...], 'origins': [...]}), así una sesión es la misma para
+cualquiera de los dos tipos de crawl.
+
+La clave `session:{spider}:{país}` vence a los SESSION_TTL segundos de creada
+aunque se siga actualizando (rotación): las sesiones no se vuelven eternas ni
+acumulan marcas de la tienda. Una sesión que recibe un bloqueo se descarta.
+"""
+
+import json
+from http.cookiejar import Cookie
+
+KEY_PREFIX = "session"
+
+
+def session_key(spider_name: str, country: str = None) -> str:
+    """Clave de Redis de la sesión de una tienda."""
+    return f"{KEY_PREFIX}:{spider_name}:{(country or '').upper()}"
+
+
+def cookie_to_state(cookie: Cookie) -> dict:
+    """Convierte una cookie de `http.cookiejar` al formato de `storage_state` de Playwright."""
+    return {
+        'name': cookie.name,
+        'value': cookie.value or '',
+        'domain': cookie.domain,
+        'path': cookie.path or '/',
+        'expires': cookie.expires if cookie.expires else -1,
+        'httpOnly': cookie.has_nonstandard_attr('HttpOnly'),
+        'secure': bool(cookie.secure),
+        'sameSite': 'Lax',
+    }
+
+
+def state_to_cookie(data: dict) -> Cookie:
+    """Convierte una cookie de `storage_state` de Playwright a `http.cookiejar.Cookie`."""
+    domain = data['domain']
+    expires = int(data['expires']) if data.get('expires', -1) > 0 else None
+    return Cookie(
+        version=0, name=data['name'], value=data['value'], port=None, port_specified=False,
+        domain=domain, domain_specified=domain.startswith('.'), domain_initial_dot=domain.startswith('.'),
+        path=data.get('path') or '/', path_specified=True, secure=bool(data.get('secure')),
+        expires=expires, discard=expires is None, comment=None, comment_url=None,
+        rest={'HttpOnly': None} if data.get('httpOnly') else {},
+    )
+
+
+def jar_to_state(jar) -> dict:
+    """`storage_state` con las cookies de un CookieJar de Scrapy."""
+    return {'cookies': [cookie_to_state(cookie) for cookie in jar.jar], 'origins': []}
+
+
+def load_into_jar(jar, state: dict) -> int:
+    """
+    Agrega las cookies de un `storage_state` a un CookieJar de Scrapy.
+
+    Returns:
+        int: Cookies cargadas
+    """
+    cookies = state.get('cookies') or []
+    for data in cookies:
+        jar.set_cookie(state_to_cookie(data))
+    return len(cookies)
+
+
+class SessionStore:
+    """
+    Sesiones de las tiendas guardadas en Redis.
+
+    Args:
+        client: Cliente redis.asyncio
+        ttl: Segundos de vida de una sesión desde que se creó
+    """
+
+    def __init__(self, client, ttl: int):
+        self.client = client
+        self.ttl = ttl
+
+    async def load(self, key: str):
+        """
+        Lee una sesión.
+
+        Returns:
+            dict or None: `storage_state` guardado, o None si no hay (o venció)
+        """
+        data = await self.client.get(key)
+        return json.loads(data) if data else None
+
+    async def save(self, key: str, state: dict):
+        """
+        Guarda el estado de una sesión sin extender su vida: una sesión nueva
+        vence a los `ttl` segundos y una existente conserva su vencimiento.
+        """
+        value = json.dumps(state, separators=(',', ':'))
+        pipe = self.client.pipeline(transaction=True)
+        pipe.set(key, value, ex=self.ttl, nx=True)
+        pipe.set(key, value, xx=True, keepttl=True)
+        await pipe.execute()
+
+    async def discard(self, key: str):
+        """Descarta una sesión (la tienda la bloqueó): el próximo crawl empieza una nueva."""
+        await self.client.delete(key)
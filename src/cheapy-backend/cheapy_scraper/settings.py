@@ -7,11 +7,28 @@
 #     https://docs.scrapy.org/en/latest/topics/downloader-middleware.html
 #     https://docs.scrapy.org/en/latest/topics/spider-middleware.html
 
+import os
+
+from scrapy.settings import default_settings
+
 BOT_NAME = "cheapy_scraper"
 
 SPIDER_MODULES = ["cheapy_scraper.spiders"]
 NEWSPIDER_MODULE = "cheapy_scraper.spiders"
 
+# Cada crawl importa sólo el módulo de su spider (cheapy_scraper/spiderloader.py).
+# Los spiders nuevos deben registrarse aquí; los ausentes se buscan en SPIDER_MODULES.
+SPIDER_LOADER_CLASS = "cheapy_scraper.spiderloader.LazySpiderLoader"
+SPIDER_REGISTRY = {
+    'mercadolibre': 'cheapy_scraper.spiders.mercadolibre.MercadoLibreSpider',
+    'fravega': 'cheapy_scraper.spiders.fravega.FravegaSpider',
+    'amazon': 'cheapy_scraper.spiders.amazon_spider.AmazonSpider',
+    'ebay': 'cheapy_scraper.spiders.ebay.EbaySpider',
+    'aliexpress': 'cheapy_scraper.spiders.aliexpress.AliexpressSpider',
+    'megatone': 'cheapy_scraper.spiders.megatone.MegatoneSpider',
+    'refresh': 'cheapy_scraper.spiders.refresh.ProductRefreshSpider',
+}
+
 # Configuración anti-bloqueo para scraping en producción
 # Implementa simulación realista de navegador y limitación de tasa para evitar detección
 
@@ -41,14 +58,86 @@ DEFAULT_REQUEST_HEADERS = {
     'Upgrade-Insecure-Requests': '1',
 }
 
-# Middlewares de downloader para rotación de user agent
+# Middlewares de downloader: perfil de arranque (sólo con STARTUP_PROFILE_PATH), tienda falsa
+# para pruebas de carga, rotación de user agent, detección de bloqueos, sesiones por tienda y
+# límite de tasa global por tienda. BlockDetectorMiddleware va después de RetryMiddleware (550)
+# en el orden: ve cada respuesta antes que él, así un captcha no se reintenta. SessionMiddleware
+# va antes de CookiesMiddleware (700) para cargar la sesión guardada en su jar.
 DOWNLOADER_MIDDLEWARES = {
+   'cheapy_scraper.middlewares.StartupProfilerMiddleware': 10,
+   'cheapy_scraper.middlewares.MockStoreMiddleware': 50,
    'scrapy.downloadermiddlewares.useragent.UserAgentMiddleware': 500,
+   'cheapy_scraper.middlewares.BlockDetectorMiddleware': 560,
+   'cheapy_scraper.middlewares.SessionMiddleware': 690,
+   'cheapy_scraper.middlewares.StoreRateLimitMiddleware': 950,
+}
+
+# Captchas y páginas de verificación (blocking.py): se descartan, cierran el crawl y alimentan
+# el circuit breaker compartido de la tienda. Marcadores y umbrales en config.py (BLOCK_*).
+BLOCK_DETECTION_ENABLED = True
+
+# Sesión de cada tienda (cookies o storage_state de Playwright) compartida en Redis entre
+# crawls y workers (cheapy_scraper/sessions.py). Cada sesión rota a los SESSION_TTL segundos
+# de creada, o antes si la tienda la bloquea.
+SESSION_ENABLED = True
+SESSION_TTL = 4 * 3600
+
+# Límite de tasa compartido en Redis por todos los crawls de la misma tienda.
+# Los presupuestos por tienda están en STORE_RATE_LIMITS (config.py).
+RATELIMIT_ENABLED = True
+
+# Control adaptativo de concurrencia y delay por tienda (cheapy_scraper.extensions.AdaptiveConcurrency).
+# Parte de la última tasa buena guardada en Redis y se ajusta con la latencia y los bloqueos observados.
+EXTENSIONS = {
+    'cheapy_scraper.extensions.AdaptiveConcurrency': 500,
+    'cheapy_scraper.extensions.SpiderMetrics': 510,
+    'cheapy_scraper.extensions.CrawlTracing': 520,
 }
+ADAPTIVE_ENABLED = True
+ADAPTIVE_MIN_DELAY = 0.25
+ADAPTIVE_MAX_DELAY = 30
+ADAPTIVE_MAX_CONCURRENCY = 8
+ADAPTIVE_TARGET_LATENCY = 5
+# Las tiendas sin estado guardado arrancan por debajo del máximo, con margen para subir
+CONCURRENT_REQUESTS_PER_DOMAIN = 4
+# Un estado frenado por bloqueos se recupera un paso por cada ADAPTIVE_RECOVERY_SECONDS
+ADAPTIVE_RECOVERY_SECONDS = 600
+# Timeout de las requests HTTP: ADAPTIVE_TIMEOUT_FACTOR × p90 de latencia de la tienda (con al
+# menos ADAPTIVE_TIMEOUT_MIN_SAMPLES latencias), entre ADAPTIVE_MIN_TIMEOUT y DOWNLOAD_TIMEOUT
+ADAPTIVE_TIMEOUT_FACTOR = 3
+ADAPTIVE_MIN_TIMEOUT = 5
+ADAPTIVE_TIMEOUT_MIN_SAMPLES = 5
+
+# La consola telnet y el control remoto de Scrapy no se usan: cada crawl es un proceso corto
+# lanzado por el worker, y el control remoto importa aiohttp (~0,1 s de arranque por crawl).
+# Se quitan de la base porque Scrapy importa las extensiones aunque estén en None.
+EXTENSIONS_BASE = {
+    path: order for path, order in default_settings.EXTENSIONS_BASE.items()
+    if path not in ('scrapy.extensions.telnet.TelnetConsole', 'scrapy.extensions.remote_control.RemoteControl')
+}
+
+# Métricas del crawl (items, descartes, caché, Playwright) publicadas en Redis al cerrar el spider
+SPIDER_METRICS_ENABLED = True
 
 # Reactor AsyncIO para compatibilidad con librerías async modernas
 TWISTED_REACTOR = "twisted.internet.asyncioreactor.AsyncioSelectorReactor"
 
+# Spans de parseo por respuesta; sólo activo cuando el worker pasa TRACE_ID (ver tracing.py).
+# Checkpoints por página en Redis para reanudar los reintentos de una tarea; sólo activo cuando
+# el worker pasa CHECKPOINT_KEY (cheapy_scraper/checkpoint.py). Su orden es menor que el de los
+# middlewares de Scrapy que filtran requests (profundidad, largo de URL): ve la salida del spider
+# después de ellos y guarda sólo las requests que se programan.
+SPIDER_MIDDLEWARES = {
+    'cheapy_scraper.middlewares.CheckpointMiddleware': 540,
+    'cheapy_scraper.middlewares.ParseTracingMiddleware': 950,
+}
+CHECKPOINT_KEY = None
+CHECKPOINT_TTL = 3600
+
+# Backend de parseo HTML de los spiders con ExtractionSpec (cheapy_scraper/htmlbackends.py):
+# 'parsel' (lxml, por defecto) o 'selectolax' (lexbor, requiere instalar selectolax)
+HTML_PARSER_BACKEND = os.environ.get('CHEAPY_HTML_PARSER_BACKEND', 'parsel')
+
 # Item processing pipelines with execution order
 ITEM_PIPELINES = {
     # Validation pipeline: Ensures basic item integrity (90)
@@ -59,8 +148,52 @@ ITEM_PIPELINES = {
 
     # Data cleaning pipeline: Normalizes and cleans extracted data (300)
     'cheapy_scraper.pipelines.DataCleaningPipeline': 300,
+
+    # Product index pipeline: Feeds the local search index behind /buscar (350)
+    'cheapy_scraper.pipelines.ProductIndexPipeline': 350,
+
+    # Incremental pipeline: Emits only new or changed products (400, only with INCREMENTAL_ENABLED)
+    'cheapy_scraper.pipelines.IncrementalPipeline': 400,
+}
+
+# Modo incremental (cheapy_scraper/fingerprints.py): huellas por búsqueda en SQLite, con
+# a lo sumo INCREMENTAL_MAX_ENTRIES filas y vencimiento a los INCREMENTAL_TTL segundos.
+# El worker lo activa por crawl con `-s INCREMENTAL_ENABLED=1`.
+INCREMENTAL_ENABLED = False
+INCREMENTAL_MAX_ENTRIES = 500000
+INCREMENTAL_TTL = 7 * 86400
+
+# Índice local de productos (productindex.py) que /buscar consulta mientras corre el crawl.
+# Los items se escriben en lotes de PRODUCT_INDEX_BATCH; los productos no vistos en
+# PRODUCT_INDEX_TTL segundos se eliminan al cerrar. Por defecto en productos.db.
+PRODUCT_INDEX_ENABLED = True
+PRODUCT_INDEX_PATH = None
+PRODUCT_INDEX_BATCH = 500
+PRODUCT_INDEX_TTL = 30 * 86400
+
+# Validadores HTTP (ETag, Last-Modified, hash del cuerpo) del spider `refresh` de páginas de
+# producto (cheapy_scraper/validators.py); los de URLs no consultadas en REFRESH_VALIDATORS_TTL
+# segundos se eliminan. Por defecto en validators.db junto a la caché HTTP.
+REFRESH_VALIDATORS_PATH = None
+REFRESH_VALIDATORS_TTL = 30 * 86400
+
+# Salida del crawl que lee el worker (`-o -:jsonlines`): ProductItem.to_output() en JSON compacto
+FEED_EXPORTERS = {
+    'jsonlines': 'cheapy_scraper.exporters.ProductJsonLinesExporter',
 }
 
 # Retry configuration for resilience against temporary failures
 RETRY_ENABLED = True
 RETRY_TIMES = 2
+
+# Caché HTTP compartida entre workers para páginas de resultados de búsqueda.
+# Las respuestas se guardan comprimidas en SQLite con TTL por tienda (HTTPCACHE_TTL_BY_STORE
+# en config.py) y desalojo LRU al superar HTTPCACHE_MAX_BYTES.
+HTTPCACHE_ENABLED = True
+HTTPCACHE_STORAGE = 'cheapy_scraper.httpcache.SharedSqliteCacheStorage'
+HTTPCACHE_MAX_BYTES = 200 * 1024 * 1024
+
+# Tienda falsa para pruebas de carga (benchmarks/mock_store.py). Si está definida, todas las
+# requests de las tiendas se redirigen a ese servidor; sin Chromium si MOCK_STORE_PLAYWRIGHT=0.
+MOCK_STORE_URL = os.environ.get('CHEAPY_MOCK_STORE_URL')
+MOCK_STORE_PLAYWRIGHT = os.environ.get('CHEAPY_MOCK_STORE_PLAYWRIGHT', '1') != '0'
@@ -0,0 +1,72 @@
+"""
+Cargador de spiders que importa sólo el spider pedido.
+
+El SpiderLoader de Scrapy importa todos los módulos de SPIDER_MODULES al
+arrancar cada crawl, así que un crawl de MercadoLibre paga también los imports
+de los spiders renderizados y de sus dependencias. Cada tarea del worker lanza
+un proceso nuevo, y ese costo se repite en todas.
+
+LazySpiderLoader resuelve los nombres con el registro SPIDER_REGISTRY
+(settings.py) e importa únicamente el módulo del spider que se va a correr.
+Un nombre ausente del registro (por ejemplo, un spider recién creado) se busca
+con el SpiderLoader de Scrapy, que recorre todos los módulos como antes.
+
+Por la misma razón los spiders renderizados importan scrapy_playwright dentro
+de los métodos que arman sus requests, y no al importar el módulo: las
+herramientas que cargan todos los spiders (`scrapy list`, el benchmark de
+parseo) tampoco pagan la pila de Playwright. El tiempo de arranque de cada
+spider se mide con `python -m benchmarks.startup`.
+"""
+
+from scrapy.spiderloader import SpiderLoader
+from scrapy.utils.misc import load_object
+
+
+class LazySpiderLoader:
+    """
+    Implementación de SPIDER_LOADER_CLASS basada en un registro nombre -> clase.
+
+    Args:
+        settings: Settings de Scrapy (usa SPIDER_REGISTRY y, como respaldo, SPIDER_MODULES)
+    """
+
+    def __init__(self, settings):
+        self.settings = settings
+        self.registry = dict(settings.getdict('SPIDER_REGISTRY'))
+        self._loaded = {}
+        self._fallback = None
+
+    @classmethod
+    def from_settings(cls, settings):
+        return cls(settings)
+
+    def _full_loader(self) -> SpiderLoader:
+        """SpiderLoader de Scrapy, creado sólo si hace falta recorrer todos los módulos."""
+        if self._fallback is None:
+            self._fallback = SpiderLoader.from_settings(self.settings)
+        return self._fallback
+
+    def load(self, spider_name: str):
+        """
+        Retorna la clase del spider, importando sólo su módulo.
+
+        Raises:
+            KeyError: Si el spider no está registrado ni en SPIDER_MODULES
+        """
+        if spider_name in self._loaded:
+            return self._loaded[spider_name]
+        path = self.registry.get(spider_name)
+        if path is None:
+            return self._full_loader().load(spider_name)
+        spidercls = load_object(path)
+        if getattr(spidercls, 'name', None) != spider_name:
+            raise KeyError(f"SPIDER_REGISTRY: {path} se llama {spidercls.name!r}, no {spider_name!r}")
+        self._loaded[spider_name] = spidercls
+        return spidercls
+
+    def list(self) -> list:
+        return list(self.registry)
+
+    def find_by_request(self, request) -> list:
+        # Requiere conocer los dominios de todos los spiders: se importan todos
+        return self._full_loader().find_by_request(request)
@@ -6,6 +6,6 @@ plataformas de e-commerce, junto con utilidades compartidas.
 """
 
 # Imports centralizados para facilitar el uso de spiders
-from .base_spider import BaseCheapySpider
+from .base_spider import BaseCheapySpider, parse_queries
 
-__all__ = ['BaseCheapySpider']
\ No newline at end of file
+__all__ = ['BaseCheapySpider', 'parse_queries']
\ No newline at end of file
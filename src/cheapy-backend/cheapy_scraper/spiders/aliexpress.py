@@ -10,8 +10,7 @@ import scrapy
 from urllib.parse import urlencode, urlparse, urlunparse, parse_qs
 from cheapy_scraper.items import ProductItem
 from config import COUNTRY_CURRENCIES
-from scrapy_playwright.page import PageMethod
-from .base_spider import BaseCheapySpider
+from .base_spider import BaseCheapySpider, parse_queries
 
 
 class AliexpressSpider(BaseCheapySpider):
@@ -37,23 +36,26 @@ class AliexpressSpider(BaseCheapySpider):
         }
     }
 
-    def __init__(self, query="", country="AR", **kwargs):
+    def __init__(self, query="", country="AR", queries=None, **kwargs):
         """
         Inicializa el spider con parámetros de búsqueda y configuración regional.
 
         Args:
-            query: Término de búsqueda para consulta de productos (requerido)
+            query: Término de búsqueda para consulta de productos
             country: Código de país para búsqueda localizada y moneda
+            queries: Lista JSON de búsquedas para resolver varias en un mismo crawl
 
         Raises:
-            ValueError: Si no se proporciona el parámetro query
+            ValueError: Si no se proporciona ninguna búsqueda
         """
-        if not query:
+        queries = parse_queries(query, queries)
+        if not queries:
             raise ValueError("El parámetro query es requerido.")
 
         # Inicializar clase base con configuración de país
         super().__init__(country=country, **kwargs)
-        self.query = query
+        self.queries = queries
+        self.query = queries[0]
 
         # AliExpress usa principalmente USD, pero intenta moneda específica del país
         self.currency = COUNTRY_CURRENCIES.get(self.country_code, 'USD')
@@ -65,17 +67,11 @@ class AliexpressSpider(BaseCheapySpider):
         })
 
         # Construir URL inicial de búsqueda con parámetros de consulta
+        # ('g=y' es requerido para la carga de resultados)
         base_url = "https://www.aliexpress.com/wholesale"
-        params = {
-            'SearchText': self.query,
-            'page': 1,
-            'g': 'y'  # Parámetro requerido para carga de resultados
-        }
-
-        self.start_urls = [f"{base_url}?{urlencode(params)}"]
-        self.current_page = 1
+        self.start_urls = [f"{base_url}?{urlencode({'SearchText': q, 'page': 1, 'g': 'y'})}" for q in self.queries]
 
-        self.logger.info(f"Inicializando spider de AliExpress para consulta: {self.query}")
+        self.logger.info(f"Inicializando spider de AliExpress para consultas: {self.queries}")
 
     def normalize_url(self, url):
         """
@@ -108,7 +104,11 @@ class AliexpressSpider(BaseCheapySpider):
         Args:
             response: Scrapy response object with rendered HTML.
         """
-        self.logger.info(f"Parsing page {self.current_page}/{self.MAX_PAGES} - {response.url}")
+        from scrapy_playwright.page import PageMethod
+
+        query = response.meta.get('query', self.query)
+        page = response.meta.get('page', 1)
+        self.logger.info(f"Parsing page {page}/{self.MAX_PAGES} for '{query}' - {response.url}")
 
         # Extract product containers with fallback selectors
         item_containers = response.css('div[data-spm="product_list"]')
@@ -117,7 +117,7 @@ class AliexpressSpider(BaseCheapySpider):
 
         # Debug: Save HTML if no items found
         if not item_containers:
-            filename = f'aliexpress_debug_page_{self.current_page}.html'
+            filename = f'aliexpress_debug_page_{page}.html'
             with open(filename, 'w', encoding='utf-8') as f:
                 f.write(response.text)
             self.logger.critical(
@@ -163,38 +163,39 @@ class AliexpressSpider(BaseCheapySpider):
             normalized_url = self.normalize_url(link)
 
             product = ProductItem()
-            product['title'] = title.strip() if title else None
-            product['url'] = normalized_url
-            product['image_url'] = image_url
-            product['source'] = self.name
-            product['price'] = price_current.strip()
-            product['rating_str'] = rating_str
-            product['reviews_count_str'] = reviews_count_str
-            product['currency_code'] = self.currency
-            product['country_code'] = self.country_code
+            product.query = query
+            product.title = title.strip() if title else None
+            product.url = normalized_url
+            product.image_url = image_url
+            product.source = self.name
+            product.price = price_current.strip()
+            product.rating_str = rating_str
+            product.reviews_count_str = reviews_count_str
+            product.currency_code = self.currency
+            product.country_code = self.country_code
 
             yield product
 
         # Pagination logic using page parameter
-        if self.current_page < self.MAX_PAGES:
-            self.current_page += 1
-
+        if page < self.MAX_PAGES:
             # Parse current URL and update page parameter
             parsed_url = urlparse(response.url)
             query_params = parse_qs(parsed_url.query)
 
-            query_params['page'] = [str(self.current_page)]
+            query_params['page'] = [str(page + 1)]
 
             new_query = urlencode(query_params, doseq=True)
             next_page_url = urlunparse(parsed_url._replace(query=new_query, fragment=''))
 
-            self.logger.info(f"Calculated next AliExpress URL (Page {self.current_page})")
+            self.logger.info(f"Calculated next AliExpress URL (Page {page + 1})")
 
             yield scrapy.Request(
                 url=next_page_url,
                 headers=self.custom_headers,
                 callback=self.parse,
                 meta={
+                    'query': query,
+                    'page': page + 1,
                     'playwright': True,
                     'playwright_page_methods': [
                         PageMethod('wait_for_timeout', 2000),  # Wait 2 seconds for content load
@@ -209,12 +210,15 @@ class AliexpressSpider(BaseCheapySpider):
         Ensures all requests use Playwright for JavaScript rendering
         with appropriate wait times for dynamic content loading.
         """
-        for url in self.start_urls:
+        from scrapy_playwright.page import PageMethod
+
+        for query, url in zip(self.queries, self.start_urls):
             yield scrapy.Request(
                 url,
                 headers=self.custom_headers,
                 callback=self.parse,
                 meta={
+                    'query': query,
                     'playwright': True,
                     'playwright_page_methods': [
                         PageMethod('wait_for_timeout', 2000),  # Initial 2-second wait
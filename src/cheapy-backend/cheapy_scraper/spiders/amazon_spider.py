@@ -7,9 +7,9 @@ de múltiples dominios de Amazon con resultados de búsqueda localizados.
 """
 
 import scrapy
+from cheapy_scraper.items import ProductItem
 from config import AMAZON_DOMAINS, COUNTRY_CURRENCIES
-from scrapy_playwright.page import PageMethod
-from .base_spider import BaseCheapySpider
+from .base_spider import BaseCheapySpider, parse_queries
 
 
 class AmazonSpider(BaseCheapySpider):
@@ -34,24 +34,26 @@ class AmazonSpider(BaseCheapySpider):
         }
     }
 
-    def __init__(self, query="", country="US", **kwargs):
+    def __init__(self, query="", country="US", queries=None, **kwargs):
         """
         Inicializa el spider con parámetros de búsqueda y configuración regional.
 
         Args:
             query: Término de búsqueda para consulta de productos
+            queries: Lista JSON de búsquedas para resolver varias en un mismo crawl
             country: Código de país para selección de dominio de Amazon (ej. 'US', 'BR', 'MX')
         """
         # Inicializar clase base con configuración de país
         super().__init__(country=country, **kwargs)
-        self.query = query
+        self.queries = parse_queries(query, queries) or [""]
+        self.query = self.queries[0]
 
         # Obtener dominio y moneda desde configuración centralizada
         domain = AMAZON_DOMAINS.get(self.country_code, AMAZON_DOMAINS['US'])
         self.currency = COUNTRY_CURRENCIES.get(self.country_code, 'USD')
 
         # Construir URL de búsqueda para el dominio apropiado
-        self.start_urls = [f"https://www.amazon.{domain}/s?k={self.query.replace(' ', '+')}"]
+        self.start_urls = [f"https://www.amazon.{domain}/s?k={q.replace(' ', '+')}" for q in self.queries]
 
         self.logger.info(f"Inicializando spider de Amazon para país: {self.country_code}, dominio: {domain}")
 
@@ -62,13 +64,16 @@ class AmazonSpider(BaseCheapySpider):
         Configura Playwright para esperar a que se carguen los resultados de búsqueda
         antes del parsing, asegurando que el contenido dinámico esté disponible.
         """
+        from scrapy_playwright.page import PageMethod
+
         headers = self.get_default_headers()
 
-        for url in self.start_urls:
+        for query, url in zip(self.queries, self.start_urls):
             yield scrapy.Request(
                 url,
                 headers=headers,
                 meta={
+                    'query': query,
                     'playwright': True,
                     'playwright_page_methods': [
                         PageMethod('wait_for_selector', 'div[data-component-type="s-search-result"]', timeout=45000),
@@ -137,14 +142,15 @@ class AmazonSpider(BaseCheapySpider):
                 'div.a-row.a-size-small a span[aria-hidden="true"]::text'
             ).get()
 
-            yield {
-                'title': title,
-                'url': response.urljoin(product_url) if product_url and 'javascript' not in product_url else None,
-                'image_url': product.css('img.s-image::attr(src)').get(),
-                'source': self.name,
-                'price': price_full_str,
-                'rating_str': rating_str.split(' ')[0] if rating_str else None,
-                'reviews_count_str': reviews_count_str,
-                'currency_code': self.currency,
-                'country_code': self.country_code
-            }
\ No newline at end of file
+            yield ProductItem(
+                query=response.meta.get('query', self.query),
+                title=title,
+                url=response.urljoin(product_url) if product_url and 'javascript' not in product_url else None,
+                image_url=product.css('img.s-image::attr(src)').get(),
+                source=self.name,
+                price=price_full_str,
+                rating_str=rating_str.split(' ')[0] if rating_str else None,
+                reviews_count_str=reviews_count_str,
+                currency_code=self.currency,
+                country_code=self.country_code
+            )
\ No newline at end of file
@@ -3,10 +3,37 @@ Clase base para spiders de Cheapy.
 Proporciona configuración común de headers y utilidades compartidas.
 """
 
+import json
+
 from scrapy import Spider
 from config import ACCEPT_LANGUAGE_BY_COUNTRY
 
 
+def parse_queries(query: str = "", queries=None) -> list:
+    """
+    Retorna las búsquedas que atiende un crawl.
+
+    Un mismo crawl puede resolver varias búsquedas (`-a queries='["tv", "celular"]'`)
+    compartiendo proceso, navegador y conexiones. Cada request lleva su búsqueda
+    en `meta['query']` y cada item la informa en `ProductItem.query`.
+
+    Args:
+        query: Búsqueda única (argumento clásico `-a query=...`)
+        queries: Lista de búsquedas, o su representación JSON
+
+    Returns:
+        list: Búsquedas sin vacíos ni repetidas, en el orden recibido
+    """
+    if isinstance(queries, str):
+        queries = json.loads(queries) if queries.strip() else []
+    result = []
+    for q in list(queries or []) + [query]:
+        q = (q or '').strip()
+        if q and q not in result:
+            result.append(q)
+    return result
+
+
 class BaseCheapySpider(Spider):
     """
     Clase base para todos los spiders de Cheapy.
@@ -37,6 +64,11 @@ class BaseCheapySpider(Spider):
             ACCEPT_LANGUAGE_BY_COUNTRY.get("DEFAULT", "en-US,en;q=0.9")
         )
 
+    async def start(self):
+        """Scrapy 2.13+ usa start() en lugar de start_requests(); se delega en este último."""
+        for request in self.start_requests():
+            yield request
+
     def get_default_headers(self):
         """
         Retorna los headers HTTP comunes para todas las requests.
@@ -7,9 +7,9 @@ filtrado de contenido para evitar items promocionales genéricos.
 """
 
 import scrapy
+from cheapy_scraper.items import ProductItem
 from config import EBAY_DOMAINS, COUNTRY_CURRENCIES
-from scrapy_playwright.page import PageMethod
-from .base_spider import BaseCheapySpider
+from .base_spider import BaseCheapySpider, parse_queries
 
 
 class EbaySpider(BaseCheapySpider):
@@ -34,24 +34,26 @@ class EbaySpider(BaseCheapySpider):
         }
     }
 
-    def __init__(self, query="", country="US", **kwargs):
+    def __init__(self, query="", country="US", queries=None, **kwargs):
         """
         Inicializa el spider con parámetros de búsqueda y configuración regional.
 
         Args:
             query: Término de búsqueda para consulta de productos
+            queries: Lista JSON de búsquedas para resolver varias en un mismo crawl
             country: Código de país para selección de dominio de eBay (ej. 'US', 'UK', 'DE')
         """
         # Inicializar clase base con configuración de país
         super().__init__(country=country, **kwargs)
-        self.query = query
+        self.queries = parse_queries(query, queries) or [""]
+        self.query = self.queries[0]
 
         # Obtener dominio y moneda desde configuración centralizada
         domain = EBAY_DOMAINS.get(self.country_code, EBAY_DOMAINS['US'])
         self.currency = COUNTRY_CURRENCIES.get(self.country_code, 'USD')
 
         # Construir URL de búsqueda para el dominio apropiado
-        self.start_urls = [f"https://www.ebay.{domain}/sch/i.html?_nkw={self.query.replace(' ', '+')}"]
+        self.start_urls = [f"https://www.ebay.{domain}/sch/i.html?_nkw={q.replace(' ', '+')}" for q in self.queries]
 
         self.logger.info(f"Inicializando spider de eBay para país: {self.country_code}, dominio: {domain}")
 
@@ -62,13 +64,16 @@ class EbaySpider(BaseCheapySpider):
         Configura Playwright para esperar a que se carguen las tarjetas de productos,
         asegurando que el contenido dinámico esté disponible antes del parsing.
         """
+        from scrapy_playwright.page import PageMethod
+
         headers = self.get_default_headers()
 
-        for url in self.start_urls:
+        for query, url in zip(self.queries, self.start_urls):
             yield scrapy.Request(
                 url,
                 headers=headers,
                 meta={
+                    'query': query,
                     'playwright': True,
                     'playwright_page_methods': [
                         PageMethod('wait_for_selector', 'li.s-card', timeout=30000)
@@ -97,14 +102,15 @@ class EbaySpider(BaseCheapySpider):
                 continue
 
             # Extract product data for valid items
-            yield {
-                'title': title.strip() if title else None,
-                'url': product.css('a.image-treatment::attr(href)').get(),
-                'image_url': product.css('img.s-card__image::attr(src)').get(),
-                'source': self.name,
-                'price': product.css('span.s-card__price::text').get(),
-                'rating_str': None,  # Not available on search results page
-                'reviews_count_str': None,  # Not available on search results page
-                'currency_code': self.currency,
-                'country_code': self.country_code,
-            }
\ No newline at end of file
+            yield ProductItem(
+                query=response.meta.get('query', self.query),
+                title=title.strip() if title else None,
+                url=product.css('a.image-treatment::attr(href)').get(),
+                image_url=product.css('img.s-card__image::attr(src)').get(),
+                source=self.name,
+                price=product.css('span.s-card__price::text').get(),
+                rating_str=None,  # Not available on search results page
+                reviews_count_str=None,  # Not available on search results page
+                currency_code=self.currency,
+                country_code=self.country_code,
+            )
\ No newline at end of file
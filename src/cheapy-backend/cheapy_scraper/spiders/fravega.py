@@ -8,10 +8,14 @@ extracción de calificaciones desde su estructura HTML específica.
 
 import re
 import scrapy
+from scrapy import signals
+from cheapy_scraper.extraction import ExtractionSpec
+from cheapy_scraper.items import ProductItem
 from config import COUNTRY_CURRENCIES
+from .base_spider import BaseCheapySpider, parse_queries
 
 
-class FravegaSpider(scrapy.Spider):
+class FravegaSpider(BaseCheapySpider):
     """
     Spider de Scrapy para la plataforma de comercio electrónico Frávega.
 
@@ -23,32 +27,76 @@ class FravegaSpider(scrapy.Spider):
     name = "fravega"
     MAX_PAGES = 2
 
-    def __init__(self, query="", country="AR", **kwargs):
+    # Campos de la página de resultados; cada lista es una cadena de selectores
+    # en orden de prioridad (ver cheapy_scraper/extraction.py)
+    EXTRACTION = ExtractionSpec({
+        'products': ['article[data-test-id="result-item"]'],
+        'url': ['a::attr(href)'],
+        'title': ['div[data-test-id="article-title"] span::text'],
+        'image_url': ['picture img::attr(src)'],
+        # Selector primario con atributos de datos
+        'rating': ['[data-test-id="product-rating"] ::text'],
+        # Respaldo: sólo el primer aria-label del producto (ver parse)
+        'rating_label': ['[aria-label]::attr(aria-label)'],
+        # Alternativa: selectores de calificación genéricos
+        'rating_generic': ['.rating::text, .product-rating::text, .stars::text'],
+        'reviews_count': [
+            '[data-test-id="product-reviews"] ::text',
+            'span.reviews::text, .review-count::text, .product-review-count::text',
+            # Último recurso: cualquier texto del producto con palabras de reseñas o ventas
+            ('::text', r'(?i).*(?:opinione|opinion|reseñ|review|vendid|vendidos|ventas).*'),
+        ],
+        'price_texts': ['div[data-test-id="product-price"] ::text'],
+        'offer_price': ['div[data-test-id="product-price"] span.sc-1d9b1d9e-0::text'],
+        'price_spans': ['div[data-test-id="product-price"] span::text'],
+        'next_page': [
+            'a[data-type="next"]::attr(href), '
+            'a[data-test-id="pagination-next-button"]::attr(href), '
+            'a[rel="next"]::attr(href)'
+        ],
+    })
+
+    def __init__(self, query="", country="AR", queries=None, **kwargs):
         """
         Inicializa el spider con parámetros de búsqueda.
 
         Args:
             query: Término de búsqueda para consulta de productos.
             country: Código de país (solo 'AR' soportado para Frávega).
+            queries: Lista JSON de búsquedas para resolver varias en un mismo crawl.
 
         Nota:
             Frávega opera exclusivamente en Argentina, por lo que el parámetro
             country se valida y por defecto es 'AR'.
         """
-        super().__init__(**kwargs)
+        super().__init__(country="AR", **kwargs)
         if country.upper() != 'AR':
             self.logger.warning(
                 f"Frávega spider only supports 'AR' country. "
                 f"Ignoring provided country '{country}'."
             )
 
-        self.query = query
+        self.queries = parse_queries(query, queries) or [""]
+        self.query = self.queries[0]
         self.country_code = "AR"
         self.currency = COUNTRY_CURRENCIES.get(self.country_code)
-        self.start_urls = [f"https://www.fravega.com/l/?keyword={self.query.replace(' ', '%20')}"]
-        self.page_count = 0
+        self.start_urls = [f"https://www.fravega.com/l/?keyword={q.replace(' ', '%20')}" for q in self.queries]
+        self.extractor = self.EXTRACTION.bind()
 
-        self.logger.info(f"Initializing Frávega spider for query: '{self.query}'")
+        self.logger.info(f"Initializing Frávega spider for queries: {self.queries}")
+
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        spider = super().from_crawler(crawler, *args, **kwargs)
+        spider.extractor = cls.EXTRACTION.bind(backend=crawler.settings.get('HTML_PARSER_BACKEND', 'parsel'))
+        # Con crawler, los aciertos y tiempos de cada selector van a las stats
+        crawler.signals.connect(spider.extractor.open_spider, signal=signals.spider_opened)
+        return spider
+
+    def start_requests(self):
+        """Genera la primera página de cada búsqueda, etiquetada con su consulta."""
+        for query, url in zip(self.queries, self.start_urls):
+            yield scrapy.Request(url, callback=self.parse, meta={'query': query})
 
     def parse(self, response):
         """
@@ -61,50 +109,30 @@ class FravegaSpider(scrapy.Spider):
         Args:
             response: Objeto de respuesta Scrapy para la página actual.
         """
-        self.page_count += 1
-        self.logger.info(f"Parsing page {self.page_count}/{self.MAX_PAGES} - {response.url}")
+        query = response.meta.get('query', self.query)
+        page = response.meta.get('page', 1)
+        self.logger.info(f"Parsing page {page}/{self.MAX_PAGES} for '{query}' - {response.url}")
 
-        products = response.css('article[data-test-id="result-item"]')
+        extract = self.extractor
+        products = extract.nodes(response, 'products')
         self.logger.info(f"Found {len(products)} products on Frávega page.")
 
         for product in products:
             # Extraer la URL básica del producto
-            url = product.css('a::attr(href)').get()
-
-            # Sólida extracción de calificaciones y reseñas con múltiples selectores alternativos
-            rating_str = None
-            reviews_count_str = None
-
-            # Selectores primarios que utilizan atributos de datos.
-            rating_str = product.css('[data-test-id="product-rating"] ::text').get()
-            reviews_count_str = product.css('[data-test-id="product-reviews"] ::text').get()
+            url = extract.first(product, 'url')
 
-            # Respaldo: extracto de los atributos de aria-label
+            # Calificación y reseñas: los respaldos (aria-label, selectores genéricos y
+            # búsqueda de palabras clave en todo el texto) sólo corren si fallan los primarios
+            rating_str = extract.first(product, 'rating')
             if not rating_str:
-                aria = product.css('[aria-label]::attr(aria-label)').get()
-                if aria:
-                    m = re.search(r"([0-9]+[\.,]?[0-9]*)", aria)
-                    if m:
-                        rating_str = m.group(1)
-
-            # Alternativa: selectores de calificación genéricos
+                # El número se busca sólo en el primer aria-label: los siguientes suelen
+                # ser botones o imágenes y sus cifras no son la calificación
+                aria = extract.first(product, 'rating_label')
+                match = re.search(r"([0-9]+[\.,]?[0-9]*)", aria) if aria else None
+                rating_str = match.group(1) if match else None
             if not rating_str:
-                rating_str = product.css('.rating::text, .product-rating::text, .stars::text').get()
-
-            # Extraiga recuentos de reseñas de varios patrones de texto
-            if not reviews_count_str:
-                reviews_count_str = product.css(
-                    'span.reviews::text, .review-count::text, .product-review-count::text'
-                ).get()
-
-            # Último recurso: busque en todo el texto palabras clave relacionadas con la reseña
-            if not reviews_count_str:
-                possible = product.css('::text').getall()
-                if possible:
-                    for t in possible:
-                        if t and re.search(r"(opinione|opinion|reseñ|review|vendid|vendidos|ventas)", t, re.I):
-                            reviews_count_str = t.strip()
-                            break
+                rating_str = extract.first(product, 'rating_generic')
+            reviews_count_str = extract.first(product, 'reviews_count')
 
             # Cuerdas extraídas limpias
             if rating_str:
@@ -120,10 +148,8 @@ class FravegaSpider(scrapy.Spider):
                 )
 
             # Extracción avanzada de precios con detección de precios actuales/anteriores
-            price_container = product.css('div[data-test-id="product-price"]')
-
             # Recopile todos los patrones de texto monetario del contenedor de precios.
-            price_texts = price_container.css('::text').getall()
+            price_texts = extract.all(product, 'price_texts')
             money_candidates = []
 
             # Construya candidatos monetarios con contexto
@@ -150,7 +176,7 @@ class FravegaSpider(scrapy.Spider):
 
             # Prioridad: extraer el precio de oferta explícito si está disponible
             try:
-                offer_span = price_container.css('span.sc-1d9b1d9e-0::text').get()
+                offer_span = extract.first(product, 'offer_price')
             except Exception:
                 offer_span = None
 
@@ -158,7 +184,7 @@ class FravegaSpider(scrapy.Spider):
                 price_current_text = offer_span.strip()
             else:
                 # Extracto de tramos directos, evitando etiquetas fiscales
-                spans = price_container.css('span::text').getall()
+                spans = extract.all(product, 'price_spans')
                 for s in spans:
                     if not s or not s.strip():
                         continue
@@ -256,33 +282,30 @@ class FravegaSpider(scrapy.Spider):
             except Exception:
                 is_discounted = False
 
-            yield {
-                'title': product.css('div[data-test-id="article-title"] span::text').get(),
-                'url': response.urljoin(url or ''),
-                'image_url': product.css('picture img::attr(src)').get(),
-                'source': self.name,
-                'price': price_current,
-                'price_before': price_before,
-                'is_discounted': is_discounted,
-                'rating_str': rating_str,
-                'reviews_count_str': reviews_count_str,
-                'currency_code': self.currency,
-                'country_code': self.country_code,
-            }
+            yield ProductItem(
+                query=query,
+                title=extract.first(product, 'title'),
+                url=response.urljoin(url or ''),
+                image_url=extract.first(product, 'image_url'),
+                source=self.name,
+                price=price_current,
+                price_before=price_before,
+                is_discounted=is_discounted,
+                rating_str=rating_str,
+                reviews_count_str=reviews_count_str,
+                currency_code=self.currency,
+                country_code=self.country_code,
+            )
 
         # Manejo de paginación
         try:
-            next_href = response.css(
-                'a[data-type="next"]::attr(href), '
-                'a[data-test-id="pagination-next-button"]::attr(href), '
-                'a[rel="next"]::attr(href)'
-            ).get()
+            next_href = extract.first(response, 'next_page')
 
             if next_href and next_href.strip():
                 next_url = response.urljoin(next_href.strip())
-                if self.page_count < self.MAX_PAGES:
+                if page < self.MAX_PAGES:
                     self.logger.info(f"Next Frávega page detected: {next_url}")
-                    yield scrapy.Request(next_url, callback=self.parse)
+                    yield scrapy.Request(next_url, callback=self.parse, meta={'query': query, 'page': page + 1})
                 else:
                     self.logger.info("Maximum pages reached for Frávega.")
         except Exception as e:
@@ -4,10 +4,10 @@ from urllib.parse import urlparse, parse_qs, urlencode, urlunparse
 
 from cheapy_scraper.items import ProductItem
 from config import COUNTRY_CURRENCIES
-from scrapy_playwright.page import PageMethod
+from .base_spider import BaseCheapySpider, parse_queries
 
 
-class MegatoneSpider(scrapy.Spider):
+class MegatoneSpider(BaseCheapySpider):
     name = "megatone"
     allowed_domains = ["megatone.net", "www.megatone.net"]
     MAX_PAGES = 1
@@ -36,24 +36,27 @@ class MegatoneSpider(scrapy.Spider):
         "PLAYWRIGHT_PAGE_GOTO_OPTIONS": {"wait_until": "domcontentloaded", "timeout": 45000},
     }
 
-    def __init__(self, query="", country="AR", **kwargs):
-        super().__init__(**kwargs)
+    def __init__(self, query="", country="AR", queries=None, **kwargs):
+        super().__init__(country="AR", **kwargs)
         if country.upper() != 'AR':
             self.logger.warning(f"El spider de Megatone solo soporta 'AR'. Se ignora el país '{country}'.")
 
-        self.query = query or "tv"
+        self.queries = parse_queries(query, queries) or ["tv"]
+        self.query = self.queries[0]
         self.country_code = "AR"
         self.currency = COUNTRY_CURRENCIES.get(self.country_code, "ARS")
-        self.start_urls = [f"https://www.megatone.net/resultados-busqueda?q={self.query}"]
-        self.page_count = 0
+        self.start_urls = [f"https://www.megatone.net/resultados-busqueda?q={q}" for q in self.queries]
 
     def start_requests(self):
-        for url in self.start_urls:
+        from scrapy_playwright.page import PageMethod
+
+        for query, url in zip(self.queries, self.start_urls):
             # Primera carga con Playwright (sin clicks), para obtener página 1
             yield scrapy.Request(
                 url,
                 callback=self.parse,
                 meta={
+                    "query": query,
                     "playwright": True,
                     "clicks": 0,
                     "playwright_page_goto_kwargs": {"wait_until": "domcontentloaded", "timeout": 45000},
@@ -65,8 +68,11 @@ class MegatoneSpider(scrapy.Spider):
             )
 
     def parse(self, response):
-        self.page_count += 1
-        self.logger.info(f"Megatone: Parseando página {self.page_count}/{self.MAX_PAGES} - {response.url}")
+        from scrapy_playwright.page import PageMethod
+
+        query = response.meta.get("query", self.query)
+        page = response.meta.get("page", 1)
+        self.logger.info(f"Megatone: Parseando página {page}/{self.MAX_PAGES} de '{query}' - {response.url}")
 
         # Cada producto aparece anclado en un <a class="producto" href="..."> ... </a>
         for prod in response.css('a.producto'):
@@ -97,24 +103,25 @@ class MegatoneSpider(scrapy.Spider):
                 is_discounted = False
 
             item = ProductItem()
-            item['title'] = title
-            item['url'] = url
-            item['image_url'] = image_url
-            item['source'] = self.name
-            item['price'] = price_current_text.strip() if price_current_text else None
-            item['price_before'] = price_before_text.strip() if price_before_text else None
-            item['price_numeric'] = price_numeric
-            item['price_before_numeric'] = price_before_numeric
-            item['is_discounted'] = is_discounted
-            item['rating_str'] = None
-            item['reviews_count_str'] = None
-            item['currency_code'] = self.currency
-            item['country_code'] = self.country_code
+            item.query = query
+            item.title = title
+            item.url = url
+            item.image_url = image_url
+            item.source = self.name
+            item.price = price_current_text.strip() if price_current_text else None
+            item.price_before = price_before_text.strip() if price_before_text else None
+            item.price_numeric = price_numeric
+            item.price_before_numeric = price_before_numeric
+            item.is_discounted = is_discounted
+            item.rating_str = None
+            item.reviews_count_str = None
+            item.currency_code = self.currency
+            item.country_code = self.country_code
 
             yield item
 
         # Paginación (con click usando Playwright si no hay cambio de URL)
-        if self.page_count < self.MAX_PAGES:
+        if page < self.MAX_PAGES:
             clicks = response.meta.get("clicks", 0)
 
             # 1) Si existe rel=next o similar, úsalo (por si Megatone alguna vez expone paginación real)
@@ -126,6 +133,8 @@ class MegatoneSpider(scrapy.Spider):
                     next_url,
                     callback=self.parse,
                     meta={
+                        "query": query,
+                        "page": page + 1,
                         "playwright": True,
                         "clicks": clicks,
                         "playwright_page_goto_kwargs": {"wait_until": "domcontentloaded", "timeout": 45000},
@@ -140,6 +149,8 @@ class MegatoneSpider(scrapy.Spider):
                     response.url,
                     callback=self.parse,
                     meta={
+                        "query": query,
+                        "page": page + 1,
                         "playwright": True,
                         "clicks": clicks + 1,
                         "playwright_page_goto_kwargs": {"wait_until": "domcontentloaded", "timeout": 45000},
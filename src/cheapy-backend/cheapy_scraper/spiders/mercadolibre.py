@@ -7,13 +7,16 @@ Maneja paginación, normalización de precios y detección de descuentos.
 """
 
 import scrapy
+from scrapy import signals
 import re
 from urllib.parse import urlparse, parse_qs, urlunparse, urlencode
+from cheapy_scraper.extraction import ExtractionSpec
 from cheapy_scraper.items import ProductItem
 from config import MERCADOLIBRE_DOMAINS, COUNTRY_CURRENCIES
+from .base_spider import BaseCheapySpider, parse_queries
 
 
-class MercadoLibreSpider(scrapy.Spider):
+class MercadoLibreSpider(BaseCheapySpider):
     """
     Spider de Scrapy para la plataforma de comercio electrónico MercadoLibre.
 
@@ -27,6 +30,45 @@ class MercadoLibreSpider(scrapy.Spider):
     MAX_PAGES = 2
     ITEMS_PER_PAGE = 50
 
+    # Campos de la página de resultados; cada lista es una cadena de selectores
+    # en orden de prioridad (ver cheapy_scraper/extraction.py)
+    EXTRACTION = ExtractionSpec({
+        'products': ['li.ui-search-layout__item'],
+        'title': ['a.poly-component__title::text', 'h2.ui-search-item__title::text'],
+        'url': [
+            'a.poly-component__title::attr(href)',
+            'a.ui-search-link::attr(href)',
+            'a.ui-search-result__content-wrapper::attr(href)',
+        ],
+        'image_url': [
+            '.ui-search-result__image-container img::attr(data-src)',
+            '.ui-search-result__image-container img::attr(src)',
+            '.ui-search-result__image img::attr(data-src)',
+            '.ui-search-result__image img::attr(src)',
+            'picture source::attr(srcset)',
+            'picture img::attr(src)',
+            '.poly-card__portada img::attr(data-src)',
+            '.poly-card__portada img::attr(src)',
+        ],
+        'review_labels': ['span.poly-component__review-compacted .poly-phrase-label::text'],
+        'price_symbol': ['.andes-money-amount__currency-symbol::text'],
+        'price_fraction': [
+            'div.poly-price__current .andes-money-amount__fraction::text',
+            '.ui-search-price .andes-money-amount__fraction::text',
+            '.andes-money-amount__fraction::text',
+        ],
+        'price_before_fraction': [
+            's.andes-money-amount--previous .andes-money-amount__fraction::text',
+            's.andes-money-amount .andes-money-amount__fraction::text',
+        ],
+        'discount_label': ['.andes-money-amount__discount::text, .poly-price__disc_label::text'],
+        'money_texts': [('*::text', r'[\$€£]\s*[\d\.,]+')],
+        'next_page': [
+            'li.andes-pagination__button.andes-pagination__button--next a::attr(href), '
+            'a.andes-pagination__link[title="Siguiente"]::attr(href)'
+        ],
+    })
+
     # Headers personalizados para simular solicitudes de navegador
     custom_headers = {
         'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/116.0.0.0 Safari/537.36',
@@ -34,38 +76,47 @@ class MercadoLibreSpider(scrapy.Spider):
         'Accept-Language': 'es-AR,es;q=0.8,en-US;q=0.5,en;q=0.3',
     }
 
-    def __init__(self, query="", country="AR", **kwargs):
+    def __init__(self, query="", country="AR", queries=None, **kwargs):
         """
         Inicializa el spider con parámetros de búsqueda.
 
         Args:
-            query: Término de búsqueda para consulta de productos (requerido).
+            query: Término de búsqueda para consulta de productos.
             country: Código de país (ej. 'AR', 'MX', 'BR').
+            queries: Lista JSON de búsquedas para resolver varias en un mismo crawl.
 
         Raises:
-            ValueError: Si no se proporciona el parámetro query.
+            ValueError: Si no se proporciona ninguna búsqueda.
         """
-        super().__init__(**kwargs)
-        if not query:
+        super().__init__(country=country, **kwargs)
+        self.queries = parse_queries(query, queries)
+        if not self.queries:
             raise ValueError("Query parameter is required.")
 
-        self.query = query
+        self.query = self.queries[0]
         self.country_code = country.upper()
 
         # Obtener dominio y moneda desde configuración centralizada
         domain = MERCADOLIBRE_DOMAINS.get(self.country_code, MERCADOLIBRE_DOMAINS['AR'])
         self.currency = COUNTRY_CURRENCIES.get(self.country_code, 'USD')
 
-        # Construir URL de búsqueda inicial
-        base_url = f"https://listado.mercadolibre.{domain}/{self.query.replace(' ', '-')}"
-        self.start_urls = [base_url]
-        self.page_count = 0
+        # Construir una URL de búsqueda inicial por consulta
+        self.start_urls = [f"https://listado.mercadolibre.{domain}/{q.replace(' ', '-')}" for q in self.queries]
+        self.extractor = self.EXTRACTION.bind()
 
         self.logger.info(
             f"Initializing spider for country: {self.country_code}, "
             f"domain: {domain}, currency: {self.currency}"
         )
 
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        spider = super().from_crawler(crawler, *args, **kwargs)
+        spider.extractor = cls.EXTRACTION.bind(backend=crawler.settings.get('HTML_PARSER_BACKEND', 'parsel'))
+        # Con crawler, los aciertos y tiempos de cada selector van a las stats
+        crawler.signals.connect(spider.extractor.open_spider, signal=signals.spider_opened)
+        return spider
+
     def parse(self, response):
         """
         Parsea la página de resultados de búsqueda y extrae items de productos.
@@ -76,37 +127,26 @@ class MercadoLibreSpider(scrapy.Spider):
         Args:
             response: Objeto response de Scrapy para la página actual.
         """
-        self.page_count += 1
-        self.logger.info(f"Parsing page {self.page_count}/{self.MAX_PAGES} - {response.url}")
+        query = response.meta.get('query', self.query)
+        page = response.meta.get('page', 1)
+        self.logger.info(f"Parsing page {page}/{self.MAX_PAGES} for '{query}' - {response.url}")
 
         # Iterar a través de los items de listado de productos
-        for item in response.css('li.ui-search-layout__item, li.ui-search-layout__item.shops__layout-item'):
+        extract = self.extractor
+        for item in extract.nodes(response, 'products'):
             # Extraer información básica del producto
-            title = item.css('a.poly-component__title::text, h2.ui-search-item__title::text').get()
-            url = item.css(
-                'a.poly-component__title::attr(href), a.ui-search-link::attr(href), '
-                'a.ui-search-result__content-wrapper::attr(href)'
-            ).get()
+            title = extract.first(item, 'title')
+            url = extract.first(item, 'url')
 
             # Extraer URL de imagen con selectores de respaldo para diferentes layouts
-            image_url = (
-                item.css('.ui-search-result__image-container img::attr(data-src)').get() or
-                item.css('.ui-search-result__image-container img::attr(src)').get() or
-                item.css('.ui-search-result__image img::attr(data-src)').get() or
-                item.css('.ui-search-result__image img::attr(src)').get() or
-                item.css('picture source::attr(srcset)').get() or
-                item.css('picture img::attr(src)').get() or
-                item.css('.poly-card__portada img::attr(data-src)').get() or
-                item.css('.poly-card__portada img::attr(src)').get()
-            )
+            image_url = extract.first(item, 'image_url')
 
             # Manejar atributos srcset tomando la primera URL
             if image_url and ' ' in image_url:
                 image_url = image_url.split(' ')[0].strip()
 
             # Extraer calificación y conteo de reseñas desde componentes compactos de reseñas
-            rating_str = item.css('span.poly-reviews__rating::text, .ui-search-reviews__rating-number::text').get()
-            review_labels = item.css('span.poly-component__review-compacted .poly-phrase-label::text').getall()
+            review_labels = extract.all(item, 'review_labels')
             rating_str = review_labels[0].strip() if len(review_labels) > 0 else None
             reviews_count_str = review_labels[1].strip() if len(review_labels) > 1 else None
 
@@ -129,14 +169,6 @@ class MercadoLibreSpider(scrapy.Spider):
             except Exception:
                 pass  # No interrumpa el análisis ante errores de registro
 
-            # Extraer componentes de precio con múltiples selectores para diferentes layouts
-            price_symbol = item.css('.andes-money-amount__currency-symbol::text').get()
-            price_fraction = item.css('.andes-money-amount__fraction::text').get()
-            price_fraction_discount = item.css('div.poly-price__current .andes-money-amount__fraction::text').get()
-            price_fraction_normal = item.css('.ui-search-price .andes-money-amount__fraction::text').get()
-            final_price_fraction = price_fraction_discount or price_fraction_normal or price_fraction
-            price_full_str = f"{price_symbol or ''}{final_price_fraction or ''}"
-
             # Normalizar y validar URL del producto
             normalized_url = None
             if url:
@@ -154,13 +186,19 @@ class MercadoLibreSpider(scrapy.Spider):
             if normalized_url and self._is_bad_meli_url(normalized_url):
                 continue
 
+            # Extraer componentes de precio; los selectores de otros layouts sólo corren como respaldo
+            price_symbol = extract.first(item, 'price_symbol')
+            final_price_fraction = extract.first(item, 'price_fraction')
+            price_full_str = f"{price_symbol or ''}{final_price_fraction or ''}"
+
             # Inicializar item de producto con datos extraídos
             product = ProductItem()
-            product['title'] = title
-            product['url'] = normalized_url
-            product['image_url'] = image_url
-            product['source'] = self.name
-            product['price'] = price_full_str if final_price_fraction else None
+            product.query = query
+            product.title = title
+            product.url = normalized_url
+            product.image_url = image_url
+            product.source = self.name
+            product.price = price_full_str if final_price_fraction else None
 
             # Análisis avanzado de precios para precios actuales y anteriores
             price_numeric = None
@@ -177,22 +215,20 @@ class MercadoLibreSpider(scrapy.Spider):
 
             #Extraer información anterior de precios y descuentos.
             try:
-                prev_fraction = (
-                    item.css('s.andes-money-amount--previous .andes-money-amount__fraction::text').get() or
-                    item.css('s.andes-money-amount .andes-money-amount__fraction::text').get()
-                )
-                discount_label_text = item.css(
-                    '.andes-money-amount__discount::text, .poly-price__disc_label::text'
-                ).get()
+                prev_fraction = extract.first(item, 'price_before_fraction')
+                discount_label_text = extract.first(item, 'discount_label')
                 if prev_fraction:
                     price_before = f"{price_symbol or ''}{prev_fraction}"
                     price_before_numeric = self.money_to_float(prev_fraction)
             except Exception:
                 pass
 
-            # Heurística alternativa: analiza todo el texto monetario del artículo
+            # Heurística alternativa: analiza todo el texto monetario del artículo. Recorre todo el
+            # subárbol del producto, así que sólo corre si los selectores directos no encontraron
+            # el precio actual, o si hay etiqueta de descuento pero no precio anterior.
+            needs_money_scan = price_numeric is None or (discount_label_text and price_before_numeric is None)
             try:
-                money_candidates = item.css('*::text').re(r'[\$€£]\s*[\d\.,]+')
+                money_candidates = extract.all(item, 'money_texts') if needs_money_scan else []
                 money_candidates = [m.strip() for m in money_candidates if m and m.strip()]
 
                 # Eliminar duplicados manteniendo el orden
@@ -225,16 +261,15 @@ class MercadoLibreSpider(scrapy.Spider):
                             break
             except Exception:
                 pass
-
             # Complete el artículo del producto con información de precios
-            product['price'] = price_full_str if price_numeric else None
-            product['price_before'] = price_before
-            product['rating_str'] = rating_str
-            product['reviews_count_str'] = reviews_count_str
-            product['currency_code'] = self.currency
-            product['country_code'] = self.country_code
-            product['price_numeric'] = price_numeric
-            product['price_before_numeric'] = price_before_numeric
+            product.price = price_full_str if price_numeric else None
+            product.price_before = price_before
+            product.rating_str = rating_str
+            product.reviews_count_str = reviews_count_str
+            product.currency_code = self.currency
+            product.country_code = self.country_code
+            product.price_numeric = price_numeric
+            product.price_before_numeric = price_before_numeric
 
             # Determinar si el producto tiene descuento.
             is_discounted = False
@@ -246,12 +281,12 @@ class MercadoLibreSpider(scrapy.Spider):
                         is_discounted = True
             except Exception:
                 is_discounted = False
-            product['is_discounted'] = is_discounted
+            product.is_discounted = is_discounted
 
             yield product
 
         # Handle pagination: Pruebe primero con el botón Siguiente y luego recurra al cálculo de URL.
-        if self.page_count < self.MAX_PAGES:
+        if page < self.MAX_PAGES:
             next_url = self._extract_next_link(response)
             if not next_url:
                 next_url = self._compute_next_meli_url(response.url)
@@ -262,6 +297,7 @@ class MercadoLibreSpider(scrapy.Spider):
                     url=next_url,
                     headers=self.custom_headers,
                     callback=self.parse,
+                    meta={'query': query, 'page': page + 1},
                 )
             else:
                 self.logger.info("No next page link found or could be computed.")
@@ -273,8 +309,8 @@ class MercadoLibreSpider(scrapy.Spider):
         Garantiza que todas las solicitudes, incluida la primera, utilicen información coherente
         encabezados para evitar la detección.
         """
-        for url in self.start_urls:
-            yield scrapy.Request(url, headers=self.custom_headers, callback=self.parse)
+        for query, url in zip(self.queries, self.start_urls):
+            yield scrapy.Request(url, headers=self.custom_headers, callback=self.parse, meta={'query': query})
 
     def money_to_float(self, money_str):
         """
@@ -349,10 +385,7 @@ class MercadoLibreSpider(scrapy.Spider):
             str or None: URL absoluta de la siguiente página, o Ninguno si no se encuentra.
         """
         try:
-            href = response.css(
-                'li.andes-pagination__button.andes-pagination__button--next a::attr(href), '
-                'a.andes-pagination__link[title="Siguiente"]::attr(href)'
-            ).get()
+            href = self.extractor.first(response, 'next_page')
             if href and href.strip():
                 return response.urljoin(href.strip())
         except Exception:
@@ -0,0 +1,234 @@
+"""
+Spider de refresco de páginas de producto seguidas.
+
+Los seguimientos de producto (watchlists.py) no necesitan volver a descargar el
+listado completo de su búsqueda: este spider pide directamente las URLs de
+producto, que los spiders de búsqueda ya entregan normalizadas, y extrae el
+precio de los datos estructurados de la página (JSON-LD schema.org/Product,
+metadatos Open Graph o microdatos `itemprop="price"`), comunes a todas las
+tiendas.
+
+Cada request es condicional: con los validadores de la respuesta anterior
+(cheapy_scraper/validators.py) se envían If-None-Match / If-Modified-Since y
+un 304 se descarta sin cuerpo ni parseo. Si la tienda no informa validadores
+la página se descarga completa, pero cuando su hash coincide con el anterior
+tampoco se parsea. Al cerrar se registran en las stats:
+
+    refresh/not_modified      respuestas 304
+    refresh/hash_unchanged    respuestas 200 con el mismo cuerpo que la anterior
+    refresh/parsed            páginas parseadas
+    refresh/bytes_downloaded  bytes de cuerpo descargados
+    refresh/bytes_saved       bytes que no se descargaron gracias a un 304
+    refresh/bytes_saved_ratio bytes ahorrados sobre el total que se hubiera descargado
+
+Uso:
+    scrapy crawl refresh -a country=AR -a products='[{"url": "https://...", "query": "smart tv"}]'
+"""
+
+import json
+from urllib.parse import urlsplit
+
+import scrapy
+from scrapy import signals
+
+from cheapy_scraper.items import ProductItem
+from cheapy_scraper.validators import ValidatorStore, body_hash, default_db_path
+from config import COUNTRY_CURRENCIES
+from stores import store_for_host
+from .base_spider import BaseCheapySpider
+
+def parse_products(products) -> list:
+    """
+    Retorna los productos a refrescar.
+
+    Args:
+        products: Lista (o su representación JSON) de URLs o de diccionarios
+            con 'url' y, opcionalmente, la 'query' del seguimiento
+
+    Returns:
+        list: Diccionarios con 'url' y 'query', sin URLs repetidas
+    """
+    if isinstance(products, str):
+        products = json.loads(products) if products.strip() else []
+    result = {}
+    for product in products or []:
+        if isinstance(product, str):
+            product = {'url': product}
+        url = (product.get('url') or '').strip()
+        if url and url not in result:
+            result[url] = {'url': url, 'query': product.get('query') or ''}
+    return list(result.values())
+
+
+def _first(value):
+    """Primer elemento de un valor de JSON-LD que puede venir como lista."""
+    if isinstance(value, list):
+        return value[0] if value else None
+    return value
+
+
+class ProductRefreshSpider(BaseCheapySpider):
+    """
+    Spider que refresca precios de productos puntuales con requests condicionales.
+    """
+
+    name = "refresh"
+
+    # Un 304 llega al callback en lugar de descartarse como error HTTP
+    handle_httpstatus_list = [304]
+
+    # La caché HTTP compartida devolvería justamente la copia que se quiere validar
+    custom_settings = {'HTTPCACHE_ENABLED': False}
+
+    def __init__(self, products=None, country="US", query="", **kwargs):
+        """
+        Inicializa el spider con los productos a refrescar.
+
+        Args:
+            products: Lista JSON de productos (ver parse_products)
+            country: Código de país de los productos
+            query: Búsqueda por defecto de los productos que no informan la suya
+        """
+        super().__init__(country=country, **kwargs)
+        self.products = parse_products(products)
+        self.query = query
+        self.currency = COUNTRY_CURRENCIES.get(self.country_code, 'USD')
+        self.validators = None
+        self.logger.info(f"Initializing refresh spider for {len(self.products)} products")
+
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        spider = super().from_crawler(crawler, *args, **kwargs)
+        settings = crawler.settings
+        spider.validators = ValidatorStore(
+            settings.get('REFRESH_VALIDATORS_PATH') or default_db_path(),
+            settings.getfloat('REFRESH_VALIDATORS_TTL', 30 * 86400),
+        )
+        crawler.signals.connect(spider.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(spider.spider_closed, signal=signals.spider_closed)
+        return spider
+
+    def spider_opened(self, spider):
+        self.validators.open()
+
+    def spider_closed(self, spider):
+        self.validators.close()
+        stats = self.crawler.stats
+        saved = stats.get_value('refresh/bytes_saved', 0)
+        downloaded = stats.get_value('refresh/bytes_downloaded', 0)
+        ratio = round(saved / (saved + downloaded), 4) if saved + downloaded else 0.0
+        stats.set_value('refresh/bytes_saved_ratio', ratio)
+        self.logger.info(
+            f"Refresh: {stats.get_value('refresh/not_modified', 0)} not modified, "
+            f"{stats.get_value('refresh/hash_unchanged', 0)} unchanged body, "
+            f"{stats.get_value('refresh/parsed', 0)} parsed; {ratio:.1%} of bytes saved"
+        )
+
+    def start_requests(self):
+        """Genera una request condicional por producto, con los validadores de la anterior."""
+        for product in self.products:
+            previous = self.validators.get(product['url'])
+            headers = {}
+            if previous and previous['etag']:
+                headers['If-None-Match'] = previous['etag']
+            if previous and previous['last_modified']:
+                headers['If-Modified-Since'] = previous['last_modified']
+            yield scrapy.Request(
+                product['url'], callback=self.parse, headers=headers, dont_filter=True,
+                meta={'product_url': product['url'], 'query': product['query'] or self.query, 'validators': previous},
+            )
+
+    def parse(self, response):
+        """
+        Descarta las páginas que no cambiaron y extrae el producto de las demás.
+
+        Args:
+            response: Respuesta de la página de producto (200 o 304)
+        """
+        url = response.meta['product_url']
+        previous = response.meta.get('validators')
+        stats = self.crawler.stats
+
+        if response.status == 304:
+            stats.inc_value('refresh/not_modified')
+            stats.inc_value('refresh/bytes_saved', previous['size'] if previous else 0)
+            self.validators.touch(url)
+            return
+
+        size = len(response.body)
+        digest = body_hash(response.body)
+        stats.inc_value('refresh/bytes_downloaded', size)
+        self.validators.save(
+            url,
+            (response.headers.get('ETag') or b'').decode('latin-1') or None,
+            (response.headers.get('Last-Modified') or b'').decode('latin-1') or None,
+            digest, size,
+        )
+        if previous and previous['body_hash'] == digest:
+            stats.inc_value('refresh/hash_unchanged')
+            return
+
+        stats.inc_value('refresh/parsed')
+        item = self.extract_product(response, url, response.meta.get('query', self.query))
+        if item is not None:
+            yield item
+
+    @staticmethod
+    def product_json_ld(response) -> dict:
+        """Primer objeto schema.org/Product de los bloques JSON-LD de la página."""
+        for raw in response.css('script[type="application/ld+json"]::text').getall():
+            try:
+                data = json.loads(raw)
+            except ValueError:
+                continue
+            candidates = data if isinstance(data, list) else [data]
+            for candidate in candidates:
+                if not isinstance(candidate, dict):
+                    continue
+                nodes = candidate.get('@graph') if isinstance(candidate.get('@graph'), list) else [candidate]
+                for node in nodes:
+                    types = node.get('@type') if isinstance(node, dict) else None
+                    if types == 'Product' or (isinstance(types, list) and 'Product' in types):
+                        return node
+        return {}
+
+    def extract_product(self, response, url: str, query: str):
+        """
+        Arma el ProductItem a partir de los datos estructurados de la página.
+
+        Los precios de JSON-LD, Open Graph y microdatos usan punto decimal sin
+        separador de miles, así que se informan directamente en price_numeric.
+
+        Returns:
+            ProductItem or None: None si la página no informa un precio
+        """
+        data = self.product_json_ld(response)
+        offers = _first(data.get('offers')) or {}
+
+        def meta(prop):
+            return response.css(f'meta[property="{prop}"]::attr(content), meta[name="{prop}"]::attr(content)').get()
+
+        price = offers.get('price', offers.get('lowPrice'))
+        if price is None:
+            price = meta('product:price:amount') or response.css('[itemprop="price"]::attr(content)').get()
+        try:
+            price_numeric = float(price)
+        except (TypeError, ValueError):
+            self.logger.warning(f"No price found on product page {url}")
+            return None
+
+        image = _first(data.get('image'))
+        if isinstance(image, dict):
+            image = image.get('url')
+        host = (urlsplit(url).hostname or '').lower()
+
+        return ProductItem(
+            query=query,
+            title=data.get('name') or meta('og:title') or response.css('title::text').get(),
+            url=url,
+            image_url=image or meta('og:image'),
+            source=store_for_host(host)[0] or host,
+            price_numeric=price_numeric,
+            currency_code=offers.get('priceCurrency') or meta('product:price:currency') or self.currency,
+            country_code=self.country_code,
+        )
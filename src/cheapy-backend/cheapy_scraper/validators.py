@@ -0,0 +1,105 @@
+"""
+Validadores HTTP por URL para refrescar páginas de producto sin volver a descargarlas.
+
+El spider `refresh` vuelve a pedir las mismas páginas de producto en cada
+actualización de los seguimientos. Por cada URL se guarda lo necesario para no
+repetir trabajo:
+
+    etag, last_modified   validadores de la última respuesta 200; se reenvían
+                          como If-None-Match / If-Modified-Since y la tienda
+                          contesta 304 sin cuerpo si la página no cambió
+    body_hash             hash del cuerpo; las tiendas sin validadores
+                          devuelven la página completa, pero si el hash coincide
+                          no se vuelve a parsear
+    size                  bytes del último cuerpo, los que se ahorran con un 304
+
+La clave es la URL normalizada de la caché HTTP (sin parámetros de tracking ni
+fragmento), así las variantes de la misma página comparten validadores.
+"""
+
+import hashlib
+import sqlite3
+import time
+from pathlib import Path
+
+from cheapy_scraper.httpcache import normalize_cache_key
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+
+def body_hash(body: bytes) -> str:
+    """Hash del cuerpo de una respuesta (blake2b de 128 bits en hexadecimal)."""
+    return hashlib.blake2b(body, digest_size=16).hexdigest()
+
+
+class ValidatorStore:
+    """
+    Validadores de páginas de producto en SQLite, compartidos por todos los workers de la máquina.
+
+    Las escrituras se acumulan y se confirman en lote al cerrar el crawl.
+
+    Args:
+        db_path: Archivo SQLite
+        ttl: Segundos tras los cuales los validadores de una URL no consultada se eliminan
+    """
+
+    def __init__(self, db_path: str, ttl: float):
+        self.db_path = db_path
+        self.ttl = ttl
+        self.conn = None
+        self.pending = []
+        self.touched = []
+
+    def open(self):
+        self.conn = sqlite3.connect(self.db_path, timeout=5, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS validators ("
+            "key TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, body_hash TEXT, size INTEGER, checked REAL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_validators_checked ON validators (checked)")
+        self.conn.commit()
+
+    def close(self):
+        if self.conn is None:
+            return
+        self.flush()
+        self.conn.execute("DELETE FROM validators WHERE checked < ?", (time.time() - self.ttl,))
+        self.conn.commit()
+        self.conn.close()
+        self.conn = None
+
+    def get(self, url: str):
+        """
+        Validadores guardados de una URL.
+
+        Returns:
+            dict or None: Claves 'etag', 'last_modified', 'body_hash' y 'size'
+        """
+        row = self.conn.execute(
+            "SELECT etag, last_modified, body_hash, size FROM validators WHERE key = ?",
+            (normalize_cache_key('GET', url),),
+        ).fetchone()
+        if row is None:
+            return None
+        return {'etag': row[0], 'last_modified': row[1], 'body_hash': row[2], 'size': row[3]}
+
+    def save(self, url: str, etag: str, last_modified: str, digest: str, size: int):
+        self.pending.append((normalize_cache_key('GET', url), etag, last_modified, digest, size, time.time()))
+
+    def touch(self, url: str):
+        """Marca la URL como consultada sin cambiar sus validadores (respuesta 304)."""
+        self.touched.append((time.time(), normalize_cache_key('GET', url)))
+
+    def flush(self):
+        if self.pending:
+            self.conn.executemany("INSERT OR REPLACE INTO validators VALUES (?, ?, ?, ?, ?, ?)", self.pending)
+        if self.touched:
+            self.conn.executemany("UPDATE validators SET checked = ? WHERE key = ?", self.touched)
+        self.conn.commit()
+        self.pending = []
+        self.touched = []
+
+
+def default_db_path() -> str:
+    return str(BASE_DIR / 'validators.db')
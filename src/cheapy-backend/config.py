@@ -1,3 +1,6 @@
+import json
+import os
+
 COUNTRY_CURRENCIES = {
     'AR': 'ARS', 'MX': 'MXN', 'CO': 'COP', 'CL': 'CLP', 'BR': 'BRL', 'UY': 'UYU',
     'PE': 'PEN', 'CR': 'CRC', 'GT': 'GTQ', 'HN': 'HNL', 'NI': 'NIO', 'PA': 'PAB',
@@ -56,4 +59,172 @@ COUNTRY_TO_SPIDERS = {
     'US': ['amazon', 'ebay'],
     'CA': ['amazon', 'ebay'],
     'ES': ['amazon', 'ebay', 'aliexpress'],
-}
\ No newline at end of file
+}
+
+# Búsquedas por lote (POST /buscar/lote): máximo de consultas por pedido y consultas que
+# resuelve cada crawl. Un lote de N consultas cuesta ceil(N / BATCH_QUERIES_PER_CRAWL)
+# crawls por tienda en lugar de N.
+BATCH_MAX_QUERIES = 50
+BATCH_QUERIES_PER_CRAWL = 10
+
+# Seguimientos y alertas de precio (watchlists.py). Intervalos en segundos: el scheduler
+# (Celery beat) corre cada WATCH_TICK_SECONDS y despacha a lo sumo WATCH_MAX_TARGETS_PER_TICK
+# búsquedas vencidas; WATCH_JITTER es la fracción del intervalo que se desplaza al azar cada
+# reprogramación. Las búsquedas seguidas generan alertas con bajas de WATCH_MIN_DROP_PERCENT o más.
+WATCH_DEFAULT_INTERVAL = 3600
+WATCH_MIN_INTERVAL = 900
+WATCH_TICK_SECONDS = 60
+WATCH_MAX_TARGETS_PER_TICK = 20
+WATCH_JITTER = 0.1
+WATCH_MIN_DROP_PERCENT = 5
+# Los productos seguidos se refrescan por su URL (spider `refresh`), hasta
+# REFRESH_PRODUCTS_PER_CRAWL productos por crawl
+REFRESH_PRODUCTS_PER_CRAWL = 100
+
+# Índice local de productos scrapeados (productindex.py, en productos.db). /buscar devuelve al
+# instante hasta PRODUCT_INDEX_MAX_RESULTS coincidencias vistas en los últimos
+# PRODUCT_INDEX_MAX_AGE segundos, elegidas entre las PRODUCT_INDEX_CANDIDATES vistas más
+# recientemente. El vencimiento de los productos no vistos se configura en settings.py.
+PRODUCT_INDEX_MAX_RESULTS = 20
+PRODUCT_INDEX_MAX_AGE = 3 * 86400
+PRODUCT_INDEX_CANDIDATES = 200
+
+# Control de admisión de /buscar (admission.py). La espera estimada de cada clase de spider es
+# tareas en cola × costo medio de la clase / concurrencia de los workers vivos que consumen su
+# cola (cada worker la publica cada ADMISSION_HEARTBEAT_SECONDS). Si una búsqueda esperaría más de
+# ADMISSION_MAX_WAIT segundos, /buscar no encola crawls: responde sólo con el índice local o, si no
+# hay coincidencias, con 429 y Retry-After (a lo sumo ADMISSION_MAX_RETRY_AFTER). Los crawls que
+# no empezaron en ADMISSION_TASK_EXPIRES segundos se descartan: la extensión deja de sondear a los 90 s.
+ADMISSION_ENABLED = True
+ADMISSION_MAX_WAIT = 60
+ADMISSION_MAX_RETRY_AFTER = 120
+ADMISSION_TASK_EXPIRES = 90
+ADMISSION_HEARTBEAT_SECONDS = 15
+# Búsquedas por cliente: token bucket en Redis con 'rate' búsquedas/segundo y ráfaga 'burst'
+# (una búsqueda por lote cuesta un token por crawl de cada tienda). Los clientes se identifican por
+# el header X-API-Key si la clave está en CHEAPY_API_KEYS (JSON clave -> {'rate', 'burst'}), o si
+# no por su IP con ADMISSION_CLIENT_LIMIT.
+ADMISSION_CLIENT_LIMIT = {'rate': 0.2, 'burst': 10}
+ADMISSION_API_KEYS = json.loads(os.environ.get('CHEAPY_API_KEYS') or '{}')
+
+# Ejecución cubierta ("hedging") de crawls rezagados (api/hedging.py). Al sondear una búsqueda,
+# si un crawl lleva corriendo más que el percentil HEDGE_QUANTILE de la duración histórica de su
+# spider (con al menos HEDGE_MIN_SAMPLES crawls exitosos medidos), se lanza un duplicado y se usa
+# el primero que termine; el otro se revoca. Los duplicados salen de un presupuesto global (token
+# bucket en Redis, 'rate' duplicados/segundo con ráfaga 'burst') y no se lanzan si la cola de la
+# clase ya tiene más de HEDGE_MAX_QUEUE_WAIT segundos de espera estimada.
+HEDGE_ENABLED = False
+HEDGE_QUANTILE = 0.9
+HEDGE_MIN_SAMPLES = 20
+HEDGE_BUDGET = {'rate': 0.05, 'burst': 5}
+HEDGE_MAX_QUEUE_WAIT = 5
+
+# Conexión a Redis compartida por Celery, la API y los spiders
+REDIS_URL = 'redis://localhost:6379/0'
+
+# Registro de capacidades de cada spider.
+# 'rendering' indica si el spider necesita Chromium (Playwright) o HTML plano por HTTP.
+# 'cost' es el costo relativo esperado de un crawl (segundos de worker aproximados).
+SPIDER_PROFILES = {
+    'mercadolibre': {'rendering': 'http', 'cost': 4},
+    'fravega': {'rendering': 'http', 'cost': 4},
+    'amazon': {'rendering': 'rendered', 'cost': 25},
+    'ebay': {'rendering': 'rendered', 'cost': 20},
+    'aliexpress': {'rendering': 'rendered', 'cost': 35},
+    'megatone': {'rendering': 'rendered', 'cost': 30},
+    # Refresco de páginas de producto con requests condicionales (spider `refresh`)
+    'refresh': {'rendering': 'http', 'cost': 3},
+}
+
+# Colas de Celery por tipo de spider, con perfiles de concurrencia y prefetch propios.
+# Los crawls HTTP son baratos y cortos: más concurrencia y prefetch.
+# Los crawls con Chromium consumen CPU/RAM: poca concurrencia y sin prefetch extra,
+# para que una tarea lenta no retenga otras en el buffer del worker.
+SPIDER_QUEUES = {
+    'http': {'queue': 'spiders_http', 'concurrency': 8, 'prefetch_multiplier': 4},
+    'rendered': {'queue': 'spiders_rendered', 'concurrency': 2, 'prefetch_multiplier': 1},
+}
+
+# Tienda de cada dominio (stores.py): un host es de la tienda si es el dominio o un subdominio
+# suyo ('listado.mercadolibre.com.ar'), nunca por contener el nombre ('amazon.attacker.com'). Los
+# dominios de país salen de las tablas *_DOMAINS de arriba. El valor es el spider de búsqueda de
+# la tienda. Es la única tabla de hosts: el límite de tasa, la caché HTTP, el circuit breaker, las
+# sesiones y el `source` del spider `refresh` resuelven con ella la tienda de cada request.
+STORE_HOSTS = {
+    **{f'mercadolibre.{tld}': 'mercadolibre' for tld in MERCADOLIBRE_DOMAINS.values()},
+    'mercadolivre.com.br': 'mercadolibre',
+    **{f'amazon.{tld}': 'amazon' for tld in AMAZON_DOMAINS.values()},
+    **{f'ebay.{tld}': 'ebay' for tld in EBAY_DOMAINS.values()},
+    'aliexpress.com': 'aliexpress',
+    'aliexpress.us': 'aliexpress',
+    'fravega.com': 'fravega',
+    'megatone.net': 'megatone',
+}
+
+# Presupuesto de requests por tienda, compartido por todos los workers del cluster.
+# 'rate' es requests/segundo sostenidos y 'burst' la ráfaga máxima.
+STORE_RATE_LIMITS = {
+    'mercadolibre': {'rate': 4.0, 'burst': 8},
+    'fravega': {'rate': 2.0, 'burst': 4},
+    'amazon': {'rate': 1.0, 'burst': 2},
+    'ebay': {'rate': 1.0, 'burst': 3},
+    'aliexpress': {'rate': 0.5, 'burst': 2},
+    'megatone': {'rate': 1.0, 'burst': 2},
+}
+
+# Detección de bloqueos (blocking.py): marcadores de páginas de captcha o de verificación,
+# buscados en la URL final y en los primeros BLOCK_SCAN_BYTES del cuerpo (en minúsculas). Los de
+# BLOCK_MARKERS['*'] valen para todos los spiders; un status 429 también cuenta como bloqueo.
+BLOCK_MARKERS = {
+    '*': ('captcha', 'robot check', 'unusual traffic'),
+    'amazon': ('/errors/validatecaptcha', 'api-services-support@amazon.com', 'type the characters you see'),
+    'aliexpress': ('_____tmd_____', '/punish', 'baxia-dialog', 'x5secdata', 'slide to verify'),
+    'mercadolibre': ('/gz/account-verification', '/security/suspicious'),
+    'ebay': ('/splashui/captcha', 'pardon our interruption'),
+    'megatone': ('cf-chl', 'attention required! | cloudflare', '<title>just a moment'),
+    'fravega': ('cf-chl', '<title>just a moment'),
+}
+BLOCK_SCAN_BYTES = 20000
+# Circuit breaker por tienda compartido en Redis: BLOCK_THRESHOLD bloqueos en BLOCK_WINDOW
+# segundos abren el circuito por BLOCK_COOLDOWN segundos, el doble en cada apertura seguida
+# (hasta BLOCK_MAX_COOLDOWN). Con el circuito abierto la tienda no se scrapea: la API no encola
+# sus crawls y responde con los productos de esa tienda del índice local.
+BLOCK_THRESHOLD = 2
+BLOCK_WINDOW = 300
+BLOCK_COOLDOWN = 300
+BLOCK_MAX_COOLDOWN = 3600
+
+# TTL (segundos) de la caché HTTP compartida de páginas de resultados, por tienda
+# (ver STORE_HOSTS); las tiendas ausentes no se cachean.
+HTTPCACHE_TTL_BY_STORE = {
+    'mercadolibre': 300,
+    'fravega': 300,
+    'megatone': 600,
+    'amazon': 180,
+    'ebay': 180,
+    'aliexpress': 180,
+}
+
+# Miniaturas de las imágenes de los resultados (api/thumbnails.py, GET /img). Cada imagen se
+# descarga una vez del CDN de la tienda, se reduce a THUMBNAIL_SIZE px de lado (el doble de los
+# 70 px del popup, para pantallas de alta densidad) y se guarda en disco por hash de contenido,
+# con desalojo LRU al superar THUMBNAIL_CACHE_MAX_BYTES. Sólo se aceptan imágenes de los hosts
+# de THUMBNAIL_ALLOWED_HOSTS (el host o sus subdominios), así /img no es un proxy abierto.
+THUMBNAIL_SIZE = 140
+THUMBNAIL_QUALITY = 80
+THUMBNAIL_CACHE_DIR = os.environ.get('CHEAPY_THUMBNAIL_DIR')
+THUMBNAIL_CACHE_MAX_BYTES = 100 * 1024 * 1024
+THUMBNAIL_MAX_SOURCE_BYTES = 8 * 1024 * 1024
+THUMBNAIL_MAX_PIXELS = 40_000_000
+THUMBNAIL_FETCH_TIMEOUT = 5
+THUMBNAIL_MAX_AGE = 30 * 86400
+THUMBNAIL_ALLOWED_HOSTS = (
+    'mlstatic.com',
+    'media-amazon.com',
+    'ssl-images-amazon.com',
+    'images-amazon.com',
+    'alicdn.com',
+    'ebayimg.com',
+    'fravega.com',
+    'megatone.net',
+)
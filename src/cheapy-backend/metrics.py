@@ -0,0 +1,343 @@
+"""
+Métricas compartidas de Cheapy en formato Prometheus.
+
+La API, los workers de Celery y los procesos de Scrapy corren en procesos
+distintos (y a veces en máquinas distintas), por lo que las métricas no se
+guardan en memoria: cada proceso las acumula en hashes de Redis y la API las
+expone todas juntas en formato de texto de Prometheus.
+
+Las métricas nunca deben interrumpir el trabajo real: cualquier error de
+Redis se registra en debug y se ignora.
+"""
+
+import logging
+import redis
+import redis.asyncio
+from config import REDIS_URL
+
+logger = logging.getLogger("cheapy.metrics")
+
+KEY_PREFIX = "metrics"
+
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+# Definición de las métricas conocidas: nombre -> (tipo, descripción, buckets)
+METRICS = {
+    'cheapy_queue_wait_seconds': (
+        'histogram', 'Tiempo que una tarea de spider espera en la cola de Celery.', DEFAULT_BUCKETS,
+    ),
+    'cheapy_ratelimit_wait_seconds': (
+        'histogram', 'Espera impuesta por el rate limiter compartido antes de cada request.',
+        (0, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30),
+    ),
+    'cheapy_http_request_duration_seconds': (
+        'histogram', 'Latencia de los endpoints de la API.', (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+    ),
+    'cheapy_celery_queue_depth': (
+        'gauge', 'Mensajes pendientes en cada cola de Celery.', None,
+    ),
+    'cheapy_task_duration_seconds': (
+        'histogram', 'Duración de las tareas de spider por spider y resultado.', DEFAULT_BUCKETS,
+    ),
+    'cheapy_items_scraped_total': (
+        'counter', 'Items que atravesaron todos los pipelines, por spider.', None,
+    ),
+    'cheapy_items_dropped_total': (
+        'counter', 'Items descartados por pipeline y motivo.', None,
+    ),
+    'cheapy_httpcache_requests_total': (
+        'counter', 'Consultas a la caché HTTP compartida por spider y resultado (hit/miss).', None,
+    ),
+    'cheapy_httpcache_bytes_saved_total': (
+        'counter', 'Bytes de respuesta servidos desde la caché HTTP en lugar de descargarse.', None,
+    ),
+    'cheapy_refresh_pages_total': (
+        'counter', 'Páginas de producto refrescadas por resultado (not_modified/hash_unchanged/parsed).', None,
+    ),
+    'cheapy_refresh_bytes_total': (
+        'counter', 'Bytes de páginas de producto descargados y ahorrados por requests condicionales.', None,
+    ),
+    'cheapy_admission_total': (
+        'counter', 'Búsquedas por decisión del control de admisión (admitted/cache_only/rejected) y motivo.', None,
+    ),
+    'cheapy_admission_wait_seconds': (
+        'gauge', 'Espera estimada en cola por clase de spider, según profundidad y capacidad de los workers.', None,
+    ),
+    'cheapy_hedges_total': (
+        'counter', 'Duplicados de crawls rezagados por spider y resultado (fired/won/lost/no_budget).', None,
+    ),
+    'cheapy_store_blocks_total': (
+        'counter', 'Respuestas de bloqueo (captcha, verificación, 429) detectadas por spider y motivo.', None,
+    ),
+    'cheapy_circuit_trips_total': (
+        'counter', 'Aperturas del circuit breaker de cada tienda.', None,
+    ),
+    'cheapy_circuit_open_seconds': (
+        'gauge', 'Segundos que le quedan abierto al circuito de cada tienda (0 si está cerrado).', None,
+    ),
+    'cheapy_sessions_total': (
+        'counter', 'Sesiones de tienda por crawl: reutilizadas, nuevas o descartadas por bloqueo.', None,
+    ),
+    'cheapy_first_response_seconds': (
+        'histogram', 'Tiempo hasta la primera respuesta buena de un crawl, con sesión reutilizada o nueva.',
+        DEFAULT_BUCKETS,
+    ),
+    'cheapy_thumbnails_total': (
+        'counter', 'Pedidos a /img por resultado: hit, miss (se creó la miniatura), error o rejected.', None,
+    ),
+    'cheapy_thumbnail_bytes_total': (
+        'counter', 'Bytes de las imágenes originales descargadas y de sus miniaturas.', None,
+    ),
+    'cheapy_playwright_page_seconds': (
+        'histogram', 'Tiempo de carga y renderizado de páginas con Playwright.', DEFAULT_BUCKETS,
+    ),
+}
+
+_client = None
+_async_client = None
+
+
+def get_client():
+    """
+    Retorna el cliente Redis compartido para métricas, creándolo en el primer uso.
+
+    Returns:
+        redis.Redis: Cliente conectado a REDIS_URL
+    """
+    global _client
+    if _client is None:
+        _client = redis.Redis.from_url(REDIS_URL, socket_timeout=1)
+    return _client
+
+
+def get_async_client():
+    """
+    Retorna el cliente redis.asyncio compartido para métricas, para usar desde la API.
+
+    Returns:
+        redis.asyncio.Redis: Cliente conectado a REDIS_URL
+    """
+    global _async_client
+    if _async_client is None:
+        _async_client = redis.asyncio.Redis.from_url(REDIS_URL, socket_timeout=1)
+    return _async_client
+
+
+def _labels_key(labels: dict) -> str:
+    """Serializa las etiquetas en el formato de Prometheus, ordenadas por nombre."""
+    return ','.join(f'{k}="{_escape(v)}"' for k, v in sorted(labels.items()))
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def inc(name: str, value: float = 1, **labels):
+    """
+    Incrementa un contador.
+
+    Args:
+        name: Nombre de la métrica (debe estar en METRICS)
+        value: Cantidad a sumar
+        **labels: Etiquetas de la serie
+    """
+    try:
+        get_client().hincrbyfloat(f"{KEY_PREFIX}:{name}", _labels_key(labels), value)
+    except Exception as e:
+        logger.debug("No se pudo registrar la métrica %s: %s", name, e)
+
+
+async def inc_async(name: str, value: float = 1, **labels):
+    """Variante de `inc` para código asíncrono: no bloquea el event loop de la API."""
+    try:
+        await get_async_client().hincrbyfloat(f"{KEY_PREFIX}:{name}", _labels_key(labels), value)
+    except Exception as e:
+        logger.debug("No se pudo registrar la métrica %s: %s", name, e)
+
+
+def set_gauge(name: str, value: float, **labels):
+    """
+    Fija el valor actual de un gauge.
+
+    Args:
+        name: Nombre de la métrica (debe estar en METRICS)
+        value: Valor actual
+        **labels: Etiquetas de la serie
+    """
+    try:
+        get_client().hset(f"{KEY_PREFIX}:{name}", _labels_key(labels), value)
+    except Exception as e:
+        logger.debug("No se pudo registrar la métrica %s: %s", name, e)
+
+
+def _observe_into(pipe, name: str, value: float, labels: dict):
+    """Encola en `pipe` las actualizaciones de buckets, suma y conteo de un histograma."""
+    buckets = METRICS.get(name, (None, None, DEFAULT_BUCKETS))[2] or DEFAULT_BUCKETS
+    key = f"{KEY_PREFIX}:{name}"
+    base = _labels_key(labels)
+    for bound in buckets:
+        if value <= bound:
+            pipe.hincrbyfloat(key, f"{base}|le={bound}", 1)
+    pipe.hincrbyfloat(key, f"{base}|le=+Inf", 1)
+    pipe.hincrbyfloat(key, f"{base}|sum", value)
+    pipe.hincrbyfloat(key, f"{base}|count", 1)
+
+
+def observe(name: str, value: float, **labels):
+    """
+    Registra una observación en un histograma.
+
+    Todas las actualizaciones de buckets, suma y conteo se envían en un único
+    pipeline de Redis para mantener un solo round-trip por observación.
+
+    Args:
+        name: Nombre de la métrica (debe estar en METRICS)
+        value: Valor observado (normalmente segundos)
+        **labels: Etiquetas de la serie
+    """
+    try:
+        pipe = get_client().pipeline(transaction=False)
+        _observe_into(pipe, name, value, labels)
+        pipe.execute()
+    except Exception as e:
+        logger.debug("No se pudo registrar la métrica %s: %s", name, e)
+
+
+async def observe_async(name: str, value: float, **labels):
+    """
+    Variante de `observe` para código asíncrono: no bloquea el event loop de la API.
+
+    Args:
+        name: Nombre de la métrica (debe estar en METRICS)
+        value: Valor observado (normalmente segundos)
+        **labels: Etiquetas de la serie
+    """
+    try:
+        pipe = get_async_client().pipeline(transaction=False)
+        _observe_into(pipe, name, value, labels)
+        await pipe.execute()
+    except Exception as e:
+        logger.debug("No se pudo registrar la métrica %s: %s", name, e)
+
+
+class Batch:
+    """
+    Acumula métricas en memoria y las envía a Redis en un único pipeline.
+
+    Pensado para procesos que generan muchas observaciones, como un crawl de
+    Scrapy: en lugar de un round-trip por item o por página, se acumula todo y
+    se llama a `flush()` al final (o periódicamente).
+    """
+
+    def __init__(self):
+        self.counters = {}
+        self.observations = []
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = (name, _labels_key(labels))
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels):
+        self.observations.append((name, value, labels))
+
+    def flush(self):
+        """Envía todo lo acumulado a Redis y vacía el lote."""
+        if not self.counters and not self.observations:
+            return
+        try:
+            pipe = get_client().pipeline(transaction=False)
+            for (name, labels_key), value in self.counters.items():
+                pipe.hincrbyfloat(f"{KEY_PREFIX}:{name}", labels_key, value)
+            for name, value, labels in self.observations:
+                _observe_into(pipe, name, value, labels)
+            pipe.execute()
+        except Exception as e:
+            logger.debug("No se pudo enviar el lote de métricas: %s", e)
+        self.counters.clear()
+        self.observations.clear()
+
+
+def histogram_quantile(name: str, series: dict, q: float, **labels):
+    """
+    Estima un cuantil de un histograma a partir de sus buckets acumulados, como
+    `histogram_quantile` de Prometheus: interpola linealmente dentro del bucket.
+
+    Args:
+        name: Nombre del histograma (debe estar en METRICS)
+        series: Contenido del hash del histograma en Redis (HGETALL)
+        q: Cuantil entre 0 y 1
+        **labels: Etiquetas de la serie
+
+    Returns:
+        tuple: (valor estimado o None si no hay observaciones, cantidad de observaciones)
+    """
+    buckets = METRICS[name][2] or DEFAULT_BUCKETS
+    base = _labels_key(labels)
+    decoded = {k.decode() if isinstance(k, bytes) else k: float(v) for k, v in series.items()}
+    count = decoded.get(f"{base}|count", 0)
+    if not count:
+        return None, 0
+    rank = q * count
+    lower, below = 0.0, 0.0
+    for bound in buckets:
+        cumulative = decoded.get(f"{base}|le={bound}", 0)
+        if cumulative >= rank:
+            inside = cumulative - below
+            return lower + (bound - lower) * ((rank - below) / inside if inside else 1), int(count)
+        lower, below = float(bound), cumulative
+    # El cuantil cae en el bucket +Inf: el mejor estimado es el último límite
+    return float(buckets[-1]), int(count)
+
+
+def _format_number(raw) -> str:
+    value = float(raw)
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+def _join_labels(base: str, extra: str) -> str:
+    parts = [p for p in (base, extra) if p]
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+def render() -> str:
+    """
+    Genera la exposición de todas las métricas en formato de texto de Prometheus.
+
+    Returns:
+        str: Cuerpo listo para servir en /metrics
+    """
+    client = get_client()
+    pipe = client.pipeline(transaction=False)
+    names = list(METRICS)
+    for name in names:
+        pipe.hgetall(f"{KEY_PREFIX}:{name}")
+    values = pipe.execute()
+
+    lines = []
+    for name, series in zip(names, values):
+        kind, help_text, buckets = METRICS[name]
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        decoded = {k.decode() if isinstance(k, bytes) else k: v for k, v in series.items()}
+
+        if kind != 'histogram':
+            for labels, value in sorted(decoded.items()):
+                lines.append(f"{name}{_join_labels(labels, '')} {_format_number(value)}")
+            continue
+
+        # Agrupar campos del histograma por serie de etiquetas
+        by_series = {}
+        for field, value in decoded.items():
+            base, _, part = field.rpartition('|')
+            by_series.setdefault(base, {})[part] = value
+
+        for base, parts in sorted(by_series.items()):
+            # observe() ya incrementa cada bucket que contiene al valor: los conteos son acumulados
+            for bound in list(buckets) + ['+Inf']:
+                count = parts.get(f"le={bound}", 0)
+                le_label = 'le="%s"' % bound
+                lines.append(f"{name}_bucket{_join_labels(base, le_label)} {_format_number(count)}")
+            lines.append(f"{name}_sum{_join_labels(base, '')} {_format_number(parts.get('sum', 0))}")
+            lines.append(f"{name}_count{_join_labels(base, '')} {_format_number(parts.get('count', 0))}")
+
+    return '\n'.join(lines) + '\n'
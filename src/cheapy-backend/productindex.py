@@ -0,0 +1,203 @@
+"""
+Índice local de productos ya scrapeados, para responder /buscar al instante.
+
+Cada crawl deja sus items en `productos.db` (ProductIndexPipeline) y /buscar
+consulta este índice mientras corren los spiders: el usuario ve enseguida los
+productos que coinciden con su búsqueda, marcados con la antigüedad de su
+último precio visto, y los resultados en vivo los reemplazan al terminar.
+
+Esquema:
+
+    products      un registro por (país, producto), con el título, la tienda,
+                  el último precio visto y `last_seen`. El producto se
+                  identifica por host y path de su URL (watchlists.product_key),
+                  así las variantes con parámetros de tracking no se duplican.
+    products_fts  tabla FTS5 de contenido externo sobre `products` (título y
+                  país). Los triggers la mantienen al día. Volver a ver un
+                  producto le asigna un id nuevo (el mayor de la tabla) y
+                  mueve su entrada del índice de texto: así el orden de rowid
+                  es siempre el orden de `last_seen`, y un producto agregado
+                  hace tiempo pero visto recién no queda detrás de otros
+                  agregados después y no vueltos a ver.
+
+La búsqueda filtra el país dentro de la consulta FTS5 (columna `country`) y
+toma las coincidencias de rowid más alto (las vistas más recientemente) del
+índice de texto antes de unir con `products`, sin ordenar por bm25: calcular bm25 obliga a recorrer todas las
+filas que contienen cada palabra, cientos de miles para búsquedas comunes.
+Así el costo no depende del tamaño de la tabla ni de lo común de la búsqueda
+(`python -m benchmarks.productindex` mide la latencia con millones de filas).
+La tabla heredada `resultados` de la misma base no se modifica.
+"""
+
+import re
+import sqlite3
+import time
+from pathlib import Path
+
+from config import PRODUCT_INDEX_CANDIDATES, PRODUCT_INDEX_MAX_AGE, PRODUCT_INDEX_MAX_RESULTS
+from watchlists import product_key
+
+DB_FILE = Path(__file__).resolve().parent / "productos.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS products (
+    id INTEGER PRIMARY KEY, country TEXT NOT NULL, product_key TEXT NOT NULL,
+    url TEXT NOT NULL, title TEXT NOT NULL, source TEXT, price REAL, currency TEXT,
+    image_url TEXT, last_seen REAL NOT NULL,
+    UNIQUE (country, product_key)
+);
+CREATE INDEX IF NOT EXISTS idx_products_last_seen ON products (last_seen);
+CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5 (
+    title, country, content='products', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS products_ai AFTER INSERT ON products BEGIN
+    INSERT INTO products_fts (rowid, title, country) VALUES (new.id, new.title, new.country);
+END;
+CREATE TRIGGER IF NOT EXISTS products_ad AFTER DELETE ON products BEGIN
+    INSERT INTO products_fts (products_fts, rowid, title, country) VALUES ('delete', old.id, old.title, old.country);
+END;
+"""
+
+# Un producto vuelto a ver toma un id nuevo (ver UPSERT): su entrada del índice de texto se
+# mueve con él, así el orden de rowid del índice es el orden de `last_seen`
+UPDATE_TRIGGER = """
+CREATE TRIGGER IF NOT EXISTS products_au AFTER UPDATE OF id, title ON products
+WHEN old.id != new.id OR old.title IS NOT new.title BEGIN
+    INSERT INTO products_fts (products_fts, rowid, title, country) VALUES ('delete', old.id, old.title, old.country);
+    INSERT INTO products_fts (rowid, title, country) VALUES (new.id, new.title, new.country);
+END;
+"""
+
+# Versión del esquema (PRAGMA user_version). La 1 reemplaza el trigger de actualización de
+# las bases creadas antes, que sólo reindexaba cambios de título.
+SCHEMA_VERSION = 1
+
+UPSERT = """
+INSERT INTO products (country, product_key, url, title, source, price, currency, image_url, last_seen)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (country, product_key) DO UPDATE SET
+    url = excluded.url, source = excluded.source, price = excluded.price, currency = excluded.currency,
+    image_url = COALESCE(excluded.image_url, image_url), title = excluded.title, last_seen = excluded.last_seen,
+    id = (SELECT MAX(id) FROM products) + 1
+WHERE excluded.last_seen >= last_seen
+"""
+
+TOKEN_RE = re.compile(r"\w+")
+
+
+def connect(db_file=None) -> sqlite3.Connection:
+    """Abre la base de productos y crea el esquema del índice si hace falta."""
+    conn = sqlite3.connect(db_file or DB_FILE, timeout=5, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(SCHEMA)
+    if conn.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+        conn.executescript(
+            f"BEGIN; DROP TRIGGER IF EXISTS products_au; {UPDATE_TRIGGER} "
+            f"PRAGMA user_version = {SCHEMA_VERSION}; COMMIT;"
+        )
+    return conn
+
+
+def match_expression(query: str, country: str) -> str:
+    """
+    Consulta FTS5 para una búsqueda: todas sus palabras en el título y el país.
+
+    Cada palabra va entre comillas, así los operadores de FTS5 (AND, OR, NEAR,
+    `*`, `:`) que escriba el usuario se buscan como texto.
+
+    Returns:
+        str: Expresión para MATCH, o cadena vacía si la búsqueda no tiene palabras
+    """
+    tokens = TOKEN_RE.findall((query or '').lower())
+    if not tokens:
+        return ''
+    words = ' '.join(f'"{token}"' for token in dict.fromkeys(tokens))
+    return f'{{title}} : ({words}) AND {{country}} : "{country.lower()}"'
+
+
+def item_row(item: dict, country: str, seen: float):
+    """
+    Fila de `products` para un item de salida del crawl (ProductItem.to_output()).
+
+    Returns:
+        tuple or None: None si al item le falta URL, título o precio
+    """
+    url = item.get('url')
+    title = (item.get('title') or '').strip()
+    price = item.get('price_numeric')
+    if not url or not title or not isinstance(price, (int, float)):
+        return None
+    return (
+        country, product_key(url), url, title, item.get('source'), float(price),
+        item.get('currency'), item.get('image_url'), seen,
+    )
+
+
+def upsert(conn: sqlite3.Connection, rows: list):
+    """
+    Inserta o actualiza productos en una única transacción.
+
+    Una fila más vieja que la guardada (otro crawl la vio después) no se aplica.
+
+    Args:
+        conn: Conexión abierta con connect()
+        rows: Filas armadas con item_row()
+    """
+    with conn:
+        conn.executemany(UPSERT, rows)
+
+
+def prune(conn: sqlite3.Connection, max_age: float, now: float = None) -> int:
+    """Elimina los productos no vistos en `max_age` segundos; retorna cuántos."""
+    with conn:
+        cursor = conn.execute("DELETE FROM products WHERE last_seen < ?", ((now or time.time()) - max_age,))
+    return cursor.rowcount
+
+
+def search(query: str, country: str, limit: int = PRODUCT_INDEX_MAX_RESULTS,
+           max_age: float = PRODUCT_INDEX_MAX_AGE, now: float = None, db_file=None) -> list:
+    """
+    Productos del índice con todas las palabras de la búsqueda, los vistos más recientemente primero.
+
+    Se consideran los PRODUCT_INDEX_CANDIDATES productos vistos más
+    recientemente entre los que coinciden (los de rowid más alto, ver
+    UPDATE_TRIGGER); de ellos se retornan los vistos dentro de `max_age`.
+
+    Args:
+        query: Búsqueda del usuario
+        country: Código de país de la búsqueda
+        limit: Máximo de productos a retornar
+        max_age: Antigüedad máxima del último precio visto, en segundos
+        now: Instante de referencia para la antigüedad (por defecto, ahora)
+
+    Returns:
+        list: Diccionarios con el formato de los resultados de /resultados
+            (title, url, image_url, source, price_numeric, currency) más
+            'local': True, 'last_seen' y 'age_seconds'
+    """
+    expression = match_expression(query, country)
+    if not expression:
+        return []
+    now = now or time.time()
+    conn = connect(db_file)
+    try:
+        # Candidatos: las coincidencias vistas más recientemente, recorriendo el índice de texto
+        # desde el final (no se calcula bm25, que lee la lista completa de cada palabra)
+        rows = conn.execute(
+            "SELECT p.url, p.title, p.image_url, p.source, p.price, p.currency, p.last_seen "
+            "FROM (SELECT rowid FROM products_fts WHERE products_fts MATCH ? ORDER BY rowid DESC LIMIT ?) AS m "
+            "JOIN products p ON p.id = m.rowid "
+            "WHERE p.country = ? AND p.last_seen >= ? ORDER BY p.last_seen DESC LIMIT ?",
+            (expression, max(limit, PRODUCT_INDEX_CANDIDATES), country, now - max_age, limit),
+        ).fetchall()
+    finally:
+        conn.close()
+    return [
+        {
+            'title': row['title'], 'url': row['url'], 'image_url': row['image_url'], 'source': row['source'],
+            'price_numeric': row['price'], 'currency': row['currency'], 'local': True,
+            'last_seen': row['last_seen'], 'age_seconds': max(0, int(now - row['last_seen'])),
+        }
+        for row in rows
+    ]
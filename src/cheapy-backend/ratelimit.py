@@ -0,0 +1,142 @@
+"""
+Limitador de tasa tipo token bucket compartido vía Redis.
+
+El estado de cada bucket vive en Redis y se actualiza con un script Lua
+atómico, por lo que todos los procesos que usan la misma clave (por ejemplo,
+todos los crawls de MercadoLibre en todos los workers) comparten el mismo
+presupuesto.
+
+El bucket funciona por reserva: cada llamada consume un token aunque el bucket
+esté vacío y devuelve cuántos segundos debe esperar el llamador antes de usarlo.
+Así cada request cuesta un único round-trip a Redis y los turnos se respetan en
+orden de llegada, sin reintentos.
+
+Para límites que rechazan en lugar de hacer esperar (como la admisión de
+búsquedas por cliente) `try_acquire` sólo consume si hay tokens: un pedido
+rechazado no endeuda al bucket, y reintentar tras la espera indicada funciona.
+"""
+
+from stores import store_for_host
+
+KEY_PREFIX = "ratelimit"
+
+# KEYS[1]: clave del bucket. ARGV: rate (tokens/s), burst, costo de la reserva.
+# Retorna la espera en segundos como string (Lua trunca los números a enteros).
+TOKEN_BUCKET_LUA = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate) - cost
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil((burst - tokens) / rate) + 60)
+if tokens >= 0 then
+    return '0'
+end
+return tostring(-tokens / rate)
+"""
+
+
+# Igual que TOKEN_BUCKET_LUA, pero sin consumir cuando no alcanzan los tokens.
+# Retorna '0' si los consumió o los segundos hasta que alcancen.
+TRY_ACQUIRE_LUA = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+local wait = 0
+if tokens >= cost then
+    tokens = tokens - cost
+else
+    wait = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil((burst - tokens) / rate) + 60)
+return tostring(wait)
+"""
+
+
+class RedisTokenBucket:
+    """
+    Token bucket distribuido sobre Redis.
+
+    Acepta tanto un cliente `redis.Redis` como uno `redis.asyncio.Redis`;
+    con el segundo se debe usar `areserve`.
+
+    Attributes:
+        client: Cliente Redis (sync o async)
+        prefix (str): Prefijo de las claves en Redis
+    """
+
+    def __init__(self, client, prefix: str = KEY_PREFIX):
+        self.client = client
+        self.prefix = prefix
+        self._script = client.register_script(TOKEN_BUCKET_LUA)
+        self._try_script = client.register_script(TRY_ACQUIRE_LUA)
+
+    def _args(self, key: str, rate: float, burst: float, cost: float):
+        return {'keys': [f"{self.prefix}:{key}"], 'args': [rate, burst, cost]}
+
+    def reserve(self, key: str, rate: float, burst: float, cost: float = 1) -> float:
+        """
+        Reserva `cost` tokens del bucket `key`.
+
+        Args:
+            key: Identificador del bucket (ej: hostname de la tienda)
+            rate: Tokens repuestos por segundo
+            burst: Capacidad máxima del bucket
+            cost: Tokens a consumir
+
+        Returns:
+            float: Segundos que el llamador debe esperar antes de continuar (0 si puede seguir ya)
+        """
+        return float(self._script(**self._args(key, rate, burst, cost)))
+
+    async def areserve(self, key: str, rate: float, burst: float, cost: float = 1) -> float:
+        """Versión asíncrona de `reserve` para clientes `redis.asyncio`."""
+        return float(await self._script(**self._args(key, rate, burst, cost)))
+
+    def try_acquire(self, key: str, rate: float, burst: float, cost: float = 1) -> float:
+        """
+        Consume `cost` tokens del bucket `key` sólo si están disponibles.
+
+        Returns:
+            float: 0 si se consumieron, o los segundos hasta que haya suficientes
+        """
+        return float(self._try_script(**self._args(key, rate, burst, cost)))
+
+    async def atry_acquire(self, key: str, rate: float, burst: float, cost: float = 1) -> float:
+        """Versión asíncrona de `try_acquire` para clientes `redis.asyncio`."""
+        return float(await self._try_script(**self._args(key, rate, burst, cost)))
+
+
+def budget_for_host(host: str, budgets: dict):
+    """
+    Busca el presupuesto que corresponde a un hostname y la clave de su bucket.
+
+    La clave es el dominio de la tienda (stores.store_for_host, ej:
+    'listado.mercadolibre.com.ar' -> 'mercadolibre.com.ar'): todos los
+    subdominios de una tienda comparten el bucket, y cada dominio de país
+    mantiene el suyo.
+
+    Args:
+        host: Hostname de la request (ej: 'listado.mercadolibre.com.ar')
+        budgets: Diccionario tienda -> {'rate', 'burst'} (ver STORE_RATE_LIMITS)
+
+    Returns:
+        tuple: (clave del bucket, presupuesto), o (None, None) si el host no está limitado
+    """
+    store, domain = store_for_host(host)
+    budget = budgets.get(store)
+    if not budget:
+        return None, None
+    return domain, budget
@@ -0,0 +1,40 @@
+"""
+Tienda de cada request, resuelta por su hostname.
+
+Los spiders de búsqueda piden a una sola tienda y se identifican con ella por
+su nombre, pero `refresh` mezcla en un crawl productos de todas. Por eso el
+límite de tasa, la caché HTTP, el circuit breaker y las sesiones no usan el
+nombre del spider sino la tienda del host de cada request, según la tabla
+STORE_HOSTS de config.py.
+"""
+
+from config import STORE_HOSTS
+
+
+def store_for_host(host: str) -> tuple:
+    """
+    Busca la tienda de un hostname.
+
+    El host es de una tienda si es uno de sus dominios de STORE_HOSTS o un
+    subdominio de él: se comparan sufijos enteros de etiquetas, así
+    'amazon.attacker.com' o 'freebay.example' no son de ninguna tienda.
+
+    Args:
+        host: Hostname de la request (ej: 'listado.mercadolibre.com.ar')
+
+    Returns:
+        tuple: (tienda, dominio), con el dominio de STORE_HOSTS que coincidió
+            (ej: ('mercadolibre', 'mercadolibre.com.ar')), o (None, None) si el
+            host no es de ninguna tienda conocida
+    """
+    labels = (host or '').lower().rstrip('.').split('.')
+    for index in range(len(labels) - 1):
+        domain = '.'.join(labels[index:])
+        if domain in STORE_HOSTS:
+            return STORE_HOSTS[domain], domain
+    return None, None
+
+
+def resolve_store(spider_name: str, host: str) -> str:
+    """Tienda de una request: la de su host o, si no es conocido, la del spider."""
+    return store_for_host(host)[0] or spider_name
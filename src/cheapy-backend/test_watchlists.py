@@ -0,0 +1,174 @@
+"""Pruebas de la programación de objetivos y las alertas de watchlists.py."""
+
+import random
+
+import pytest
+
+import watchlists
+from config import WATCH_JITTER, WATCH_MIN_DROP_PERCENT, WATCH_MIN_INTERVAL
+
+PRODUCT_URL = 'https://www.fravega.com/p/televisor-50-123/'
+
+
+@pytest.fixture
+def db(tmp_path):
+    return tmp_path / 'watchlists.db'
+
+
+def targets(db):
+    conn = watchlists.connect(db)
+    try:
+        return [dict(row) for row in conn.execute("SELECT * FROM targets ORDER BY next_run")]
+    finally:
+        conn.close()
+
+
+def due(db, now, **kwargs):
+    return watchlists.claim_due_targets(now=now, db_file=db, **kwargs)
+
+
+def test_watches_of_the_same_query_share_one_target(db):
+    watchlists.add_watch('ana', 'AR', 'Smart TV', interval=7200, db_file=db)
+    watchlists.add_watch('beto', 'AR', '  smart   tv ', interval=WATCH_MIN_INTERVAL, db_file=db)
+    watchlists.add_watch('carla', 'AR', 'smart tv', product_url=PRODUCT_URL, db_file=db)
+    watchlists.add_watch('dani', 'AR', 'SMART TV', product_url=PRODUCT_URL + '?utm_source=x', db_file=db)
+    watchlists.add_watch('ana', 'CL', 'smart tv', db_file=db)
+
+    rows = targets(db)
+    assert sorted((row['country'], row['norm_query']) for row in rows) == [('AR', 'smart tv'), ('CL', 'smart tv')]
+    # El objetivo usa el intervalo más corto de sus seguimientos
+    assert next(row for row in rows if row['country'] == 'AR')['interval'] == WATCH_MIN_INTERVAL
+
+    claimed = due(db, now=max(row['next_run'] for row in rows) + 1)
+    ar = next(target for target in claimed if target['country'] == 'AR')
+    assert ar['listing'] is True
+    assert ar['product_urls'] == [PRODUCT_URL, PRODUCT_URL + '?utm_source=x']
+    assert len(claimed) == 2
+
+
+def test_claimed_target_is_not_due_again_until_rescheduled(db):
+    watchlists.add_watch('ana', 'AR', 'smart tv', interval=WATCH_MIN_INTERVAL, db_file=db)
+    now = targets(db)[0]['next_run'] + 1
+    assert len(due(db, now)) == 1
+    assert due(db, now) == []
+    assert due(db, now + WATCH_MIN_INTERVAL * (1 - WATCH_JITTER) - 2) == []
+    assert len(due(db, now + WATCH_MIN_INTERVAL * (1 + WATCH_JITTER))) == 1
+
+
+def test_product_only_target_skips_the_listing(db):
+    watchlists.add_watch('ana', 'AR', 'smart tv', product_url=PRODUCT_URL, db_file=db)
+    [target] = due(db, now=targets(db)[0]['next_run'] + 1)
+    assert target['listing'] is False
+    assert target['product_urls'] == [PRODUCT_URL]
+
+
+def test_claim_limit_takes_the_most_overdue_first(db):
+    for query in ('a', 'b', 'c'):
+        watchlists.add_watch('ana', 'AR', query, db_file=db)
+    order = [row['norm_query'] for row in targets(db)]
+    now = targets(db)[-1]['next_run'] + 1
+    assert [target['norm_query'] for target in due(db, now, limit=2)] == order[:2]
+    assert [target['norm_query'] for target in due(db, now, limit=2)] == order[2:]
+
+
+def test_new_targets_start_with_a_random_offset(db, monkeypatch):
+    monkeypatch.setattr(watchlists.time, 'time', lambda: 1000.0)
+    for query in ('a', 'b', 'c', 'd'):
+        watchlists.add_watch('ana', 'AR', query, interval=3600, db_file=db)
+    next_runs = [row['next_run'] for row in targets(db)]
+    assert all(1000.0 <= next_run <= 1000.0 + 3600 * WATCH_JITTER for next_run in next_runs)
+    assert len(set(next_runs)) > 1
+
+
+@pytest.mark.parametrize('jitter', [-WATCH_JITTER, 0.0, WATCH_JITTER])
+def test_reschedule_keeps_the_phase_plus_jitter(db, monkeypatch, jitter):
+    watchlists.add_watch('ana', 'AR', 'smart tv', interval=3600, db_file=db)
+    next_run = targets(db)[0]['next_run']
+    monkeypatch.setattr(random, 'uniform', lambda low, high: jitter)
+    due(db, now=next_run + 10)
+    [row] = targets(db)
+    assert row['next_run'] == pytest.approx(next_run + 3600 + jitter * 3600)
+    assert row['last_run'] == pytest.approx(next_run + 10)
+
+
+def test_overdue_target_is_rescheduled_from_now(db, monkeypatch):
+    watchlists.add_watch('ana', 'AR', 'smart tv', interval=3600, db_file=db)
+    now = targets(db)[0]['next_run'] + 3 * 3600
+    monkeypatch.setattr(random, 'uniform', lambda low, high: 0.0)
+    due(db, now)
+    assert targets(db)[0]['next_run'] == pytest.approx(now + 3600)
+
+
+def test_removing_the_last_watch_drops_the_target(db):
+    watch = watchlists.add_watch('ana', 'AR', 'smart tv', db_file=db)
+    assert watchlists.remove_watch('ana', watch['id'], db_file=db)
+    assert targets(db) == []
+
+
+def record(db, price, url=PRODUCT_URL, query='smart tv'):
+    item = {'query': query, 'url': url, 'price_numeric': price, 'title': 'TV', 'source': 'Frávega'}
+    return watchlists.record_results('AR', [item], db_file=db)
+
+
+def alerts(db, subscriber):
+    return watchlists.list_alerts(subscriber, db_file=db)
+
+
+def test_target_price_alerts_only_when_crossed(db):
+    watchlists.add_watch('ana', 'AR', 'smart tv', product_url=PRODUCT_URL, target_price=100, db_file=db)
+    assert record(db, 120) == 0
+    # Baja, pero sigue por encima del objetivo
+    assert record(db, 110) == 0
+    assert record(db, 95) == 1
+    [alert] = alerts(db, 'ana')
+    assert (alert['old_price'], alert['new_price']) == (110, 95)
+    # Ya estaba por debajo: no se repite
+    assert record(db, 90) == 0
+    # Sube por encima y vuelve a cruzar
+    assert record(db, 105) == 0
+    assert record(db, 100) == 1
+
+
+def test_first_price_under_target_alerts(db):
+    watchlists.add_watch('ana', 'AR', 'smart tv', product_url=PRODUCT_URL, target_price=100, db_file=db)
+    assert record(db, 80) == 1
+    assert alerts(db, 'ana')[0]['old_price'] is None
+
+
+def test_target_price_ignores_other_products_of_the_query(db):
+    watchlists.add_watch('ana', 'AR', 'smart tv', product_url=PRODUCT_URL, target_price=100, db_file=db)
+    assert record(db, 50, url='https://www.fravega.com/p/otro-televisor-456/') == 0
+
+
+def test_product_watch_without_target_alerts_on_any_drop(db):
+    watchlists.add_watch('ana', 'AR', 'smart tv', product_url=PRODUCT_URL, db_file=db)
+    assert record(db, 1000) == 0
+    assert record(db, 999) == 1
+    assert record(db, 999) == 0
+
+
+def test_query_watch_alerts_on_drops_above_the_minimum(db):
+    watchlists.add_watch('ana', 'AR', 'Smart TV', db_file=db)
+    assert record(db, 1000) == 0
+    assert record(db, 1000 * (1 - (WATCH_MIN_DROP_PERCENT - 1) / 100)) == 0
+    assert record(db, 500) == 1
+    [alert] = alerts(db, 'ana')
+    assert alert['drop_percent'] >= WATCH_MIN_DROP_PERCENT
+
+
+def test_items_without_price_are_ignored(db):
+    watchlists.add_watch('ana', 'AR', 'smart tv', product_url=PRODUCT_URL, target_price=100, db_file=db)
+    assert watchlists.record_results('AR', [{'query': 'smart tv', 'url': PRODUCT_URL, 'price_numeric': None}],
+                                     db_file=db) == 0
+
+
+@pytest.mark.parametrize('url, country, expected', [
+    (PRODUCT_URL, 'AR', True),
+    ('https://articulo.mercadolibre.com.ar/MLA-1', 'AR', True),
+    ('https://www.fravega.com.evil.example/p/1', 'AR', False),
+    ('https://www.fravega.com/p/1', 'CL', False),
+    ('http://127.0.0.1:6379/', 'AR', False),
+    ('file:///etc/passwd', 'AR', False),
+])
+def test_is_watchable_url(url, country, expected):
+    assert watchlists.is_watchable_url(url, country) is expected
@@ -0,0 +1,256 @@
+"""
+Trazas de extremo a extremo de una búsqueda.
+
+Una búsqueda atraviesa varios procesos: la API (`/buscar`), la cola de Celery,
+el worker, el subproceso de Scrapy (descargas, parseo, pipelines) y de nuevo la
+API al agregar resultados en `/resultados`. Este módulo define un formato de
+span mínimo y un exportador local para reconstruir en qué etapa se fue el tiempo.
+
+El identificador de traza es el mismo `task_id` que recibe la extensión, por lo
+que la traza completa se consulta con `get_trace(task_id)`.
+
+Cada span es un diccionario JSON con:
+    trace_id, span_id, parent_id, name, start (epoch), duration (s), attributes
+"""
+
+import atexit
+import functools
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+
+TRACE_DIR = Path(__file__).resolve().parent / "traces"
+TRACE_RETENTION_SECONDS = 86400
+
+
+def new_span_id() -> str:
+    """Genera un identificador de span corto y aleatorio."""
+    return uuid.uuid4().hex[:16]
+
+
+class FileExporter:
+    """
+    Exportador a archivos JSON-lines, uno por traza.
+
+    Cada proceso agrega sus spans al archivo de la traza con escrituras en modo
+    append, por lo que la API, los workers y los crawls pueden escribir en la
+    misma traza sin coordinarse.
+
+    `export` sólo encola el span: las escrituras las hace un hilo de fondo por
+    proceso, agrupando los spans pendientes de cada traza, así el event loop de
+    la API y el reactor de Scrapy nunca esperan al disco. Los spans pendientes
+    se escriben antes de leer una traza y al terminar el proceso.
+    """
+
+    PRUNE_INTERVAL = 3600
+
+    def __init__(self, directory: Path = TRACE_DIR, retention: int = TRACE_RETENTION_SECONDS):
+        self.directory = Path(directory)
+        self.retention = retention
+        self.last_prune = 0.0
+        self._lock = threading.Lock()
+        self._queue = None
+        self._pid = None
+        atexit.register(self.flush)
+
+    def _path(self, trace_id: str) -> Path:
+        # El trace_id llega desde URLs: no permitir separadores de ruta
+        return self.directory / f"{Path(trace_id).name}.jsonl"
+
+    def _pending(self) -> queue.Queue:
+        """Cola del hilo escritor del proceso actual (se recrea tras un fork, p. ej. en Celery)."""
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._queue = queue.Queue()
+                    threading.Thread(target=self._run, args=(self._queue,), name="trace-writer", daemon=True).start()
+                    self._pid = os.getpid()
+        return self._queue
+
+    def export(self, span: dict):
+        self._pending().put(span)
+
+    def _run(self, pending: queue.Queue):
+        while True:
+            spans = [pending.get()]
+            while True:
+                try:
+                    spans.append(pending.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._write(spans)
+            except Exception:
+                pass  # Las trazas nunca deben interrumpir el trabajo real
+            finally:
+                for _ in spans:
+                    pending.task_done()
+
+    def _write(self, spans: list):
+        by_trace = {}
+        for span in spans:
+            by_trace.setdefault(span['trace_id'], []).append(json.dumps(span) + '\n')
+        self.directory.mkdir(parents=True, exist_ok=True)
+        for trace_id, lines in by_trace.items():
+            with open(self._path(trace_id), 'a', encoding='utf-8') as f:
+                f.write(''.join(lines))
+        if time.time() - self.last_prune > self.PRUNE_INTERVAL:
+            self.prune()
+
+    def flush(self):
+        """Espera a que se escriban los spans encolados por este proceso."""
+        if self._pid == os.getpid():
+            self._queue.join()
+
+    def get(self, trace_id: str) -> list:
+        self.flush()
+        path = self._path(trace_id)
+        if not path.exists():
+            return []
+        with open(path, encoding='utf-8') as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def prune(self):
+        """Elimina trazas más antiguas que el período de retención."""
+        self.last_prune = time.time()
+        cutoff = self.last_prune - self.retention
+        for path in self.directory.glob('*.jsonl'):
+            try:
+                if path.stat().st_mtime < cutoff:
+                    path.unlink()
+            except OSError:
+                pass
+
+
+class InMemoryExporter:
+    """Exportador en memoria, útil para benchmarks y pruebas locales."""
+
+    def __init__(self):
+        self.spans = {}
+
+    def export(self, span: dict):
+        self.spans.setdefault(span['trace_id'], []).append(span)
+
+    def get(self, trace_id: str) -> list:
+        return list(self.spans.get(trace_id, []))
+
+
+_exporter = InMemoryExporter() if os.environ.get('CHEAPY_TRACE_EXPORTER') == 'memory' else FileExporter()
+
+
+def set_exporter(exporter):
+    """Reemplaza el exportador activo del proceso."""
+    global _exporter
+    _exporter = exporter
+
+
+def record_span(trace_id: str, name: str, start: float, end: float, parent_id: str = None,
+                span_id: str = None, **attributes) -> str:
+    """
+    Registra un span cuyos extremos ya fueron medidos.
+
+    Args:
+        trace_id: Identificador de la traza (task_id del grupo)
+        name: Nombre de la etapa (ej: 'queue', 'download')
+        start: Inicio en segundos epoch
+        end: Fin en segundos epoch
+        parent_id: Span padre, si lo hay
+        span_id: Identificador a usar; se genera uno si no se indica
+        **attributes: Atributos adicionales del span
+
+    Returns:
+        str: Identificador del span registrado
+    """
+    span_id = span_id or new_span_id()
+    if not trace_id:
+        return span_id
+    try:
+        _exporter.export({
+            'trace_id': trace_id,
+            'span_id': span_id,
+            'parent_id': parent_id,
+            'name': name,
+            'start': start,
+            'duration': max(0.0, end - start),
+            'attributes': attributes,
+        })
+    except Exception:
+        pass  # Las trazas nunca deben interrumpir el trabajo real
+    return span_id
+
+
+@contextmanager
+def span(trace_id: str, name: str, parent_id: str = None, span_id: str = None, **attributes):
+    """
+    Context manager que mide el bloque y registra un span al salir.
+
+    Yields:
+        str: Identificador del span, para usarlo como padre de spans anidados
+    """
+    span_id = span_id or new_span_id()
+    start = time.time()
+    try:
+        yield span_id
+    finally:
+        record_span(trace_id, name, start, time.time(), parent_id=parent_id, span_id=span_id, **attributes)
+
+
+def get_trace(trace_id: str) -> list:
+    """
+    Retorna los spans de una traza ordenados por inicio.
+
+    Args:
+        trace_id: Identificador de la traza (task_id)
+
+    Returns:
+        list: Lista de spans
+    """
+    return sorted(_exporter.get(trace_id), key=lambda s: s['start'])
+
+
+# Acumulación de etapas de alta frecuencia (un pipeline por item). En lugar de un
+# span por item se emite un span por etapa con el tiempo total y la cantidad de items.
+_stage_totals = {}
+
+
+def add_stage_time(trace_id: str, stage: str, start: float, duration: float):
+    """Suma la duración de una ejecución de `stage` al acumulado de la traza."""
+    totals = _stage_totals.setdefault((trace_id, stage), {'start': start, 'duration': 0.0, 'count': 0})
+    totals['duration'] += duration
+    totals['count'] += 1
+
+
+def flush_stages(trace_id: str, parent_id: str = None):
+    """Emite un span por cada etapa acumulada de la traza y limpia el acumulado."""
+    for key in [k for k in _stage_totals if k[0] == trace_id]:
+        totals = _stage_totals.pop(key)
+        record_span(
+            trace_id, key[1], totals['start'], totals['start'] + totals['duration'],
+            parent_id=parent_id, items=totals['count'],
+        )
+
+
+def traced_pipeline(method):
+    """
+    Decorador para `process_item` de pipelines de Scrapy.
+
+    Si el crawl tiene una traza activa (setting TRACE_ID), acumula el tiempo
+    que el pipeline dedica a cada item bajo la etapa 'pipeline.<Clase>'.
+    """
+    @functools.wraps(method)
+    def wrapper(self, item, spider):
+        trace_id = spider.crawler.settings.get('TRACE_ID') if getattr(spider, 'crawler', None) else None
+        if not trace_id:
+            return method(self, item, spider)
+        start = time.time()
+        perf_start = time.perf_counter()
+        try:
+            return method(self, item, spider)
+        finally:
+            add_stage_time(trace_id, f"pipeline.{type(self).__name__}", start, time.perf_counter() - perf_start)
+    return wrapper
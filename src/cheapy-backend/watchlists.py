@@ -0,0 +1,326 @@
+"""
+Seguimientos de búsquedas y productos, con alertas de baja de precio.
+
+Un seguimiento (watch) es la suscripción de un usuario a una búsqueda de un
+país, opcionalmente restringida a un producto (`product_url`) y a un precio
+objetivo. Muchos usuarios siguen las mismas búsquedas, así que lo que se
+programa no son los seguimientos sino los objetivos (targets): uno por
+(país, consulta normalizada), con el intervalo más corto entre sus
+suscriptores. Cada objetivo se scrapea a lo sumo una vez por intervalo en cada
+tienda del país, sin importar cuántos seguimientos lo comparten.
+
+Los seguimientos de producto comparten el objetivo de su búsqueda, pero se
+actualizan pidiendo la URL del producto (spider `refresh`, con requests
+condicionales); el listado de la búsqueda sólo se descarga si el objetivo
+tiene seguimientos de búsqueda.
+
+Para no concentrar la carga, cada objetivo nuevo arranca con un desfase
+aleatorio, cada reprogramación suma un jitter (así las fases se dispersan
+aunque muchos seguimientos se creen a la misma hora) y cada
+tick del scheduler despacha a lo sumo WATCH_MAX_TARGETS_PER_TICK objetivos
+(los más atrasados primero).
+
+Los precios vistos se guardan por (país, URL); cuando un producto baja de
+precio se generan alertas para los seguimientos afectados:
+    - de búsqueda: baja de al menos WATCH_MIN_DROP_PERCENT
+    - de producto: cualquier baja, o cruzar el precio objetivo si lo tiene
+"""
+
+import random
+import sqlite3
+import time
+from pathlib import Path
+from urllib.parse import urlsplit
+
+from config import (
+    COUNTRY_TO_SPIDERS, WATCH_DEFAULT_INTERVAL, WATCH_JITTER, WATCH_MAX_TARGETS_PER_TICK,
+    WATCH_MIN_DROP_PERCENT, WATCH_MIN_INTERVAL,
+)
+from stores import store_for_host
+
+DB_FILE = Path(__file__).resolve().parent / "watchlists.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS watches (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, subscriber TEXT NOT NULL, country TEXT NOT NULL,
+    query TEXT NOT NULL, norm_query TEXT NOT NULL, product_url TEXT, product_key TEXT,
+    target_price REAL, interval INTEGER NOT NULL, created REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_watches_subscriber ON watches (subscriber);
+CREATE INDEX IF NOT EXISTS idx_watches_target ON watches (country, norm_query);
+CREATE TABLE IF NOT EXISTS targets (
+    country TEXT NOT NULL, norm_query TEXT NOT NULL, query TEXT NOT NULL,
+    interval INTEGER NOT NULL, next_run REAL NOT NULL, last_run REAL,
+    PRIMARY KEY (country, norm_query)
+);
+CREATE INDEX IF NOT EXISTS idx_targets_next_run ON targets (next_run);
+CREATE TABLE IF NOT EXISTS prices (
+    country TEXT NOT NULL, product_key TEXT NOT NULL, price REAL NOT NULL, updated REAL NOT NULL,
+    PRIMARY KEY (country, product_key)
+);
+CREATE TABLE IF NOT EXISTS alerts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, watch_id INTEGER NOT NULL, subscriber TEXT NOT NULL,
+    query TEXT NOT NULL, url TEXT NOT NULL, title TEXT, source TEXT,
+    old_price REAL, new_price REAL NOT NULL, drop_percent REAL, created REAL NOT NULL,
+    delivered INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_alerts_subscriber ON alerts (subscriber, delivered);
+"""
+
+
+def normalize_query(query: str) -> str:
+    """Consulta en minúsculas y con espacios colapsados: la clave de deduplicación."""
+    return ' '.join((query or '').lower().split())
+
+
+def product_key(url: str) -> str:
+    """Host y path de la URL de un producto, sin parámetros de tracking ni fragmento."""
+    parts = urlsplit(url or '')
+    return f"{parts.netloc.lower()}{parts.path}"
+
+
+def is_watchable_url(url: str, country: str) -> bool:
+    """
+    True si la URL es de un producto que los workers pueden refrescar.
+
+    El spider `refresh` descarga la URL desde los workers, así que sólo se
+    aceptan URLs http(s) de una tienda del país (stores.py): nunca hosts
+    internos ni de terceros.
+    """
+    parts = urlsplit(url or '')
+    if parts.scheme not in ('http', 'https') or not parts.hostname:
+        return False
+    store, _ = store_for_host(parts.hostname)
+    return store is not None and store in COUNTRY_TO_SPIDERS.get(country, [])
+
+
+def connect(db_file=None) -> sqlite3.Connection:
+    """Abre la base de seguimientos y crea el esquema si hace falta."""
+    conn = sqlite3.connect(db_file or DB_FILE, timeout=5, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def _sync_target(conn, country: str, norm_query: str, query: str, now: float):
+    """Crea, actualiza o elimina el objetivo de (país, consulta) según sus seguimientos."""
+    interval = conn.execute(
+        "SELECT MIN(interval) FROM watches WHERE country = ? AND norm_query = ?", (country, norm_query)
+    ).fetchone()[0]
+    if interval is None:
+        conn.execute("DELETE FROM targets WHERE country = ? AND norm_query = ?", (country, norm_query))
+        return
+    row = conn.execute(
+        "SELECT next_run, interval FROM targets WHERE country = ? AND norm_query = ?", (country, norm_query)
+    ).fetchone()
+    if row is None:
+        # Primera corrida pronto, con un desfase aleatorio para que los objetivos creados juntos
+        # no queden en fase
+        conn.execute(
+            "INSERT INTO targets (country, norm_query, query, interval, next_run) VALUES (?, ?, ?, ?, ?)",
+            (country, norm_query, query, interval, now + random.uniform(0, interval * WATCH_JITTER)),
+        )
+    elif interval != row['interval']:
+        conn.execute(
+            "UPDATE targets SET interval = ?, next_run = MIN(next_run, ?) WHERE country = ? AND norm_query = ?",
+            (interval, now + interval, country, norm_query),
+        )
+
+
+def add_watch(subscriber: str, country: str, query: str, product_url: str = None,
+              target_price: float = None, interval: int = None, db_file=None) -> dict:
+    """
+    Registra un seguimiento y programa su objetivo.
+
+    Args:
+        subscriber: Identificador del suscriptor
+        country: Código de país de la búsqueda
+        query: Consulta a seguir
+        product_url: Producto puntual dentro de los resultados (opcional)
+        target_price: Precio objetivo del producto (opcional)
+        interval: Segundos entre actualizaciones (mínimo WATCH_MIN_INTERVAL)
+
+    Returns:
+        dict: Seguimiento creado
+    """
+    now = time.time()
+    interval = max(WATCH_MIN_INTERVAL, int(interval or WATCH_DEFAULT_INTERVAL))
+    norm_query = normalize_query(query)
+    conn = connect(db_file)
+    try:
+        with conn:
+            cursor = conn.execute(
+                "INSERT INTO watches (subscriber, country, query, norm_query, product_url, product_key, "
+                "target_price, interval, created) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (subscriber, country, query.strip(), norm_query, product_url,
+                 product_key(product_url) if product_url else None, target_price, interval, now),
+            )
+            _sync_target(conn, country, norm_query, query.strip(), now)
+        return dict(conn.execute("SELECT * FROM watches WHERE id = ?", (cursor.lastrowid,)).fetchone())
+    finally:
+        conn.close()
+
+
+def list_watches(subscriber: str, db_file=None) -> list:
+    """Seguimientos de un suscriptor, con la próxima actualización de su objetivo."""
+    conn = connect(db_file)
+    try:
+        rows = conn.execute(
+            "SELECT w.*, t.next_run, t.last_run FROM watches w "
+            "LEFT JOIN targets t ON t.country = w.country AND t.norm_query = w.norm_query "
+            "WHERE w.subscriber = ? ORDER BY w.id", (subscriber,)
+        ).fetchall()
+        return [dict(row) for row in rows]
+    finally:
+        conn.close()
+
+
+def remove_watch(subscriber: str, watch_id: int, db_file=None) -> bool:
+    """Elimina un seguimiento del suscriptor; retorna False si no existía."""
+    conn = connect(db_file)
+    try:
+        with conn:
+            row = conn.execute(
+                "SELECT country, norm_query, query FROM watches WHERE id = ? AND subscriber = ?", (watch_id, subscriber)
+            ).fetchone()
+            if row is None:
+                return False
+            conn.execute("DELETE FROM watches WHERE id = ?", (watch_id,))
+            _sync_target(conn, row['country'], row['norm_query'], row['query'], time.time())
+        return True
+    finally:
+        conn.close()
+
+
+def claim_due_targets(now: float = None, limit: int = WATCH_MAX_TARGETS_PER_TICK, db_file=None) -> list:
+    """
+    Toma los objetivos vencidos y los reprograma en la misma transacción.
+
+    La reprogramación conserva la fase del objetivo (próxima = anterior +
+    intervalo) más un jitter de ±WATCH_JITTER; si el objetivo quedó atrasado
+    más de un intervalo, se reprograma desde ahora.
+
+    Returns:
+        list: Diccionarios con 'country', 'norm_query', 'query', 'listing' (hay
+            seguimientos de búsqueda) y 'product_urls' (productos seguidos)
+    """
+    now = now or time.time()
+    conn = connect(db_file)
+    try:
+        with conn:
+            # BEGIN IMMEDIATE: dos schedulers no pueden tomar el mismo objetivo
+            conn.execute("BEGIN IMMEDIATE")
+            rows = conn.execute(
+                "SELECT country, norm_query, query, interval, next_run FROM targets "
+                "WHERE next_run <= ? ORDER BY next_run LIMIT ?", (now, limit)
+            ).fetchall()
+            for row in rows:
+                next_run = row['next_run'] + row['interval']
+                if next_run <= now:
+                    next_run = now + row['interval']
+                next_run += random.uniform(-WATCH_JITTER, WATCH_JITTER) * row['interval']
+                conn.execute(
+                    "UPDATE targets SET next_run = ?, last_run = ? WHERE country = ? AND norm_query = ?",
+                    (next_run, now, row['country'], row['norm_query']),
+                )
+            targets = []
+            for row in rows:
+                watches = conn.execute(
+                    "SELECT product_url FROM watches WHERE country = ? AND norm_query = ?",
+                    (row['country'], row['norm_query']),
+                ).fetchall()
+                product_urls = list(dict.fromkeys(w['product_url'] for w in watches if w['product_url']))
+                targets.append({
+                    'country': row['country'], 'norm_query': row['norm_query'], 'query': row['query'],
+                    'listing': any(w['product_url'] is None for w in watches), 'product_urls': product_urls,
+                })
+        return targets
+    finally:
+        conn.close()
+
+
+def record_results(country: str, items: list, db_file=None) -> int:
+    """
+    Actualiza los precios vistos y genera alertas de baja para los seguimientos.
+
+    Args:
+        country: País de los crawls
+        items: Items de los crawls de seguimiento (con 'query', 'url' y 'price_numeric')
+
+    Returns:
+        int: Alertas generadas
+    """
+    now = time.time()
+    created = 0
+    conn = connect(db_file)
+    try:
+        with conn:
+            watches_by_query = {}
+            for item in items:
+                price = item.get('price_numeric')
+                if not item.get('url') or not isinstance(price, (int, float)):
+                    continue
+                key = product_key(item['url'])
+                row = conn.execute(
+                    "SELECT price FROM prices WHERE country = ? AND product_key = ?", (country, key)
+                ).fetchone()
+                conn.execute(
+                    "INSERT OR REPLACE INTO prices (country, product_key, price, updated) VALUES (?, ?, ?, ?)",
+                    (country, key, price, now),
+                )
+                old_price = row['price'] if row else None
+
+                norm_query = normalize_query(item.get('query'))
+                if norm_query not in watches_by_query:
+                    watches_by_query[norm_query] = conn.execute(
+                        "SELECT id, subscriber, query, product_key, target_price FROM watches "
+                        "WHERE country = ? AND norm_query = ?", (country, norm_query)
+                    ).fetchall()
+
+                drop_percent = None
+                if old_price and price < old_price:
+                    drop_percent = round((old_price - price) / old_price * 100, 2)
+                for watch in watches_by_query[norm_query]:
+                    if watch['product_key'] is None:
+                        alert = drop_percent is not None and drop_percent >= WATCH_MIN_DROP_PERCENT
+                    elif watch['product_key'] != key:
+                        alert = False
+                    elif watch['target_price'] is not None:
+                        alert = price <= watch['target_price'] and (old_price is None or old_price > watch['target_price'])
+                    else:
+                        alert = drop_percent is not None
+                    if alert:
+                        conn.execute(
+                            "INSERT INTO alerts (watch_id, subscriber, query, url, title, source, old_price, "
+                            "new_price, drop_percent, created) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                            (watch['id'], watch['subscriber'], watch['query'], item['url'], item.get('title'),
+                             item.get('source'), old_price, price, drop_percent, now),
+                        )
+                        created += 1
+        return created
+    finally:
+        conn.close()
+
+
+def list_alerts(subscriber: str, include_delivered: bool = False, mark_delivered: bool = True, db_file=None) -> list:
+    """
+    Alertas de un suscriptor, de la más reciente a la más antigua.
+
+    Args:
+        subscriber: Identificador del suscriptor
+        include_delivered: Incluir las alertas ya entregadas
+        mark_delivered: Marcar como entregadas las alertas devueltas
+    """
+    conn = connect(db_file)
+    try:
+        with conn:
+            query = "SELECT * FROM alerts WHERE subscriber = ?"
+            if not include_delivered:
+                query += " AND delivered = 0"
+            rows = [dict(row) for row in conn.execute(query + " ORDER BY id DESC", (subscriber,))]
+            if mark_delivered and rows:
+                conn.executemany("UPDATE alerts SET delivered = 1 WHERE id = ?", [(row['id'],) for row in rows])
+        return rows
+    finally:
+        conn.close()
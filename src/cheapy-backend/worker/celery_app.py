@@ -1,12 +1,24 @@
 from celery import Celery
+from config import REDIS_URL, WATCH_TICK_SECONDS
+from .queues import DEFAULT_QUEUE, build_task_queues, route_spider_task
 
 celery = Celery(
     'cheapy_tasks',
-    broker='redis://localhost:6379/0',
-    backend='redis://localhost:6379/0',
+    broker=REDIS_URL,
+    backend=REDIS_URL,
     include=['worker.tasks']
 )
 
 celery.conf.update(
     task_track_started=True,
-)
\ No newline at end of file
+    # Colas separadas para spiders HTTP y renderizados (ver SPIDER_QUEUES en config.py)
+    task_queues=build_task_queues(),
+    task_default_queue=DEFAULT_QUEUE,
+    task_routes=(route_spider_task,),
+    # Confirmar la tarea al terminar: si un worker muere, el crawl vuelve a la cola
+    task_acks_late=True,
+    # Scheduler de seguimientos (watchlists.py); se ejecuta con `celery -A worker.celery_app beat`
+    beat_schedule={
+        'schedule-watches': {'task': 'schedule_watches', 'schedule': WATCH_TICK_SECONDS},
+    },
+)
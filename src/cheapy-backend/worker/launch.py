@@ -0,0 +1,44 @@
+"""
+Lanzador de workers por clase de spider.
+
+Cada clase de spider tiene su propia cola y su propio perfil de concurrencia y
+prefetch en SPIDER_QUEUES (config.py). Este módulo arma la línea de comandos de
+Celery a partir de esa configuración para no duplicarla en scripts o en el README.
+
+Uso:
+    python -m worker.launch http
+    python -m worker.launch rendered
+"""
+
+import sys
+from config import SPIDER_QUEUES
+from .celery_app import celery
+
+
+def build_worker_argv(spider_class: str) -> list:
+    """
+    Construye los argumentos de `celery worker` para una clase de spider.
+
+    Args:
+        spider_class: Clave de SPIDER_QUEUES ('http' o 'rendered')
+
+    Returns:
+        list: Argumentos para Celery.worker_main
+    """
+    profile = SPIDER_QUEUES[spider_class]
+    return [
+        'worker',
+        '--loglevel=info',
+        '-P', 'threads',
+        '-Q', profile['queue'],
+        '-c', str(profile['concurrency']),
+        '--prefetch-multiplier', str(profile['prefetch_multiplier']),
+        '-n', f"{spider_class}@%h",
+    ]
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2 or sys.argv[1] not in SPIDER_QUEUES:
+        print(f"Uso: python -m worker.launch [{'|'.join(SPIDER_QUEUES)}]")
+        sys.exit(1)
+    celery.worker_main(build_worker_argv(sys.argv[1]) + sys.argv[2:])
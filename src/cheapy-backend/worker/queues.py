@@ -0,0 +1,130 @@
+"""
+Ruteo de tareas de spiders a colas dedicadas según su perfil.
+
+Los spiders HTTP (MercadoLibre, Frávega) y los renderizados con Chromium
+(Amazon, eBay, AliExpress, Megatone) tienen costos muy distintos. Si comparten
+una única cola, un crawl barato queda esperando detrás de varios crawls de
+Chromium. Este módulo consulta SPIDER_PROFILES para decidir la cola de cada
+tarea y mide el tiempo de espera en cola de cada clase. Cada worker publica
+además su capacidad por cola para el control de admisión de la API (admission.py).
+"""
+
+import time
+from celery.signals import before_task_publish, task_prerun, worker_ready, worker_shutdown
+from kombu import Queue
+
+import admission
+import metrics
+import tracing
+from config import SPIDER_PROFILES, SPIDER_QUEUES
+
+SPIDER_TASK_NAME = 'run_scrapy_spider_task'
+DEFAULT_QUEUE = 'celery'
+
+
+def get_spider_profile(spider_name: str) -> dict:
+    """
+    Retorna el perfil de capacidades de un spider.
+
+    Los spiders no registrados se consideran renderizados: es la suposición
+    conservadora, ya que no deben competir con los crawls HTTP rápidos.
+
+    Args:
+        spider_name: Nombre del spider (ej: 'mercadolibre')
+
+    Returns:
+        dict: Perfil con las claves 'rendering' y 'cost'
+    """
+    return SPIDER_PROFILES.get(spider_name, {'rendering': 'rendered', 'cost': 30})
+
+
+def queue_for_spider(spider_name: str) -> str:
+    """
+    Retorna el nombre de la cola de Celery asignada a un spider.
+
+    Args:
+        spider_name: Nombre del spider
+
+    Returns:
+        str: Nombre de la cola
+    """
+    return SPIDER_QUEUES[get_spider_profile(spider_name)['rendering']]['queue']
+
+
+def build_task_queues() -> list:
+    """
+    Construye la lista de colas declaradas para Celery: la cola por defecto
+    más una cola por cada clase de spider.
+    """
+    return [Queue(DEFAULT_QUEUE)] + [Queue(profile['queue']) for profile in SPIDER_QUEUES.values()]
+
+
+def route_spider_task(name, args, kwargs, options, task=None, **kw):
+    """
+    Router de Celery: envía cada tarea de spider a la cola de su clase.
+
+    Returns:
+        dict or None: Opciones de ruteo, o None para usar la cola por defecto
+    """
+    if name != SPIDER_TASK_NAME:
+        return None
+    spider_name = (kwargs or {}).get('spider_name') or (args[0] if args else None)
+    if not spider_name:
+        return None
+    return {'queue': queue_for_spider(spider_name)}
+
+
+@before_task_publish.connect
+def stamp_enqueue_time(sender=None, headers=None, **kwargs):
+    """Marca el instante de publicación en los headers del mensaje."""
+    if sender == SPIDER_TASK_NAME and headers is not None:
+        headers.setdefault('enqueued_at', time.time())
+
+
+@task_prerun.connect
+def record_queue_wait(sender=None, task=None, kwargs=None, **extra):
+    """Registra cuánto esperó la tarea en su cola antes de empezar a ejecutarse."""
+    if task is None or task.name != SPIDER_TASK_NAME:
+        return
+    enqueued_at = task.request.get('enqueued_at')
+    # En los reintentos el header se conserva, pero la espera ya no es de cola
+    if not enqueued_at or task.request.retries:
+        return
+    spider_name = (kwargs or {}).get('spider_name', '')
+    rendering = get_spider_profile(spider_name)['rendering']
+    queue = SPIDER_QUEUES[rendering]['queue']
+    now = time.time()
+    metrics.observe(
+        'cheapy_queue_wait_seconds', max(0.0, now - float(enqueued_at)),
+        queue=queue, spider_class=rendering,
+    )
+    trace = (kwargs or {}).get('trace') or {}
+    if trace.get('trace_id'):
+        tracing.record_span(
+            trace['trace_id'], 'queue', float(enqueued_at), now,
+            parent_id=trace.get('parent_id'), spider=spider_name, queue=queue,
+        )
+
+
+_heartbeat = None
+
+
+@worker_ready.connect
+def publish_worker_capacity(sender=None, **kwargs):
+    """Publica periódicamente la concurrencia del worker en cada cola de spiders que consume."""
+    global _heartbeat
+    spider_queues = {profile['queue'] for profile in SPIDER_QUEUES.values()}
+    queues = [queue.name for queue in sender.task_consumer.queues if queue.name in spider_queues]
+    if not queues:
+        return
+    _heartbeat = admission.WorkerHeartbeat(
+        metrics.get_client(), sender.hostname, queues, sender.controller.concurrency,
+    )
+    _heartbeat.start()
+
+
+@worker_shutdown.connect
+def withdraw_worker_capacity(**kwargs):
+    """Quita la capacidad publicada al apagarse el worker."""
+    if _heartbeat is not None:
+        _heartbeat.stop()
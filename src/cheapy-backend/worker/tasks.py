@@ -1,36 +1,235 @@
 import subprocess
 import json
+import os
 import sys
+import tempfile
+import time
 from pathlib import Path
+from urllib.parse import urlsplit
+from celery import group, states
+from celery.exceptions import Ignore
+from celery.worker import state as worker_state
+import blocking
+import metrics
+import tracing
+import watchlists
+from config import BATCH_QUERIES_PER_CRAWL, COUNTRY_TO_SPIDERS, REFRESH_PRODUCTS_PER_CRAWL
+from stores import resolve_store
 from .celery_app import celery
 
 SCRAPY_PROJECT_PATH = str(Path(__file__).resolve().parent.parent)
+# Cada cuánto se revisa si la tarea fue revocada mientras corre el crawl
+REVOKE_POLL_SECONDS = 1
+
+
+def run_crawl(command: list, task_id: str) -> str:
+    """
+    Ejecuta el crawl y retorna su salida estándar, como `subprocess.run(check=True)`.
+
+    Si la tarea se revoca mientras corre (el duplicado de un crawl rezagado
+    terminó primero, ver api/hedging.py) el proceso de Scrapy se termina y la
+    tarea se descarta sin guardar resultado ni reintentarse.
+    """
+    process = subprocess.Popen(
+        command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+        encoding="utf-8", errors="ignore", cwd=SCRAPY_PROJECT_PATH
+    )
+    while True:
+        try:
+            stdout, stderr = process.communicate(timeout=REVOKE_POLL_SECONDS)
+            break
+        except subprocess.TimeoutExpired:
+            if task_id in worker_state.revoked:
+                process.kill()
+                process.communicate()
+                print(f"[WORKER] Task {task_id} revoked: crawl terminated.")
+                raise Ignore()
+    if process.returncode:
+        raise subprocess.CalledProcessError(process.returncode, command, stdout, stderr)
+    return stdout
+
+
+def circuit_open(spider_name: str) -> bool:
+    """True si la tienda tiene el circuito abierto; si Redis no responde, se intenta el crawl."""
+    try:
+        return bool(blocking.CircuitBreaker(metrics.get_client()).open_stores([spider_name]))
+    except Exception as e:
+        print(f"[WORKER] Could not read circuit state for '{spider_name}': {e}")
+        return False
+
+
+def without_blocked_stores(products: list) -> list:
+    """
+    Productos del spider `refresh` sin los de tiendas con el circuito abierto
+    ni los de hosts que no son de ninguna tienda. Si Redis no responde se
+    refrescan todos los de tiendas conocidas.
+    """
+    stores = [resolve_store(None, urlsplit(product['url']).hostname) for product in products]
+    known = [(product, store) for product, store in zip(products, stores) if store]
+    if len(known) < len(products):
+        print(f"[WORKER] {len(products) - len(known)} products are not from a known store: skipped.")
+    try:
+        blocked = blocking.CircuitBreaker(metrics.get_client()).open_stores(sorted({store for _, store in known}))
+    except Exception as e:
+        print(f"[WORKER] Could not read circuit state for refresh stores: {e}")
+        blocked = {}
+    if blocked:
+        print(f"[WORKER] Stores {sorted(blocked)} are blocked (circuit open): their products are skipped.")
+    return [product for product, store in known if store not in blocked]
+
 
 @celery.task(
     name='run_scrapy_spider_task',
+    bind=True,
+    # El estado STARTED lo guarda la tarea, con el instante de inicio que usa api/hedging.py
+    track_started=False,
     autoretry_for=(Exception,),
     retry_backoff=True,
     retry_kwargs={'max_retries': 2}
 )
-def run_scrapy_spider(spider_name: str, query: str, country: str):
+def run_scrapy_spider(self, spider_name: str, query: str, country: str, trace: dict = None, incremental: bool = False,
+                      queries: list = None, products: list = None):
     """
     Ejecuta un spider de Scrapy mediante subprocess y devuelve los resultados JSON parseados.
     Configurado con reintentos automáticos en caso de fallo.
+
+    Si recibe un contexto de traza (`trace` con 'trace_id' y 'parent_id'), lo
+    propaga al crawl mediante settings y registra el span de la tarea.
+
+    Con `incremental` el crawl sólo emite productos nuevos o cambiados desde el
+    crawl anterior de la misma búsqueda (IncrementalPipeline) y la tarea devuelve
+    {'items': [...], 'unchanged': N} en lugar de la lista de items.
+
+    Con `queries` un solo crawl resuelve varias búsquedas (mismo proceso,
+    navegador y conexiones); cada item trae su búsqueda en 'query'.
+
+    `products` es la lista de productos ({'url', 'query'}) del spider `refresh`,
+    que actualiza productos seguidos por su URL con requests condicionales.
+
+    Cada página terminada queda en un checkpoint de Redis con el task_id como
+    clave (CheckpointMiddleware): un reintento reanuda desde las requests que
+    faltaban en lugar de repetir el crawl completo.
+
+    Si el circuito de la tienda está abierto por bloqueos (blocking.py) la tarea
+    termina sin resultados y sin lanzar Scrapy. En el spider `refresh`, que
+    mezcla tiendas, se descartan sólo los productos de las tiendas bloqueadas.
     """
+    empty = {'items': [], 'unchanged': 0, 'unchanged_by_query': {}} if incremental else []
+    if products:
+        products = without_blocked_stores(products)
+        if not products:
+            print(f"[WORKER] All products for '{spider_name}' are from blocked stores: crawl skipped.")
+            return empty
+    if circuit_open(spider_name):
+        print(f"[WORKER] Store '{spider_name}' is blocked (circuit open): crawl skipped.")
+        return empty
+    self.update_state(state=states.STARTED, meta={
+        'pid': os.getpid(), 'hostname': self.request.hostname, 'spider': spider_name, 'started_at': time.time(),
+    })
     print(f"[WORKER] Iniciating task for spider: '{spider_name}', Query: '{query}', Country: '{country}'")
+    trace = trace or {}
+    trace_id = trace.get('trace_id')
+    task_span_id = tracing.new_span_id()
     command = [
         sys.executable, "-m", "scrapy", "crawl", spider_name,
         "-a", f"query={query}", "-a", f"country={country}",
         "-o", "-:jsonlines"
     ]
-    try:
-        result = subprocess.run(
-            command, capture_output=True, text=True, check=True,
-            encoding="utf-8", errors="ignore", cwd=SCRAPY_PROJECT_PATH
-        )
-        raw_results = [json.loads(line) for line in result.stdout.splitlines() if line.strip()]
-        print(f"[WORKER] Task '{spider_name}' completed with {len(raw_results)} results.")
-        return raw_results
-    except Exception as e:
-        print(f"ERROR in Worker executing '{spider_name}': {e}")
-        raise e
\ No newline at end of file
+    if self.request.id:
+        command += ["-s", f"CHECKPOINT_KEY={self.request.id}"]
+    if queries:
+        command += ["-a", f"queries={json.dumps(queries, ensure_ascii=False)}"]
+    if products:
+        command += ["-a", f"products={json.dumps(products, ensure_ascii=False)}"]
+    if trace_id:
+        command += [
+            "-s", f"TRACE_ID={trace_id}", "-s", f"TRACE_PARENT_ID={task_span_id}",
+            "-s", f"TRACE_SPAWNED_AT={time.time()}",
+        ]
+    summary_path = None
+    if incremental:
+        fd, summary_path = tempfile.mkstemp(prefix='cheapy-incremental-', suffix='.json')
+        os.close(fd)
+        command += ["-s", "INCREMENTAL_ENABLED=1", "-s", f"INCREMENTAL_SUMMARY_PATH={summary_path}"]
+    started = time.monotonic()
+    with tracing.span(trace_id, f"task.{spider_name}", parent_id=trace.get('parent_id'), span_id=task_span_id):
+        try:
+            stdout = run_crawl(command, self.request.id)
+            raw_results = [json.loads(line) for line in stdout.splitlines() if line.strip()]
+            print(f"[WORKER] Task '{spider_name}' completed with {len(raw_results)} results.")
+            metrics.observe('cheapy_task_duration_seconds', time.monotonic() - started, spider=spider_name, outcome='success')
+            if incremental:
+                with open(summary_path, encoding='utf-8') as f:
+                    summary = json.load(f)
+                return {
+                    'items': raw_results, 'unchanged': summary.get('unchanged', 0),
+                    'unchanged_by_query': summary.get('unchanged_by_query', {}),
+                }
+            return raw_results
+        except Ignore:
+            metrics.observe('cheapy_task_duration_seconds', time.monotonic() - started, spider=spider_name, outcome='revoked')
+            raise
+        except Exception as e:
+            print(f"ERROR in Worker executing '{spider_name}': {e}")
+            metrics.observe('cheapy_task_duration_seconds', time.monotonic() - started, spider=spider_name, outcome='failure')
+            raise e
+        finally:
+            if summary_path:
+                os.unlink(summary_path)
+
+
+@celery.task(name='schedule_watches')
+def schedule_watches():
+    """
+    Tick de Celery beat: despacha las búsquedas seguidas que están vencidas.
+
+    Cada búsqueda se programa una sola vez sin importar cuántos seguimientos la
+    comparten (ver watchlists.py). Las de un mismo país se agrupan en crawls por
+    lotes e incrementales; los productos seguidos se refrescan por su URL con el
+    spider `refresh`, y el listado sólo se descarga si la búsqueda tiene
+    seguimientos de búsqueda. Al terminar cada crawl, record_watch_results
+    registra sus precios y genera las alertas: los resultados de un crawl no
+    esperan a los demás, y un crawl que falla no descarta los del resto (con un
+    chord, el callback no corría y el tick entero se perdía hasta el siguiente
+    intervalo, porque watchlists ya había reprogramado las búsquedas).
+    """
+    by_country = {}
+    for target in watchlists.claim_due_targets():
+        queries, products = by_country.setdefault(target['country'], ([], []))
+        if target['listing']:
+            queries.append(target['query'])
+        products.extend({'url': url, 'query': target['query']} for url in target['product_urls'])
+
+    dispatched = 0
+    for country, (queries, products) in by_country.items():
+        spiders = COUNTRY_TO_SPIDERS.get(country, [])
+        if not spiders:
+            continue
+        chunks = [queries[i:i + BATCH_QUERIES_PER_CRAWL] for i in range(0, len(queries), BATCH_QUERIES_PER_CRAWL)]
+        crawls = [
+            celery.signature('run_scrapy_spider_task', kwargs={
+                'spider_name': name, 'query': '', 'country': country, 'incremental': True, 'queries': chunk,
+            })
+            for name in spiders for chunk in chunks
+        ]
+        crawls += [
+            celery.signature('run_scrapy_spider_task', kwargs={
+                'spider_name': 'refresh', 'query': '', 'country': country,
+                'products': products[i:i + REFRESH_PRODUCTS_PER_CRAWL],
+            })
+            for i in range(0, len(products), REFRESH_PRODUCTS_PER_CRAWL)
+        ]
+        print(f"[WORKER] Watch tick: {len(queries)} queries and {len(products)} products for {country} "
+              f"in {len(crawls)} crawls.")
+        group(crawl | record_watch_results.s(country) for crawl in crawls).apply_async()
+        dispatched += len(crawls)
+    return dispatched
+
+
+@celery.task(name='record_watch_results')
+def record_watch_results(result, country: str):
+    """Registra los precios de un crawl de seguimiento y genera las alertas de baja."""
+    items = (result.get('items', []) if isinstance(result, dict) else result) or []
+    alerts = watchlists.record_results(country, items)
+    print(f"[WORKER] Watch results for {country}: {len(items)} changed items, {alerts} alerts.")
+    return alerts
@@ -118,13 +118,30 @@ document.addEventListener('DOMContentLoaded', () => {
             const searchResponse = await fetch(
                 `http://127.0.0.1:8000/buscar?q=${encodeURIComponent(query)}&country=${country}`
             );
+            if (searchResponse.status === 429) {
+                // Control de admisión: el servidor indica cuándo reintentar
+                const retryAfter = searchResponse.headers.get('Retry-After') || '?';
+                statusMessage.textContent = `El servidor está ocupado. Reintentá en ${retryAfter} s.`;
+                return;
+            }
             if (!searchResponse.ok) throw new Error("Error al iniciar la búsqueda.");
 
             const taskData = await searchResponse.json();
             if (taskData.error) {
                 throw new Error(taskData.error);
             }
+            if (taskData.cache_only) {
+                // Servidor saturado o tiendas bloqueadas: sólo hay precios ya vistos, sin búsqueda en vivo
+                allResults = taskData.local_results || [];
+                displayRecommendations();
+                return;
+            }
             if (taskData.task_id) {
+                // Productos ya vistos por el backend: se muestran mientras corre la búsqueda en vivo
+                if (taskData.local_results && taskData.local_results.length > 0) {
+                    allResults = taskData.local_results;
+                    displayRecommendations();
+                }
                 pollForResult(taskData.task_id);
             } else {
                 throw new Error("No se recibió un ID de tarea.");
@@ -281,6 +298,17 @@ document.addEventListener('DOMContentLoaded', () => {
         sortedResults.forEach(item => resultsContainer.appendChild(createResultCard(item)));
     };
 
+    /**
+     * Describe la antigüedad de un resultado del índice local.
+     * @param {number} seconds - Segundos desde que se vio el precio
+     * @returns {string} Texto como "hace 3 h"
+     */
+    const formatAge = (seconds) => {
+        if (seconds < 3600) return `hace ${Math.max(1, Math.round(seconds / 60))} min`;
+        if (seconds < 86400) return `hace ${Math.round(seconds / 3600)} h`;
+        return `hace ${Math.round(seconds / 86400)} d`;
+    };
+
     /**
      * crea un elemento de tarjeta de resultados para un artículo de producto. *@param {Objeto} elemento -Objeto de datos del producto *@param {Objeto} categoríaInfo -Información de insignia de categoría opcional
      * @returns {HTMLElement} Elemento de tarjeta de resultado
@@ -307,8 +335,14 @@ document.addEventListener('DOMContentLoaded', () => {
         });
 
         // Crea el elemento de imagen
+        // Miniatura servida por el backend (/img); si falla, la imagen original de la tienda
         const img = document.createElement('img');
-        img.src = item.image_url || 'icons/placeholder.png';
+        img.src = item.thumbnail_url
+            ? `http://127.0.0.1:8000${item.thumbnail_url}`
+            : (item.image_url || 'icons/placeholder.png');
+        if (item.thumbnail_url && item.image_url) {
+            img.addEventListener('error', () => { img.src = item.image_url; }, { once: true });
+        }
         img.alt = item.title;
         img.className = 'result-image';
         img.loading = 'lazy';
@@ -350,9 +384,9 @@ document.addEventListener('DOMContentLoaded', () => {
             priceHTML = `<span class="item-price">Precio no disponible</span>`;
         }
 
-        // Construye el texto de reseñas
-        const reviewsText = item.reviews_count > 0 ?
-            `⭐ ${item.rating || '?'} (${item.reviews_count})` : 'Sin reseñas';
+        // Construye el texto de reseñas; los resultados del índice local muestran la antigüedad del precio
+        const reviewsText = item.local ? `Precio visto ${formatAge(item.age_seconds)}` :
+            (item.reviews_count > 0 ? `⭐ ${item.rating || '?'} (${item.reviews_count})` : 'Sin reseñas');
 
         // Ensambla el HTML del contenido de texto
         textContent.innerHTML = `${categoryHTML}<span class="item-title">${item.title || 'Título no disponible'}</span><div class="item-details">${priceHTML}<span class="store-name">${item.source || 'Tienda'}</span></div><span class="item-reviews">${reviewsText}</span>`;